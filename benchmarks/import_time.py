@@ -0,0 +1,137 @@
+"""
+Đo thời gian import khi khởi động (cold start) của main.py và gui_app.py
+
+Mỗi module được import trong một tiến trình Python mới với `-X importtime`; thời gian là giá trị
+cumulative của dòng import module đó (trung vị qua nhiều lần chạy). Script cũng liệt kê các
+thư viện nặng (face_recognition, dlib, cv2, pandas) đã bị tải chỉ vì import module.
+
+Ví dụ:
+    python benchmarks/import_time.py                    # đo cây thư mục hiện tại
+    python benchmarks/import_time.py --baseline HEAD~1  # so sánh với một commit khác (git archive)
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ('main', 'gui_app')
+HEAVY_MODULES = ('face_recognition', 'dlib', 'cv2', 'pandas', 'PIL')
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def parse_importtime(stderr):
+    """Đọc output của -X importtime, trả về {tên module: (self_us, cumulative_us)}"""
+    timings = {}
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            timings[name] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def measure_once(module, cwd):
+    """Import module trong tiến trình mới, trả về (cumulative_us, timings, các module nặng đã tải)"""
+    code = (f"import sys; import {module}; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=cwd, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "unknown error"
+        raise RuntimeError(f"import {module} failed: {last_line}")
+
+    timings = parse_importtime(result.stderr)
+    loaded = [m for m in result.stdout.strip().split(',') if m]
+    return timings.get(module, (0, 0))[1], timings, loaded
+
+
+def measure(module, cwd, repeat=5):
+    """Đo nhiều lần, trả về thống kê (ms) và các import tốn thời gian nhất của lần chạy cuối"""
+    totals = []
+    timings = {}
+    loaded = []
+    for _ in range(repeat):
+        try:
+            total_us, timings, loaded = measure_once(module, cwd)
+        except RuntimeError as e:
+            return {"module": module, "error": str(e)}
+        totals.append(total_us / 1000.0)
+
+    top = sorted(((name, self_us / 1000.0) for name, (self_us, _) in timings.items()),
+                 key=lambda item: item[1], reverse=True)[:10]
+    return {
+        "module": module,
+        "median_ms": statistics.median(totals),
+        "min_ms": min(totals),
+        "max_ms": max(totals),
+        "heavy_modules_loaded": loaded,
+        "top_self_ms": top,
+    }
+
+
+def export_revision(ref, target_dir):
+    """Xuất cây thư mục của commit ref vào target_dir bằng git archive (không đụng vào working tree)"""
+    archive = os.path.join(target_dir, 'tree.tar')
+    with open(archive, 'wb') as f:
+        subprocess.run(['git', '-C', REPO_ROOT, 'archive', '--format=tar', ref], stdout=f, check=True)
+    tree_dir = os.path.join(target_dir, 'tree')
+    with tarfile.open(archive) as tar:
+        tar.extractall(tree_dir)
+    return tree_dir
+
+
+def print_report(label, results):
+    print(f"\n===== IMPORT TIME: {label} =====")
+    for result in results:
+        if "error" in result:
+            print(f"{result['module']:<10} {result['error']}")
+            continue
+        heavy = ', '.join(result["heavy_modules_loaded"]) or '(none)'
+        print(f"{result['module']:<10} median {result['median_ms']:8.1f} ms "
+              f"(min {result['min_ms']:.1f}, max {result['max_ms']:.1f})  heavy: {heavy}")
+        for name, self_ms in result["top_self_ms"][:5]:
+            print(f"    {self_ms:8.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of main.py and gui_app.py")
+    parser.add_argument('--modules', nargs='+', default=list(DEFAULT_MODULES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', help="git ref to compare against, e.g. HEAD~1")
+    parser.add_argument('--json', help="write results to this JSON file")
+    args = parser.parse_args()
+
+    current = [measure(module, REPO_ROOT, args.repeat) for module in args.modules]
+    print_report("working tree", current)
+    output = {"current": current}
+
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as tmp:
+            tree_dir = export_revision(args.baseline, tmp)
+            baseline = [measure(module, tree_dir, args.repeat) for module in args.modules]
+        print_report(args.baseline, baseline)
+        output["baseline"] = baseline
+
+        print("\n===== SPEEDUP =====")
+        for before, after in zip(baseline, current):
+            if "error" in before or "error" in after:
+                print(f"{after['module']:<10} n/a")
+                continue
+            ratio = before["median_ms"] / after["median_ms"] if after["median_ms"] else float('inf')
+            print(f"{after['module']:<10} {before['median_ms']:8.1f} ms -> {after['median_ms']:8.1f} ms  ({ratio:.1f}x)")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Tạo tải cho dịch vụ nhận diện HTTP (modules/recognition_service.py)
+
+Gửi các ảnh trong photo/ tới POST /recognize từ nhiều kết nối đồng thời (asyncio, keep-alive), rồi in
+thông lượng, độ trễ (trung vị / p95 / max) và kích thước batch trung bình mà dịch vụ đã gom được.
+
+Ví dụ:
+    python -m modules.recognition_service --port 8765 &
+    python benchmarks/recognition_load.py --concurrency 16 --requests 400
+    python benchmarks/recognition_load.py --concurrency 1 --requests 50 --json reports/load_c1.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from urllib.parse import urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def load_payloads(photos_dir, limit):
+    """Nội dung (bytes) của tối đa limit ảnh trong photos_dir"""
+    paths = []
+    for root, _, files in os.walk(photos_dir):
+        paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+    payloads = []
+    for path in sorted(paths)[:limit]:
+        with open(path, 'rb') as f:
+            payloads.append(f.read())
+    return payloads
+
+
+async def request(reader, writer, method, path, body=b''):
+    """Gửi một request HTTP/1.1 keep-alive, trả về (mã HTTP, JSON)"""
+    head = (f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: image/jpeg\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n")
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        if key.strip().lower() == 'content-length':
+            length = int(value.strip())
+    data = await reader.readexactly(length) if length else b''
+    return status, json.loads(data) if data else None
+
+
+async def client(host, port, payloads, counter, total, latencies, errors):
+    """Một kết nối: gửi lần lượt các ảnh cho đến khi đủ total request (chung cho mọi kết nối)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while counter[0] < total:
+            index = counter[0]
+            counter[0] += 1
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, 'POST', '/recognize', payloads[index % len(payloads)])
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            if status != 200:
+                errors[status] = errors.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_load(url, payloads, concurrency, total):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    latencies = []
+    errors = {}
+    counter = [0]
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, before = await request(reader, writer, 'GET', '/health')
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, payloads, counter, total, latencies, errors)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    _, after = await request(reader, writer, 'GET', '/health')
+    writer.close()
+
+    batches = after["batches"] - before["batches"]
+    images = after["batched_images"] - before["batched_images"]
+    ordered = sorted(latencies)
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "median_ms": statistics.median(ordered) if ordered else 0.0,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0,
+        "max_ms": ordered[-1] if ordered else 0.0,
+        "batches": batches,
+        "mean_batch_size": images / batches if batches else 0.0,
+    }
+
+
+def print_report(result):
+    print(f"\n===== LOAD: {result['url']} (concurrency {result['concurrency']}) =====")
+    print(f"Requests:    {result['requests']} in {result['seconds']:.2f}s -> {result['throughput_rps']:.1f} req/s")
+    print(f"Latency:     median {result['median_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+          f"max {result['max_ms']:.1f} ms")
+    print(f"Batches:     {result['batches']} (mean size {result['mean_batch_size']:.2f})")
+    if result['errors']:
+        print(f"Errors:      {result['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the HTTP recognition service")
+    parser.add_argument('--url', default='http://127.0.0.1:8765')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--photos', default=os.path.join(REPO_ROOT, 'photo'))
+    parser.add_argument('--max-images', type=int, default=32)
+    parser.add_argument('--json', help="also write the result to this JSON file")
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.photos, args.max_images)
+    if not payloads:
+        print(f"Error: No images found in {args.photos}")
+        return
+    result = asyncio.run(run_load(args.url, payloads, max(1, args.concurrency), args.requests))
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,534 @@
+"""
+Bộ benchmark hiệu năng: giải mã ảnh, phát hiện, mã hóa, so khớp, ghi điểm danh, xuất báo cáo
+và độ trễ end-to-end của một frame
+
+Không cần camera: dữ liệu lấy từ thư mục photo/ và các frame tổng hợp ghép từ các ảnh đó;
+gallery cho phần so khớp (10 đến 1 triệu dòng) và lịch sử điểm danh được sinh ngẫu nhiên với
+seed cố định. Kết quả được ghi ra file JSON kèm thông tin máy và commit để so sánh giữa các lần chạy.
+
+Ví dụ:
+    python benchmarks/run_benchmarks.py                                  # chạy tất cả, ghi reports/benchmarks_<thời gian>.json
+    python benchmarks/run_benchmarks.py --suites match attendance --quick
+    python benchmarks/run_benchmarks.py --compare reports/baseline.json --threshold 0.2   # trả mã lỗi 1 nếu chậm đi > 20%
+
+Recall của IVF so với quét toàn bộ (match.ivf.recall.<size>) luôn được kiểm tra: dưới --min-recall
+(mặc định 0.95) cũng trả mã lỗi 1, có hay không có --compare.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+SUITES = ('decode', 'detect', 'encode', 'match', 'attendance', 'export', 'e2e')
+GALLERY_SIZES = (10, 100, 1000, 10000, 100000, 1000000)
+QUICK_GALLERY_SIZES = (10, 1000, 100000)
+PACKAGES = ('numpy', 'dlib', 'face_recognition', 'opencv-python', 'pandas', 'openpyxl', 'pyarrow')
+ENCODING_DIM = 128
+
+
+# ==================== ĐO THỜI GIAN ====================
+
+def summarize(samples_ms, **extra):
+    """Thống kê (ms) của các lần đo"""
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    result = {
+        "n": int(len(samples)),
+        "median_ms": float(np.median(samples)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "min_ms": float(samples.min()),
+        "mean_ms": float(samples.mean()),
+    }
+    result.update(extra)
+    return result
+
+
+def time_calls(fn, repeat, warmup=1, **extra):
+    """Gọi fn() warmup lần (không tính) rồi repeat lần, trả về thống kê thời gian mỗi lần gọi"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return summarize(samples, **extra)
+
+
+def time_each(fn, items, **extra):
+    """Gọi fn(item) cho từng item, trả về thống kê thời gian mỗi item"""
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return summarize(samples, **extra)
+
+
+# ==================== THÔNG TIN MÁY ====================
+
+def _package_version(name):
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception:
+        return None
+
+
+def _git(*args):
+    try:
+        result = subprocess.run(['git', '-C', REPO_ROOT] + list(args), capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except Exception:
+        return None
+
+
+def machine_info():
+    """Thông tin máy, phiên bản thư viện và commit để so sánh các lần chạy"""
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "packages": {name: _package_version(name) for name in PACKAGES},
+        "git_commit": _git('rev-parse', 'HEAD'),
+        "git_dirty": bool(_git('status', '--porcelain', '--untracked-files=no')),
+    }
+
+
+# ==================== DỮ LIỆU ====================
+
+class BenchmarkContext:
+    """Tham số và dữ liệu dùng chung giữa các suite (ảnh và frame chỉ được nạp một lần)"""
+
+    def __init__(self, args):
+        self.args = args
+        self.repeat = args.repeat
+        self._photo_paths = None
+        self._images = None
+        self._frames = None
+        self.errors = {}  # Lỗi của từng phần trong một suite (các phần khác vẫn có kết quả)
+
+    def photo_paths(self):
+        if self._photo_paths is None:
+            from modules.face_loader import IMAGE_EXTENSIONS
+            paths = []
+            for root, _, files in os.walk(self.args.photos):
+                paths.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(IMAGE_EXTENSIONS))
+            self._photo_paths = sorted(paths)[:self.args.max_images]
+            if not self._photo_paths:
+                raise RuntimeError(f"No images found in {self.args.photos}")
+        return self._photo_paths
+
+    def images(self):
+        """Ảnh RGB của photo/"""
+        if self._images is None:
+            from modules.model_runtime import get_runtime
+            runtime = get_runtime()
+            self._images = [runtime.load_image_file(path) for path in self.photo_paths()]
+        return self._images
+
+    def frames(self):
+        """Frame BGR tổng hợp kích thước --frame-size, mỗi frame ghép hai ảnh của photo/ cạnh nhau"""
+        if self._frames is None:
+            import cv2
+            width, height = self.args.frame_size
+            images = self.images()
+            frames = []
+            for i in range(min(self.args.frames, len(images))):
+                frame = np.zeros((height, width, 3), dtype=np.uint8)
+                for slot in range(2):
+                    image = images[(i * 2 + slot) % len(images)]
+                    tile_width = width // 2
+                    scale = min(tile_width / float(image.shape[1]), height / float(image.shape[0]))
+                    tile = cv2.resize(image, (max(1, int(image.shape[1] * scale)), max(1, int(image.shape[0] * scale))),
+                                      interpolation=cv2.INTER_AREA)
+                    x = slot * tile_width + (tile_width - tile.shape[1]) // 2
+                    y = (height - tile.shape[0]) // 2
+                    frame[y:y + tile.shape[0], x:x + tile.shape[1]] = tile[:, :, ::-1]
+                frames.append(frame)
+            self._frames = frames
+        return self._frames
+
+
+def synthetic_gallery(size, num_people=None, seed=0):
+    """Gallery ngẫu nhiên float32 size x 128 (mỗi người vài dòng gần nhau), sinh theo khối để tiết kiệm bộ nhớ"""
+    rng = np.random.default_rng(seed)
+    num_people = num_people or max(1, size // 5)
+    centers = rng.standard_normal((num_people, ENCODING_DIM), dtype=np.float32) * 0.1
+    encodings = np.empty((size, ENCODING_DIM), dtype=np.float32)
+    chunk = 65536
+    for start in range(0, size, chunk):
+        stop = min(size, start + chunk)
+        people = np.arange(start, stop) % num_people
+        encodings[start:stop] = centers[people] + rng.standard_normal((stop - start, ENCODING_DIM), dtype=np.float32) * 0.02
+    names = [f"person_{i % num_people:07d}" for i in range(size)]
+    return encodings, names, centers
+
+
+def synthetic_history(num_users, num_days, seed=0):
+    """Lịch sử điểm danh ngẫu nhiên {ngày: {tên: {"checkin", "checkout"}}} kết thúc hôm nay"""
+    rng = np.random.default_rng(seed)
+    today = datetime.date.today()
+    data = {}
+    for day in range(num_days):
+        date = (today - datetime.timedelta(days=num_days - 1 - day)).isoformat()
+        present = rng.random(num_users) < 0.9
+        checkins = rng.integers(7 * 3600, 10 * 3600, num_users)
+        durations = rng.integers(4 * 3600, 10 * 3600, num_users)
+        entries = {}
+        for user in np.flatnonzero(present):
+            checkin = int(checkins[user])
+            entry = {"checkin": _hms(checkin)}
+            if rng.random() < 0.95:
+                entry["checkout"] = _hms(min(checkin + int(durations[user]), 86399))
+            entries[f"user_{user:05d}"] = entry
+        data[date] = entries
+    return data
+
+
+def _hms(seconds):
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+# ==================== CÁC SUITE ====================
+
+def suite_decode(ctx):
+    """Giải mã file ảnh (face_recognition.load_image_file) và thu nhỏ theo profile ảnh tĩnh"""
+    from modules.detection import IMAGE_PROFILE
+    from modules.model_runtime import get_runtime
+    runtime = get_runtime()
+    paths = ctx.photo_paths()
+    results = {"decode.load_image_file": time_each(runtime.load_image_file, paths)}
+    images = ctx.images()
+    results["decode.prepare_image_profile"] = time_each(IMAGE_PROFILE.prepare, images,
+                                                        max_side=IMAGE_PROFILE.max_side)
+    return results
+
+
+def suite_detect(ctx):
+    """face_locations trên frame tổng hợp ở kích thước gốc và theo profile trực tiếp"""
+    from modules.detection import LIVE_PROFILE, DetectionProfile
+    frames = ctx.frames()
+    results = {}
+    for label, profile in (("full", DetectionProfile(max_side=None)), ("live", LIVE_PROFILE)):
+        faces = []
+        results[f"detect.face_locations.{label}"] = time_each(
+            lambda frame: faces.append(len(profile.detect(frame, bgr=True)[1])), frames,
+            max_side=profile.max_side, scale=profile.scale, upsample=profile.upsample, model=profile.model,
+            frame_size=list(ctx.args.frame_size))
+        results[f"detect.face_locations.{label}"]["faces_per_frame"] = float(np.mean(faces)) if faces else 0.0
+    return results
+
+
+def suite_encode(ctx):
+    """Mã hóa khuôn mặt: từng khuôn mặt một lần gọi so với một lần gọi batch cho cả lô"""
+    from modules.detection import IMAGE_PROFILE
+    from modules.face_loader import batch_face_encodings
+    from modules.model_runtime import get_runtime
+    runtime = get_runtime()
+
+    items = []
+    for image in ctx.images():
+        small_image, locations, _ = IMAGE_PROFILE.detect(image)
+        if locations:
+            items.append((small_image, locations[:1]))
+    if not items:
+        raise RuntimeError("No faces found in the benchmark photos")
+
+    results = {"encode.face_encodings.single": time_each(
+        lambda item: runtime.face_encodings(item[0], item[1]), items, faces=len(items))}
+    batch = time_calls(lambda: batch_face_encodings(items), ctx.repeat, faces=len(items))
+    batch["per_face_ms"] = batch["median_ms"] / len(items)
+    results["encode.batch_face_encodings"] = batch
+    return results
+
+
+def suite_match(ctx):
+    """
+    So khớp một lô khuôn mặt với gallery tổng hợp ở nhiều kích thước (quét toàn bộ và IVF)
+
+    Với IVF còn đo recall@1 so với quét toàn bộ ở n_probe mặc định (query có seed cố định),
+    ghi vào match.ivf.recall.<size> để check_recall báo lỗi khi recall tụt dưới --min-recall.
+    """
+    from modules.gallery_index import measure_recall
+    from modules.matcher import GalleryMatcher
+    results = {}
+    batch_size = ctx.args.match_batch
+    for size in ctx.args.gallery_sizes:
+        encodings, names, centers = synthetic_gallery(size)
+        rng = np.random.default_rng(1)
+        queries = centers[rng.integers(0, len(centers), batch_size)] + \
+            rng.standard_normal((batch_size, ENCODING_DIM), dtype=np.float32) * 0.02
+
+        start = time.perf_counter()
+        matcher = GalleryMatcher(encodings, names)
+        setup_ms = (time.perf_counter() - start) * 1000.0
+        results[f"match.brute.{size}"] = time_calls(lambda: matcher.match(queries), ctx.repeat,
+                                                    gallery_size=size, batch=batch_size, setup_ms=setup_ms)
+        del matcher
+
+        if size >= ctx.args.ivf_min_size:
+            start = time.perf_counter()
+            matcher = GalleryMatcher(encodings, names, index='ivf', n_iter=10, train_size=min(size, 65536))
+            build_ms = (time.perf_counter() - start) * 1000.0
+            results[f"match.ivf.{size}"] = time_calls(lambda: matcher.match(queries), ctx.repeat,
+                                                      gallery_size=size, batch=batch_size, setup_ms=build_ms)
+            recall_rng = np.random.default_rng(2)
+            recall_queries = encodings[recall_rng.integers(0, size, ctx.args.recall_queries)] + \
+                recall_rng.standard_normal((ctx.args.recall_queries, ENCODING_DIM), dtype=np.float32) * 0.02
+            recall = measure_recall(matcher.index, encodings, recall_queries)
+            results[f"match.ivf.recall.{size}"] = summarize([recall["latency_ms"]], recall=recall["recall"],
+                                                            candidates=recall["candidates"],
+                                                            n_probe=matcher.index.n_probe,
+                                                            queries=ctx.args.recall_queries)
+            del matcher
+        del encodings, names
+    return results
+
+
+def suite_attendance(ctx):
+    """Ghi check-in / checkout vào từng backend điểm danh (mỗi lần ghi là một sự kiện bền vững)"""
+    from modules.attendance_store import JsonAttendanceStore, SqliteAttendanceStore
+    results = {}
+    count = ctx.args.attendance_events
+    today = datetime.date.today().isoformat()
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = {
+            "json": JsonAttendanceStore(os.path.join(tmp, 'attendance.json')),
+            "sqlite": SqliteAttendanceStore(os.path.join(tmp, 'attendance.db')),
+        }
+        for backend, store in stores.items():
+            names = [f"user_{i:05d}" for i in range(count)]
+            results[f"attendance.checkin.{backend}"] = time_each(
+                lambda name: store.record_checkin(today, name, "08:00:00", "benchmark"), names)
+            results[f"attendance.checkout.{backend}"] = time_each(
+                lambda name: store.record_checkout(today, name, "17:00:00", "benchmark"), names)
+            results[f"attendance.compact.{backend}"] = time_calls(store.compact, 1, warmup=0)
+            store.close()
+    return results
+
+
+def suite_export(ctx):
+    """Xuất lịch sử điểm danh tổng hợp ra CSV (theo lô), báo cáo khoảng ngày và báo cáo ngày ra Excel"""
+    from modules.attendance import AttendanceSystem
+    from modules.attendance_export import export_attendance
+    results = {}
+    num_users, num_days = ctx.args.export_users, ctx.args.export_days
+    history = synthetic_history(num_users, num_days)
+    rows = sum(len(day) for day in history.values())
+    users = [f"user_{i:05d}" for i in range(num_users)]
+    dates = sorted(history)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        system = AttendanceSystem(attendance_file=os.path.join(tmp, 'attendance.json'), backend='sqlite',
+                                  db_file=os.path.join(tmp, 'attendance.db'))
+        system.store.import_data(history)
+
+        csv_file = os.path.join(tmp, 'history.csv')
+        results["export.history_csv"] = time_calls(
+            lambda: export_attendance(system.store.iter_rows(), csv_file), ctx.repeat, warmup=0, rows=rows)
+
+        # Báo cáo Excel cần openpyxl; khi lỗi các hàm xuất chỉ in lỗi và trả về False
+        def checked(fn):
+            def call():
+                if not fn():
+                    raise RuntimeError("Excel export failed (is openpyxl installed?)")
+            return call
+
+        try:
+            report_file = os.path.join(tmp, 'range.xlsx')
+            results["export.range_report_excel"] = time_calls(
+                checked(lambda: system.export_range_report(users, dates[0], dates[-1], file_path=report_file)),
+                ctx.repeat, warmup=0, rows=rows)
+            day_file = os.path.join(tmp, 'day.xlsx')
+            results["export.day_excel"] = time_calls(
+                checked(lambda: system.export_to_excel(users, dates[-1], file_path=day_file)), ctx.repeat,
+                warmup=0, rows=len(history[dates[-1]]))
+        except RuntimeError as e:
+            ctx.errors["export.excel"] = str(e)
+        finally:
+            system.store.close()
+    return results
+
+
+def suite_e2e(ctx):
+    """Độ trễ end-to-end của một frame: phát hiện + mã hóa + so khớp (có và không có tracker)"""
+    from modules.face_loader import batch_face_encodings
+    from modules.detection import IMAGE_PROFILE
+    from modules.matcher import GalleryMatcher
+    from modules.webcam import FrameRecognizer, recognize_frame
+
+    # Gallery thật từ photo/ cộng thêm các dòng tổng hợp để có kích thước gần thực tế
+    items = []
+    for image in ctx.images():
+        small_image, locations, _ = IMAGE_PROFILE.detect(image)
+        if locations:
+            items.append((small_image, locations[:1]))
+    real = [encodings[0] for encodings in batch_face_encodings(items)]
+    filler, filler_names, _ = synthetic_gallery(ctx.args.e2e_gallery_size)
+    encodings = np.vstack([np.asarray(real, dtype=np.float32).reshape(-1, ENCODING_DIM), filler])
+    names = [f"photo_{i}" for i in range(len(real))] + filler_names
+    matcher = GalleryMatcher(encodings, names)
+
+    frames = ctx.frames()
+    results = {"e2e.recognize_frame": time_each(lambda frame: recognize_frame(frame, matcher), frames,
+                                                gallery_size=len(encodings))}
+    recognizer = FrameRecognizer(matcher)
+    # Cùng một frame nhiều lần: các frame sau dùng lại danh tính của tracker
+    results["e2e.frame_recognizer_tracked"] = time_each(recognizer, [frames[0]] * max(ctx.repeat, 5),
+                                                        gallery_size=len(encodings))
+    return results
+
+
+SUITE_FUNCTIONS = {
+    'decode': suite_decode,
+    'detect': suite_detect,
+    'encode': suite_encode,
+    'match': suite_match,
+    'attendance': suite_attendance,
+    'export': suite_export,
+    'e2e': suite_e2e,
+}
+
+
+# ==================== SO SÁNH ====================
+
+def compare_results(baseline, current, threshold):
+    """
+    So sánh median_ms của các benchmark có trong cả hai lần chạy
+
+    Returns:
+        list: (tên, baseline ms, hiện tại ms, tỉ lệ, có bị chậm đi quá threshold không)
+    """
+    rows = []
+    for name, result in sorted(current.get("results", {}).items()):
+        before = baseline.get("results", {}).get(name)
+        if not before or "median_ms" not in before or "median_ms" not in result:
+            continue
+        ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] > 0 else float('inf')
+        rows.append((name, before["median_ms"], result["median_ms"], ratio, ratio > 1.0 + threshold))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print(f"\n===== SO SÁNH (ngưỡng +{threshold:.0%}) =====")
+    for name, before, after, ratio, regressed in rows:
+        mark = "REGRESSION" if regressed else ""
+        print(f"{name:<40} {before:10.3f} ms -> {after:10.3f} ms  ({ratio:5.2f}x) {mark}")
+    regressions = sum(1 for row in rows if row[4])
+    print(f"{regressions} regression(s) in {len(rows)} compared benchmark(s)")
+
+
+def check_recall(results, min_recall):
+    """
+    Các kết quả có recall nhỏ hơn min_recall
+
+    Returns:
+        list: (tên, recall)
+    """
+    return [(name, result["recall"]) for name, result in sorted(results.items())
+            if "recall" in result and result["recall"] < min_recall]
+
+
+def print_results(results, errors):
+    print("\n===== BENCHMARKS =====")
+    for name, result in sorted(results.items()):
+        recall = f"  recall {result['recall']:.3f}" if "recall" in result else ""
+        print(f"{name:<40} median {result['median_ms']:10.3f} ms  p95 {result['p95_ms']:10.3f} ms  (n={result['n']}){recall}")
+    for suite, error in errors.items():
+        print(f"{suite:<40} ERROR: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the face recognition / attendance benchmark suite")
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--quick', action='store_true', help="smaller galleries and datasets")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--photos', default=os.path.join(REPO_ROOT, 'photo'))
+    parser.add_argument('--max-images', type=int, default=64)
+    parser.add_argument('--frames', type=int, default=16)
+    parser.add_argument('--frame-size', type=int, nargs=2, default=(1280, 720), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--gallery-sizes', type=int, nargs='+')
+    parser.add_argument('--ivf-min-size', type=int, default=10000)
+    parser.add_argument('--match-batch', type=int, default=8)
+    parser.add_argument('--recall-queries', type=int, default=500, help="seeded queries for the IVF recall check")
+    parser.add_argument('--min-recall', type=float, default=0.95,
+                        help="IVF recall@1 (default n_probe) below this counts as a regression")
+    parser.add_argument('--e2e-gallery-size', type=int, default=1000)
+    parser.add_argument('--attendance-events', type=int, default=1000)
+    parser.add_argument('--export-users', type=int, default=200)
+    parser.add_argument('--export-days', type=int, default=120)
+    parser.add_argument('--output', help="JSON results file (default reports/benchmarks_<timestamp>.json)")
+    parser.add_argument('--compare', help="baseline JSON results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="allowed slowdown of median_ms before a benchmark counts as a regression")
+    args = parser.parse_args()
+
+    if args.gallery_sizes is None:
+        args.gallery_sizes = list(QUICK_GALLERY_SIZES if args.quick else GALLERY_SIZES)
+    if args.quick:
+        args.max_images = min(args.max_images, 16)
+        args.frames = min(args.frames, 4)
+        args.attendance_events = min(args.attendance_events, 200)
+        args.export_days = min(args.export_days, 30)
+
+    ctx = BenchmarkContext(args)
+    results = {}
+    errors = {}
+    for suite in args.suites:
+        print(f"Running {suite}...")
+        start = time.perf_counter()
+        try:
+            results.update(SUITE_FUNCTIONS[suite](ctx))
+        except Exception as e:
+            errors[suite] = f"{type(e).__name__}: {e}"
+        print(f"  {suite} done in {time.perf_counter() - start:.1f}s")
+    errors.update(ctx.errors)
+
+    output = {
+        "created": datetime.datetime.now().isoformat(timespec='seconds'),
+        "machine": machine_info(),
+        "config": {key: (list(value) if isinstance(value, tuple) else value) for key, value in vars(args).items()},
+        "results": results,
+        "errors": errors,
+    }
+    print_results(results, errors)
+
+    output_file = args.output
+    if output_file is None:
+        os.makedirs(os.path.join(REPO_ROOT, 'reports'), exist_ok=True)
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        output_file = os.path.join(REPO_ROOT, 'reports', f"benchmarks_{timestamp}.json")
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+    print(f"\nĐã ghi kết quả vào {output_file}")
+
+    low_recall = check_recall(results, args.min_recall)
+    for name, recall in low_recall:
+        print(f"{name:<40} recall {recall:.3f} < {args.min_recall:.3f}  REGRESSION")
+    failed = bool(low_recall)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare_results(baseline, output, args.threshold)
+        print_comparison(rows, args.threshold)
+        failed = failed or any(row[4] for row in rows)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,17 +6,14 @@ Sử dụng Tkinter để tạo giao diện thân thiện với người dùng
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, scrolledtext
 import threading
-import cv2
-from PIL import Image, ImageTk
 import os
 import datetime
 import json
 
-# Import các module từ dự án
+# Import các module từ dự án (nhẹ; face_recognition, cv2 và pandas chỉ được import khi cần)
 from modules.face_loader import FaceEncoder
-from modules.webcam import recognize_from_webcam
-from modules.image_processor import recognize_from_image
 from modules.attendance import AttendanceSystem
+from modules.metrics import configure_from_env
 
 class SimpleFaceRecognitionApp:
     def __init__(self, root):
@@ -100,6 +97,15 @@ class SimpleFaceRecognitionApp:
             font=("Arial", 9)
         )
         self.status_label.pack(side="bottom", pady=(10, 0))
+        
+        # Trạng thái nạp model nhận diện (FaceEncoder đã bắt đầu nạp trên luồng nền)
+        self.model_label = ttk.Label(
+            main_frame,
+            text=self.encoder.runtime.status_text(),
+            font=("Arial", 9)
+        )
+        self.model_label.pack(side="bottom")
+        self.update_model_status()
 
     def create_recognition_tab(self):
         """Tạo tab nhận diện"""
@@ -291,7 +297,7 @@ class SimpleFaceRecognitionApp:
             try:
                 # Tải dữ liệu khuôn mặt
                 if not self.encoder.load_encodings():
-                    if self.encoder.load_photos():
+                    if self.encoder.sync_photos(parallel=True):
                         self.encoder.save_encodings()
                         self.root.after(0, lambda: self.log_message("✅ Đã tải dữ liệu từ ảnh"))
                     else:
@@ -327,6 +333,13 @@ class SimpleFaceRecognitionApp:
         """Cập nhật trạng thái"""
         self.status_label.config(text=message)
 
+    def update_model_status(self):
+        """Cập nhật trạng thái model cho đến khi nạp xong"""
+        runtime = self.encoder.runtime
+        self.model_label.config(text=runtime.status_text())
+        if not runtime.ready.is_set():
+            self.root.after(500, self.update_model_status)
+
     def update_user_info(self):
         """Cập nhật thông tin người dùng"""
         try:
@@ -345,12 +358,14 @@ class SimpleFaceRecognitionApp:
         
         def worker():
             try:
+                from modules.webcam import recognize_from_webcam
                 known_face_encodings, known_face_names = self.encoder.get_encodings()
                 recognize_from_webcam(
                     known_face_encodings,
                     known_face_names,
                     self.encoder.get_all_users(),
-                    camera_id=1
+                    camera_id=1,
+                    matcher=self.encoder.get_live_matcher()
                 )
                 self.root.after(0, lambda: self.log_message("✅ Đã hoàn thành nhận diện qua webcam"))
                 self.root.after(0, lambda: self.update_status("🟢 Sẵn sàng"))
@@ -378,12 +393,14 @@ class SimpleFaceRecognitionApp:
         
         def worker():
             try:
+                from modules.image_processor import recognize_from_image
                 known_face_encodings, known_face_names = self.encoder.get_encodings()
                 recognize_from_image(
                     file_path,
                     known_face_encodings,
                     known_face_names,
-                    self.encoder.get_all_users()
+                    self.encoder.get_all_users(),
+                    matcher=self.encoder.get_matcher()
                 )
                 self.root.after(0, lambda: self.log_message("✅ Đã hoàn thành nhận diện ảnh"))
                 self.root.after(0, lambda: self.update_status("🟢 Sẵn sàng"))
@@ -475,7 +492,8 @@ class SimpleFaceRecognitionApp:
                     known_face_names,
                     self.encoder.get_all_users(),
                     is_checkout=is_checkout,
-                    camera_id=1
+                    camera_id=1,
+                    matcher=self.encoder.get_live_matcher()
                 )
                 self.root.after(0, lambda: self.log_message(f"✅ Hoàn thành {action}", self.attendance_text))
                 self.root.after(0, lambda: self.update_status("🟢 Sẵn sàng"))
@@ -505,8 +523,29 @@ class SimpleFaceRecognitionApp:
             self.log_message(f"👤 {name}: Check-in {checkin}, Check-out {checkout}", self.attendance_text)
 
     def reload_data(self):
-        """Tải lại dữ liệu"""
-        self.load_initial_data()
+        """Tải lại dữ liệu (chỉ mã hóa những ảnh mới hoặc đã thay đổi)"""
+        self.log_message("🔄 Đang đồng bộ dữ liệu khuôn mặt...", self.attendance_text)
+        self.update_status("Đang tải lại dữ liệu...")
+
+        def worker():
+            try:
+                if self.encoder.sync_photos(parallel=True):
+                    if self.encoder.gallery_dirty:
+                        self.encoder.save_encodings()
+                    self.root.after(0, lambda: self.log_message("✅ Đã tải lại dữ liệu khuôn mặt", self.attendance_text))
+                else:
+                    self.root.after(0, lambda: self.log_message("❌ Không thể tải dữ liệu khuôn mặt", self.attendance_text))
+
+                self.root.after(0, self.update_user_info)
+                self.root.after(0, self.refresh_user_list)
+                self.root.after(0, self.refresh_attendance_today)
+                self.root.after(0, lambda: self.update_status("🟢 Sẵn sàng"))
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: self.log_message(f"❌ Lỗi tải lại dữ liệu: {error}", self.attendance_text))
+                self.root.after(0, lambda: self.update_status("❌ Lỗi tải dữ liệu"))
+
+        threading.Thread(target=worker, daemon=True).start()
 
     # ==================== CHỨC NĂNG BÁO CÁO ====================
 
@@ -720,6 +759,7 @@ class EditUserDialog:
 def main():
     """Hàm main chạy ứng dụng"""
     try:
+        configure_from_env()
         root = tk.Tk()
         app = SimpleFaceRecognitionApp(root)
         root.mainloop()
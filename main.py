@@ -3,18 +3,22 @@ File chính của ứng dụng nhận diện khuôn mặt
 """
 from modules.face_loader import FaceEncoder
 from modules.menu_management import handle_main_menu
+from modules.metrics import configure_from_env
 
 def main():
     """Hàm chính khởi chạy ứng dụng"""
     print("===== FACE RECOGNITION SYSTEM =====")
     
+    # Đo thời gian từng bước khi bật FACE_METRICS=1 (xem modules/metrics.py)
+    configure_from_env()
+    
     # Khởi tạo FaceEncoder
     encoder = FaceEncoder()
     
     # Thử tải từ file có sẵn
     if not encoder.load_encodings():
         # Nếu không có file có sẵn hoặc lỗi, tải từ ảnh gốc
-        if encoder.load_photos():
+        if encoder.sync_photos(parallel=True):
             # Lưu lại để lần sau dùng
             encoder.save_encodings()
         else:
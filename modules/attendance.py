@@ -1,39 +1,63 @@
 import os
 import json
+import time
 import datetime
-import cv2
-import face_recognition
-import numpy as np
-from time import sleep
-import pandas as pd
 from datetime import datetime as dt
+from modules.attendance_store import backend_from_env, open_attendance_store, load_attendance_json
+from modules.metrics import get_metrics, timer
 
 class AttendanceSystem:
-    def __init__(self, attendance_file='data/attendance.json'):
+    """
+    Hệ thống điểm danh
+
+    Dữ liệu được lưu qua một store (xem attendance_store):
+        - backend='json' (mặc định): snapshot attendance.json + nhật ký sự kiện attendance_events.jsonl
+        - backend='sqlite': CSDL SQLite db_file, dữ liệu JSON hiện có được nhập khi tạo CSDL lần đầu
+    backend=None lấy theo biến môi trường ATTENDANCE_BACKEND (mặc định 'json'); đặt
+    ATTENDANCE_BACKEND=sqlite để GUI, menu, nhiều camera và dịch vụ HTTP cùng ghi điểm danh.
+    """
+
+    def __init__(self, attendance_file='data/attendance.json', journal_file=None, compact_every=500,
+                 backend=None, db_file='data/attendance.db'):
+        if backend is None:
+            backend = backend_from_env()
         self.attendance_file = attendance_file
+        self.backend = backend
         # Đảm bảo thư mục data tồn tại
         os.makedirs(os.path.dirname(attendance_file), exist_ok=True)
-        self.attendance_data = self.load_attendance_data()
-        
-    def load_attendance_data(self):
-        """Tải dữ liệu điểm danh từ file"""
-        if not os.path.exists(self.attendance_file):
-            return {}
-        
-        try:
-            with open(self.attendance_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Lỗi khi tải dữ liệu điểm danh: {e}")
-            return {}
+        if backend == 'json':
+            options = {"journal_file": journal_file, "compact_every": compact_every}
+        else:
+            options = {}
+            os.makedirs(os.path.dirname(db_file) or '.', exist_ok=True)
+        self.store = open_attendance_store(backend, attendance_file=attendance_file, db_file=db_file, **options)
             
     def save_attendance_data(self):
-        """Lưu dữ liệu điểm danh vào file"""
-        with open(self.attendance_file, 'w', encoding='utf-8') as f:
-            json.dump(self.attendance_data, f, ensure_ascii=False, indent=2)
-        print(f"Đã lưu dữ liệu điểm danh vào {self.attendance_file}")
+        """Lưu dữ liệu điểm danh (gộp nhật ký sự kiện vào snapshot)"""
+        self.store.compact()
+
+    def compact(self):
+        """Gộp nhật ký sự kiện vào snapshot (JSON) hoặc WAL vào file CSDL (SQLite)"""
+        with timer('attendance_compact'):
+            self.store.compact()
+
+    def import_attendance_json(self, file_path):
+        """
+        Nhập dữ liệu điểm danh từ một file attendance.json (định dạng cũ) vào dữ liệu hiện tại
+
+        Mục đã có trong dữ liệu hiện tại được giữ nguyên; chỉ check-out còn thiếu được bổ sung.
+        """
+        try:
+            attendance_data = load_attendance_json(file_path)
+        except Exception as e:
+            print(f"Lỗi khi đọc file {file_path}: {e}")
+            return False
+
+        count = self.store.import_data(attendance_data)
+        print(f"Đã nhập {count} mục điểm danh từ {file_path}")
+        return True
     
-    def mark_attendance(self, name, timestamp=None):
+    def mark_attendance(self, name, timestamp=None, source=None):
         """Điểm danh một người dùng (check-in)"""
         # Lấy ngày hiện tại
         today = datetime.date.today().isoformat()
@@ -42,28 +66,23 @@ class AttendanceSystem:
         if timestamp is None:
             timestamp = datetime.datetime.now().strftime("%H:%M:%S")
         
-        # Tạo mục cho ngày hôm nay nếu chưa có
-        if today not in self.attendance_data:
-            self.attendance_data[today] = {}
-        
-        # Kiểm tra xem người này đã điểm danh chưa
-        if name in self.attendance_data[today]:
-            # Nếu đã checkout thì không cho check-in lại
-            if "checkout" in self.attendance_data[today][name]:
-                print(f"{name} đã hoàn thành cả check-in và check-out.")
-                return False
-            # Nếu chỉ có check-in thì không làm gì
-            print(f"{name} đã điểm danh trước đó lúc {self.attendance_data[today][name]['checkin']}")
+        # Đánh dấu người này đã điểm danh (check-in); store chỉ ghi khi người này chưa có mục trong ngày
+        with timer('attendance_save'):
+            recorded = self.store.record_checkin(today, name, timestamp, source)
+        if recorded:
             return True
         
-        # Đánh dấu người này đã điểm danh (check-in)
-        self.attendance_data[today][name] = {"checkin": timestamp}
-        
-        # Lưu dữ liệu
-        self.save_attendance_data()
+        # Người này đã điểm danh trước đó (có thể từ camera hoặc tiến trình khác)
+        entry = self.store.get_entry(today, name) or {}
+        # Nếu đã checkout thì không cho check-in lại
+        if "checkout" in entry:
+            print(f"{name} đã hoàn thành cả check-in và check-out.")
+            return False
+        # Nếu chỉ có check-in thì không làm gì
+        print(f"{name} đã điểm danh trước đó lúc {entry.get('checkin', 'N/A')}")
         return True
         
-    def checkout(self, name, timestamp=None):
+    def checkout(self, name, timestamp=None, source=None):
         """Đánh dấu checkout cho một người dùng"""
         today = datetime.date.today().isoformat()
         
@@ -72,49 +91,33 @@ class AttendanceSystem:
             timestamp = datetime.datetime.now().strftime("%H:%M:%S")
         
         # Kiểm tra xem người này đã điểm danh chưa
-        if today not in self.attendance_data or name not in self.attendance_data[today]:
+        entry = self.store.get_entry(today, name)
+        if entry is None:
             print(f"{name} chưa điểm danh hôm nay, không thể checkout.")
             return False
         
-        # Kiểm tra xem đã checkout chưa
-        if "checkout" in self.attendance_data[today][name]:
-            print(f"{name} đã checkout trước đó lúc {self.attendance_data[today][name]['checkout']}")
-        else:
-            # Đánh dấu checkout
-            self.attendance_data[today][name]["checkout"] = timestamp
-            self.save_attendance_data()
+        # Đánh dấu checkout; store không ghi nếu đã checkout trước đó
+        with timer('attendance_save'):
+            recorded = self.store.record_checkout(today, name, timestamp, source)
+        if recorded:
             print(f"Đã ghi nhận checkout cho {name} lúc {timestamp}")
+        else:
+            entry = self.store.get_entry(today, name) or {}
+            print(f"{name} đã checkout trước đó lúc {entry.get('checkout', 'N/A')}")
         
         return True
         
     def get_today_attendance(self):
         """Lấy danh sách điểm danh cho ngày hôm nay"""
-        today = datetime.date.today().isoformat()
-        attendance_data = self.attendance_data.get(today, {})
-        
-        # Chuyển đổi định dạng dữ liệu cũ nếu cần
-        converted_data = {}
-        for name, value in attendance_data.items():
-            if isinstance(value, str):  # Định dạng cũ chỉ lưu thời gian check-in
-                converted_data[name] = {"checkin": value}
-            else:
-                converted_data[name] = value
-                
-        return converted_data
+        return self.get_date_attendance(datetime.date.today().isoformat())
         
     def get_date_attendance(self, date):
         """Lấy danh sách điểm danh cho một ngày cụ thể"""
-        attendance_data = self.attendance_data.get(date, {})
-        
-        # Chuyển đổi định dạng dữ liệu cũ nếu cần
-        converted_data = {}
-        for name, value in attendance_data.items():
-            if isinstance(value, str):  # Định dạng cũ chỉ lưu thời gian check-in
-                converted_data[name] = {"checkin": value}
-            else:
-                converted_data[name] = value
-                
-        return converted_data
+        return self.store.get_day(date)
+
+    def get_range_attendance(self, start_date, end_date):
+        """Lấy dữ liệu điểm danh từ start_date đến end_date (YYYY-MM-DD, bao gồm cả hai): {ngày: {tên: mục}}"""
+        return self.store.get_range(start_date, end_date)
         
     def get_absent_list(self, all_users, date=None):
         """Lấy danh sách người vắng mặt"""
@@ -131,22 +134,37 @@ class AttendanceSystem:
         absent_list = [user for user in unique_users if user not in attendance_data]
         return absent_list
 
-    def take_attendance_webcam(self, known_face_encodings, known_face_names, user_info=None, is_checkout=False, camera_id=1):
-        """Điểm danh thông qua webcam (có thể là check-in hoặc check-out)"""
+    def take_attendance_webcam(self, known_face_encodings, known_face_names, user_info=None, is_checkout=False, camera_id=1,
+                               matcher=None, num_workers=1, source=None, headless=False, results_file=None,
+                               motion_gate=True):
+        """
+        Điểm danh thông qua webcam (có thể là check-in hoặc check-out)
+
+        Args:
+            source: Nguồn frame (camera, file video, thư mục ảnh - xem frame_source.open_source);
+                    mặc định là camera camera_id
+            headless: Không mở cửa sổ, xử lý mọi frame và ghi kết quả từng frame ra results_file (JSONL)
+            motion_gate: Bỏ qua phát hiện khuôn mặt khi khung cảnh không đổi (xem motion_gate.MotionGate)
+        """
+        # Import khi cần: các module nhận diện kéo theo face_recognition (dlib) và cv2
+        import cv2
+        from modules.matcher import GalleryMatcher
+        from modules.motion_gate import MotionGate
+        from modules.pipeline import FramePipeline
+        from modules.detection import get_detection_profile
+        from modules.webcam import (FrameRecognizer, open_frame_source, run_headless, default_results_file,
+                                    draw_metrics_overlay)
+        
         # Sử dụng camera mặc định là 1, bỏ phần chọn camera
         # Nếu có truyền camera_id thì sử dụng, nếu không thì mặc định là 1
-        if camera_id is None:
-            camera_id = 1  # Mặc định sử dụng camera 1
-    
-        # Mở webcam
-        video_capture = cv2.VideoCapture(camera_id)
+        video_capture = open_frame_source(source, camera_id)
         
         if not video_capture.isOpened():
-            print(f"Lỗi: Không thể mở camera {camera_id}")
+            print(f"Lỗi: Không thể mở nguồn {video_capture.name}")
             return
         
         action_type = "check-out" if is_checkout else "điểm danh"
-        print(f"Bắt đầu {action_type} qua camera {camera_id}. Nhấn 'q' để kết thúc.")
+        print(f"Bắt đầu {action_type} qua {video_capture.name}. Nhấn 'q' để kết thúc.")
         
         # Lấy danh sách người đã điểm danh hôm nay
         today_attendance = self.get_today_attendance()
@@ -159,17 +177,83 @@ class AttendanceSystem:
             checkout_time = today_attendance[user].get('checkout', 'N/A')
             print(f"- {user} (Check-in: {checkin_time}, Check-out: {checkout_time})")
         
-        process_this_frame = True
+        # Xếp gallery thành ma trận một lần cho cả phiên (nếu chưa có matcher dựng sẵn)
+        if matcher is None:
+            matcher = GalleryMatcher(known_face_encodings, known_face_names)
+        
         confirmed_users = set()  # Set lưu những người đã được xác nhận điểm danh hoặc checkout
         
+        def process_names(detected_names):
+            """Ghi điểm danh/checkout cho những người mới nhận diện được"""
+            nonlocal today_attendance, attended_users
+            for name in detected_names:
+                # Nếu nhận dạng được người và chưa được xác nhận
+                if name != "Unknown" and name not in confirmed_users:
+                    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+                    
+                    if is_checkout:
+                        # Xử lý checkout
+                        if name in today_attendance and "checkout" not in today_attendance[name]:
+                            self.checkout(name, timestamp, source=video_capture.name)
+                            # Thêm vào danh sách đã xác nhận
+                            confirmed_users.add(name)
+                            # Cập nhật danh sách
+                            today_attendance = self.get_today_attendance()
+                            # Thông báo
+                            print(f"Check-out thành công: {name} - {timestamp}")
+                    else:
+                        # Xử lý check-in
+                        self.mark_attendance(name, timestamp, source=video_capture.name)
+                        # Thêm vào danh sách đã xác nhận
+                        confirmed_users.add(name)
+                        # Cập nhật danh sách
+                        today_attendance = self.get_today_attendance()
+                        # Thông báo
+                        print(f"Điểm danh thành công: {name} - {timestamp}")
+                    
+                    # Cập nhật danh sách người đã điểm danh
+                    attended_users = list(today_attendance.keys())
+        
+        # Capture, inference và render chạy ở các luồng khác nhau; việc ghi điểm danh
+        # chỉ diễn ra ở luồng render này nên không cần khóa dữ liệu điểm danh.
+        # Nguồn không trực tiếp thì không bỏ frame
+        recognizer = FrameRecognizer(matcher, profile=get_detection_profile(video_capture.name))
+        gate = MotionGate() if motion_gate else None
+        pipeline = FramePipeline(video_capture, recognizer, num_workers=num_workers,
+                                 drop_frames=video_capture.is_live, collect_results=headless, gate=gate)
+        pipeline.start()
+        
+        if headless:
+            try:
+                run_headless(pipeline, video_capture, results_file or default_results_file('attendance'),
+                             on_result=lambda frame_id, locations, names: process_names(names))
+            finally:
+                pipeline.stop()
+                print(f"Pipeline: {pipeline.stats_text()}, processed {pipeline.processed_frames} frames")
+                print(f"Tracker: {recognizer.stats_text()}")
+                if gate is not None:
+                    print(f"Motion gate: {gate.stats_text()}")
+                if get_metrics().enabled:
+                    print(get_metrics().summary_text())
+                video_capture.release()
+                self.compact()
+            return
+        
+        face_locations = []
+        face_names = []
+        
         while True:
-            # Đọc frame từ webcam
-            ret, frame = video_capture.read()
+            # Lấy frame mới nhất cùng kết quả nhận diện mới nhất
+            item = pipeline.read()
             
-            if not ret:
-                print("Lỗi: Không thể đọc hình ảnh từ webcam")
+            if item is None:
+                if video_capture.is_live:
+                    print("Lỗi: Không thể đọc hình ảnh từ webcam")
                 break
+            
+            frame, result, result_is_new = item
                 
+            draw_start = time.perf_counter()
             # Thêm thông tin điểm danh vào góc màn hình
             title = "CHECK-OUT" if is_checkout else "ĐIỂM DANH"
             cv2.putText(frame, f"{title}: {len(attended_users)}", (10, 30), 
@@ -184,71 +268,17 @@ class AttendanceSystem:
                 cv2.putText(frame, f"{user} - {status}", (10, y_pos), 
                             cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
                 y_pos += 25
+            # Thời gian vẽ không tính phần ghi điểm danh bên dưới
+            draw_seconds = time.perf_counter() - draw_start
             
-            # Chỉ xử lý 1 frame, bỏ qua 1 frame để tối ưu hiệu năng
-            if process_this_frame:
-                # Thu nhỏ frame để xử lý nhanh hơn
-                small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-                
-                # Chuyển từ BGR sang RGB
-                rgb_small_frame = small_frame[:, :, ::-1]
-                
-                # Tìm khuôn mặt trong frame
-                face_locations = face_recognition.face_locations(rgb_small_frame)
-                face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-                
-                face_names = []
-                for face_encoding in face_encodings:
-                    # So sánh với khuôn mặt đã biết
-                    matches = face_recognition.compare_faces(known_face_encodings, face_encoding)
-                    name = "Unknown"
-                    
-                    # Tìm khuôn mặt gần giống nhất
-                    face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-                    if len(face_distances) > 0:
-                        best_match_index = np.argmin(face_distances)
-                        if matches[best_match_index]:
-                            name = known_face_names[best_match_index]
-                            
-                            # Nếu nhận dạng được người và chưa được xác nhận
-                            if name != "Unknown" and name not in confirmed_users:
-                                timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-                                
-                                if is_checkout:
-                                    # Xử lý checkout
-                                    if name in today_attendance and "checkout" not in today_attendance[name]:
-                                        self.checkout(name, timestamp)
-                                        # Thêm vào danh sách đã xác nhận
-                                        confirmed_users.add(name)
-                                        # Cập nhật danh sách
-                                        today_attendance = self.get_today_attendance()
-                                        # Thông báo
-                                        print(f"Check-out thành công: {name} - {timestamp}")
-                                else:
-                                    # Xử lý check-in
-                                    self.mark_attendance(name, timestamp)
-                                    # Thêm vào danh sách đã xác nhận
-                                    confirmed_users.add(name)
-                                    # Cập nhật danh sách
-                                    today_attendance = self.get_today_attendance()
-                                    # Thông báo
-                                    print(f"Điểm danh thành công: {name} - {timestamp}")
-                                
-                                # Cập nhật danh sách người đã điểm danh
-                                attended_users = list(today_attendance.keys())
-                    
-                    face_names.append(name)
-            
-            process_this_frame = not process_this_frame
+            # Chỉ xử lý điểm danh khi có kết quả inference mới
+            if result_is_new:
+                face_locations, face_names = result
+                process_names(face_names)
             
+            draw_start = time.perf_counter()
             # Hiển thị kết quả
             for (top, right, bottom, left), name in zip(face_locations, face_names):
-                # Đổi kích thước vị trí về kích thước gốc
-                top *= 4
-                right *= 4
-                bottom *= 4
-                left *= 4
-                
                 # Vẽ khung và tên
                 if name == "Unknown":
                     color = (0, 0, 255)  # Đỏ cho người không xác định
@@ -285,20 +315,61 @@ class AttendanceSystem:
                         cv2.putText(frame, f"Age: {age}", (left, bottom + 45), 
                                     cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
             
+            # Hiển thị thống kê pipeline và thời gian từng bước (dưới danh sách người điểm danh gần đây)
+            cv2.putText(frame, pipeline.stats_text(), (10, frame.shape[0] - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+            draw_metrics_overlay(frame, origin=(10, y_pos + 10))
+            get_metrics().observe('draw', draw_seconds + time.perf_counter() - draw_start)
+            
             # Hiển thị kết quả
-            cv2.imshow('Attendance System', frame)
+            with timer('display'):
+                cv2.imshow('Attendance System', frame)
+                key = cv2.waitKey(1) & 0xFF
             
             # Nhấn 'q' để thoát
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            if key == ord('q'):
                 break
                 
         # Dọn dẹp
+        pipeline.stop()
+        print(f"Pipeline: {pipeline.stats_text()}, dropped {pipeline.dropped_frames} frames")
+        print(f"Tracker: {recognizer.stats_text()}")
+        if gate is not None:
+            print(f"Motion gate: {gate.stats_text()}")
+        if get_metrics().enabled:
+            print(get_metrics().summary_text())
         video_capture.release()
         cv2.destroyAllWindows()
         
+        # Gộp nhật ký sự kiện của phiên vào snapshot
+        self.compact()
+        
         print(f"\nKết thúc phiên {action_type}!")
         return list(set(attended_users))  # Trả về danh sách không trùng lặp
         
+    def take_attendance_multi_camera(self, known_face_encodings, known_face_names, sources, is_checkout=False,
+                                     matcher=None, num_workers=2, show=True, motion_gate=True, duration=None):
+        """
+        Điểm danh đồng thời từ nhiều camera (hoặc file video / thư mục ảnh) trong một tiến trình
+
+        Gallery và matcher được dùng chung; mỗi nguồn có luồng capture riêng và các nguồn chia
+        nhau num_workers luồng inference (xem attendance_service.AttendanceService).
+
+        Returns:
+            list: Danh sách người đã được ghi nhận trong phiên
+        """
+        # Import khi cần: các module nhận diện kéo theo face_recognition (dlib) và cv2
+        from modules.attendance_service import AttendanceService
+        from modules.matcher import GalleryMatcher
+        
+        if matcher is None:
+            matcher = GalleryMatcher(known_face_encodings, known_face_names)
+        
+        service = AttendanceService(self, matcher, sources, num_workers=num_workers, is_checkout=is_checkout,
+                                    motion_gate=motion_gate)
+        service.run(show=show, duration=duration)
+        return sorted(service.confirmed)
+        
     def calculate_duration(self, checkin, checkout):
         """Tính thời gian tham gia (giờ:phút:giây)"""
         if not checkin or not checkout:
@@ -322,6 +393,8 @@ class AttendanceSystem:
     
     def export_to_excel(self, all_users, date=None, file_path=None):
         """Xuất báo cáo điểm danh ra file Excel"""
+        import pandas as pd
+        
         if date is None:
             date = datetime.date.today().isoformat()
             
@@ -374,6 +447,26 @@ class AttendanceSystem:
             print(f"Lỗi khi xuất báo cáo: {e}")
             return False
     
+    def export_history(self, file_path=None, start_date=None, end_date=None, file_format=None, chunk_size=10000):
+        """
+        Xuất toàn bộ lịch sử điểm danh (hoặc một khoảng ngày) ra CSV hoặc Parquet theo từng lô
+
+        Các cột: date, name, checkin, checkout, duration_seconds, status. Parquet cần pyarrow.
+        """
+        if file_path is None:
+            os.makedirs('reports', exist_ok=True)
+            extension = 'parquet' if file_format == 'parquet' else 'csv'
+            file_path = f"reports/attendance_history.{extension}"
+
+        try:
+            from modules.attendance_export import export_attendance
+            written = export_attendance(self.store.iter_rows(start_date, end_date, chunk_size), file_path, file_format)
+            print(f"Đã xuất {written} dòng điểm danh ra file: {file_path}")
+            return True
+        except Exception as e:
+            print(f"Lỗi khi xuất dữ liệu điểm danh: {e}")
+            return False
+    
     def display_attendance_report(self, all_users, date=None):
         """Hiển thị báo cáo điểm danh"""
         if date is None:
@@ -407,4 +500,46 @@ class AttendanceSystem:
         else:
             print("(Không có)")
         
-        print("============================")
\ No newline at end of file
+        print("============================")
+
+    def range_report(self, all_users, start_date, end_date, user_info=None, late_after=None):
+        """
+        Tính báo cáo điểm danh từ start_date đến end_date, trả về {tên sheet: DataFrame}
+
+        late_after: Check-in sau thời điểm này (HH:MM:SS) là đi muộn, mặc định attendance_report.DEFAULT_LATE_AFTER
+        """
+        from modules.attendance_report import build_range_report, DEFAULT_LATE_AFTER
+        range_data = self.get_range_attendance(start_date, end_date)
+        return build_range_report(range_data, all_users, start_date, end_date, user_info,
+                                  late_after or DEFAULT_LATE_AFTER)
+
+    def export_range_report(self, all_users, start_date, end_date, user_info=None, file_path=None,
+                            late_after=None):
+        """Xuất báo cáo điểm danh theo khoảng ngày ra một file Excel nhiều sheet"""
+        if file_path is None:
+            os.makedirs('reports', exist_ok=True)
+            file_path = f"reports/attendance_report_{start_date}_{end_date}.xlsx"
+
+        try:
+            from modules.attendance_report import export_range_report
+            report = self.range_report(all_users, start_date, end_date, user_info, late_after)
+            export_range_report(report, file_path)
+            print(f"Đã xuất báo cáo ra file: {file_path}")
+            return True
+        except Exception as e:
+            print(f"Lỗi khi xuất báo cáo: {e}")
+            return False
+
+    def display_range_report(self, all_users, start_date, end_date, user_info=None, late_after=None):
+        """Hiển thị báo cáo điểm danh theo khoảng ngày (tổng hợp theo người và theo phòng ban)"""
+        from modules.attendance_report import SUMMARY_SHEET, DEPARTMENT_SHEET, DEFAULT_LATE_AFTER
+        late_after = late_after or DEFAULT_LATE_AFTER
+        report = self.range_report(all_users, start_date, end_date, user_info, late_after)
+
+        print(f"\n===== BÁO CÁO ĐIỂM DANH {start_date} - {end_date} =====")
+        print(f"Đi muộn: check-in sau {late_after}")
+        print("\n----- THEO NGƯỜI -----")
+        print(report[SUMMARY_SHEET].to_string(index=False))
+        print("\n----- THEO PHÒNG BAN -----")
+        print(report[DEPARTMENT_SHEET].to_string(index=False))
+        print("============================")
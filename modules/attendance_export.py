@@ -0,0 +1,122 @@
+"""
+Module xuất toàn bộ lịch sử điểm danh ra CSV / Parquet theo từng lô
+
+Dữ liệu được đọc từ store theo lô (iter_rows) và ghi ngay ra file, nên bộ nhớ dùng cho việc
+xuất không phụ thuộc vào độ dài lịch sử. Mỗi dòng có các cột:
+    date, name, checkin, checkout, duration_seconds, status
+status là "complete" (đủ check-in và check-out), "missing_checkout" hoặc "missing_checkin".
+
+Parquet cần pyarrow (tùy chọn); CSV chỉ cần pandas.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_COLUMNS = ["date", "name", "checkin", "checkout", "duration_seconds", "status"]
+EXPORT_FORMATS = ('csv', 'parquet')
+
+if pa is not None:
+    PARQUET_SCHEMA = pa.schema([
+        ("date", pa.date32()),
+        ("name", pa.string()),
+        ("checkin", pa.time32('s')),
+        ("checkout", pa.time32('s')),
+        ("duration_seconds", pa.int32()),
+        ("status", pa.string()),
+    ])
+
+
+def _time_seconds(values):
+    """Chuỗi HH:MM:SS -> số giây từ 0 giờ (NaN nếu thiếu hoặc sai định dạng)"""
+    return pd.to_timedelta(values, errors="coerce").dt.total_seconds()
+
+
+def prepare_chunk(rows):
+    """
+    Tính duration_seconds và status cho một lô dòng (date, name, checkin, checkout)
+
+    Returns:
+        DataFrame: các cột EXPORT_COLUMNS cùng checkin_seconds, checkout_seconds (float, NaN khi thiếu)
+    """
+    df = pd.DataFrame(rows, columns=["date", "name", "checkin", "checkout"])
+    checkin = _time_seconds(df["checkin"])
+    checkout = _time_seconds(df["checkout"])
+    duration = checkout - checkin
+    # Checkout sau nửa đêm
+    duration = duration.where(~(duration < 0), duration + 86400)
+
+    df["checkin_seconds"] = checkin
+    df["checkout_seconds"] = checkout
+    df["duration_seconds"] = duration.round().astype("Int64")
+    df["status"] = np.where(checkin.isna(), "missing_checkin",
+                            np.where(checkout.isna(), "missing_checkout", "complete"))
+    return df
+
+
+def export_csv(chunks, file_path):
+    """Ghi các lô dòng ra CSV (UTF-8 có BOM để Excel đọc đúng tiếng Việt), trả về số dòng đã ghi"""
+    written = 0
+    with open(file_path, 'w', encoding='utf-8-sig', newline='') as f:
+        header = True
+        for rows in chunks:
+            df = prepare_chunk(rows)
+            df[EXPORT_COLUMNS].to_csv(f, header=header, index=False)
+            header = False
+            written += len(df)
+        if header:
+            pd.DataFrame(columns=EXPORT_COLUMNS).to_csv(f, index=False)
+    return written
+
+
+def _time_array(seconds):
+    mask = seconds.isna().to_numpy()
+    values = seconds.fillna(0).to_numpy(dtype=np.int32)
+    return pa.array(values, mask=mask, type=pa.int32()).cast(pa.time32('s'))
+
+
+def export_parquet(chunks, file_path):
+    """Ghi các lô dòng ra Parquet với schema cố định (mỗi lô là một row group), trả về số dòng đã ghi"""
+    if pa is None:
+        raise ImportError("pyarrow is required for Parquet export (pip install pyarrow)")
+
+    written = 0
+    with pq.ParquetWriter(file_path, PARQUET_SCHEMA) as writer:
+        for rows in chunks:
+            df = prepare_chunk(rows)
+            duration = df["duration_seconds"]
+            table = pa.Table.from_arrays([
+                pa.array(pd.to_datetime(df["date"]).to_numpy().astype('datetime64[D]'), type=pa.date32()),
+                pa.array(df["name"].astype(str).to_numpy(), type=pa.string()),
+                _time_array(df["checkin_seconds"]),
+                _time_array(df["checkout_seconds"]),
+                pa.array(duration.fillna(0).to_numpy(dtype=np.int32), mask=duration.isna().to_numpy(),
+                         type=pa.int32()),
+                pa.array(df["status"].to_numpy(), type=pa.string()),
+            ], schema=PARQUET_SCHEMA)
+            writer.write_table(table)
+            written += len(df)
+    return written
+
+
+def export_attendance(chunks, file_path, file_format=None):
+    """
+    Xuất các lô dòng điểm danh ra file
+
+    Args:
+        chunks: Iterable các lô dòng (date, name, checkin, checkout), ví dụ store.iter_rows()
+        file_format: 'csv' hoặc 'parquet'; mặc định theo phần mở rộng của file_path
+    """
+    if file_format is None:
+        file_format = 'parquet' if os.path.splitext(file_path)[1].lower() in ('.parquet', '.pq') else 'csv'
+    if file_format == 'csv':
+        return export_csv(chunks, file_path)
+    if file_format == 'parquet':
+        return export_parquet(chunks, file_path)
+    raise ValueError(f"Unknown export format: {file_format}")
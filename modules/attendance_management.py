@@ -11,7 +11,11 @@ def display_attendance_menu():
     print("3. Xem báo cáo điểm danh hôm nay")
     print("4. Xem báo cáo điểm danh theo ngày")
     print("5. Xuất báo cáo điểm danh ra Excel")
-    print("6. Quay lại menu chính")
+    print("6. Nhập dữ liệu điểm danh từ file JSON")
+    print("7. Báo cáo điểm danh theo khoảng ngày (xem và xuất Excel)")
+    print("8. Xuất toàn bộ lịch sử điểm danh (CSV/Parquet)")
+    print("9. Điểm danh nhiều camera cùng lúc")
+    print("10. Quay lại menu chính")
 
 def attendance_management(encoder):
     """Chức năng quản lý điểm danh"""
@@ -21,7 +25,7 @@ def attendance_management(encoder):
     
     while True:
         display_attendance_menu()
-        choice = input("Chọn chức năng (1-6): ")
+        choice = input("Chọn chức năng (1-10): ")
         
         if choice == '1':
             # Lấy dữ liệu khuôn mặt
@@ -33,7 +37,8 @@ def attendance_management(encoder):
                 known_face_names,
                 encoder.get_all_users(),
                 is_checkout=False,
-                camera_id=1  # Sử dụng camera 1 mặc định
+                camera_id=1,  # Sử dụng camera 1 mặc định
+                matcher=encoder.get_live_matcher()
             )
         elif choice == '2':
             # Checkout khi kết thúc
@@ -43,7 +48,8 @@ def attendance_management(encoder):
                 known_face_names,
                 encoder.get_all_users(),
                 is_checkout=True,
-                camera_id=1  # Sử dụng camera 1 mặc định
+                camera_id=1,  # Sử dụng camera 1 mặc định
+                matcher=encoder.get_live_matcher()
             )
         elif choice == '3':
             # Hiển thị báo cáo điểm danh hôm nay
@@ -75,6 +81,52 @@ def attendance_management(encoder):
             # Xuất báo cáo ra Excel
             attendance_system.export_to_excel(encoder.get_unique_users(), date)
         elif choice == '6':
+            # Nhập dữ liệu từ file attendance.json cũ
+            file_path = input("Nhập đường dẫn file JSON: ").strip()
+            attendance_system.import_attendance_json(file_path)
+        elif choice == '7':
+            # Báo cáo theo khoảng ngày (theo người, phòng ban, ngày)
+            start_input = input("Từ ngày (YYYY-MM-DD): ")
+            end_input = input("Đến ngày (YYYY-MM-DD), để trống cho ngày hôm nay: ")
+            try:
+                start_date = datetime.date.fromisoformat(start_input).isoformat()
+                end_date = (datetime.date.fromisoformat(end_input) if end_input else datetime.date.today()).isoformat()
+            except ValueError:
+                print("Định dạng ngày không hợp lệ. Vui lòng sử dụng định dạng YYYY-MM-DD.")
+                continue
+            
+            attendance_system.display_range_report(encoder.get_unique_users(), start_date, end_date,
+                                                   encoder.get_all_users())
+            if input("Xuất báo cáo ra Excel? (y/n): ").strip().lower() == 'y':
+                attendance_system.export_range_report(encoder.get_unique_users(), start_date, end_date,
+                                                      encoder.get_all_users())
+        elif choice == '8':
+            # Xuất toàn bộ lịch sử cho các công cụ phân tích
+            file_format = input("Định dạng (csv/parquet), để trống cho csv: ").strip().lower() or 'csv'
+            if file_format not in ('csv', 'parquet'):
+                print("Định dạng không hợp lệ.")
+                continue
+            file_path = input("Đường dẫn file, để trống cho mặc định trong reports/: ").strip() or None
+            attendance_system.export_history(file_path, file_format=file_format)
+        elif choice == '9':
+            # Điểm danh từ nhiều camera trong một tiến trình, dùng chung gallery và luồng inference
+            sources_input = input("Nhập các camera / file video, cách nhau bởi dấu phẩy (ví dụ 0,1,2,3): ")
+            sources = [source.strip() for source in sources_input.split(',') if source.strip()]
+            if not sources:
+                print("Chưa nhập nguồn nào.")
+                continue
+            is_checkout = input("Checkout thay vì check-in? (y/n): ").strip().lower() == 'y'
+            show = input("Hiển thị cửa sổ cho từng camera? (y/n): ").strip().lower() == 'y'
+            known_face_encodings, known_face_names = encoder.get_encodings()
+            attendance_system.take_attendance_multi_camera(
+                known_face_encodings,
+                known_face_names,
+                sources,
+                is_checkout=is_checkout,
+                matcher=encoder.get_live_matcher(),
+                show=show
+            )
+        elif choice == '10':
             print("Quay lại menu chính...")
             break
         else:
@@ -0,0 +1,175 @@
+"""
+Module báo cáo điểm danh theo khoảng ngày
+
+Toàn bộ dữ liệu của khoảng ngày được đưa vào một DataFrame (mỗi dòng là một người trong một ngày);
+thời lượng, đi muộn và các tổng hợp theo người / phòng ban / ngày được tính bằng phép toán
+timedelta và groupby của pandas trên cả khoảng, không lặp theo từng ngày, từng người.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_LATE_AFTER = "08:30:00"
+NO_DEPARTMENT = "N/A"
+
+SUMMARY_SHEET = "Tổng hợp"
+DEPARTMENT_SHEET = "Theo phòng ban"
+DAILY_SHEET = "Theo ngày"
+DETAIL_SHEET = "Chi tiết"
+
+
+def attendance_frame(range_data):
+    """
+    Chuyển dữ liệu {ngày: {tên: mục}} thành DataFrame với các cột
+    date, name, checkin, checkout (thời gian dạng timedelta tính từ 0 giờ, NaT nếu thiếu)
+    """
+    rows = [(date, name, entry.get("checkin"), entry.get("checkout"))
+            for date, day in range_data.items() for name, entry in day.items()]
+    df = pd.DataFrame(rows, columns=["date", "name", "checkin", "checkout"])
+    df["date"] = pd.to_datetime(df["date"])
+    df["checkin"] = pd.to_timedelta(df["checkin"], errors="coerce")
+    df["checkout"] = pd.to_timedelta(df["checkout"], errors="coerce")
+    return df
+
+
+def format_duration(values):
+    """Định dạng Series timedelta thành chuỗi HH:MM:SS ("N/A" khi thiếu)"""
+    seconds = values.dt.total_seconds()
+    missing = seconds.isna()
+    total = seconds.fillna(0).round().astype(np.int64)
+    hours, remainder = np.divmod(total, 3600)
+    minutes, secs = np.divmod(remainder, 60)
+    text = (hours.astype(str).str.zfill(2) + ":" + minutes.astype(str).str.zfill(2) + ":"
+            + secs.astype(str).str.zfill(2))
+    return text.mask(missing, "N/A")
+
+
+def build_range_report(range_data, all_users, start_date, end_date, user_info=None,
+                       late_after=DEFAULT_LATE_AFTER, working_days=None):
+    """
+    Tính báo cáo điểm danh cho khoảng ngày
+
+    Args:
+        range_data: Dữ liệu {ngày: {tên: mục}} của khoảng ngày (AttendanceSystem.get_range_attendance)
+        all_users: Danh sách người dùng (có thể trùng lặp)
+        start_date, end_date: Khoảng ngày dạng YYYY-MM-DD (bao gồm cả hai)
+        user_info: Thông tin người dùng; trường "department" (nếu có) dùng để tổng hợp theo phòng ban
+        late_after: Check-in sau thời điểm này (HH:MM:SS) được tính là đi muộn
+        working_days: Số ngày làm việc của khoảng; mặc định là các ngày thứ Hai - thứ Sáu cộng với
+                      những ngày khác có người điểm danh
+
+    Returns:
+        dict: {tên sheet: DataFrame} gồm tổng hợp theo người, theo phòng ban, theo ngày và chi tiết
+    """
+    user_info = user_info or {}
+    users = sorted(set(all_users))
+
+    df = attendance_frame(range_data)
+    if working_days is None:
+        working_days = len(pd.bdate_range(start_date, end_date).union(pd.DatetimeIndex(df["date"].unique())))
+
+    departments_by_name = {name: user_info.get(name, {}).get("department", NO_DEPARTMENT)
+                           for name in set(users) | set(df["name"].unique())}
+    df["department"] = df["name"].map(departments_by_name)
+    df["duration"] = df["checkout"] - df["checkin"]
+    # Checkout sau nửa đêm: cộng thêm một ngày
+    df.loc[df["duration"] < pd.Timedelta(0), "duration"] += pd.Timedelta(days=1)
+    df["late"] = df["checkin"] > pd.to_timedelta(late_after)
+    df["late_by"] = (df["checkin"] - pd.to_timedelta(late_after)).where(df["late"])
+    df["missing_checkout"] = df["checkout"].isna()
+
+    # Tổng hợp theo người trong một lần groupby; người không có mặt ngày nào vẫn có dòng
+    per_user = df.groupby("name").agg(
+        days_present=("date", "nunique"),
+        late_days=("late", "sum"),
+        missing_checkout=("missing_checkout", "sum"),
+        total_duration=("duration", "sum"),
+        average_duration=("duration", "mean"),
+        average_checkin=("checkin", "mean"),
+        first_day=("date", "min"),
+        last_day=("date", "max"),
+    )
+    per_user = per_user.reindex(sorted(set(users) | set(per_user.index)))
+    per_user[["days_present", "late_days", "missing_checkout"]] = (
+        per_user[["days_present", "late_days", "missing_checkout"]].fillna(0).astype(np.int64))
+    per_user["total_duration"] = per_user["total_duration"].fillna(pd.Timedelta(0))
+    per_user["days_absent"] = np.maximum(working_days - per_user["days_present"], 0)
+    per_user["department"] = per_user.index.map(departments_by_name)
+
+    per_department = per_user.groupby("department").agg(
+        users=("days_present", "size"),
+        days_present=("days_present", "sum"),
+        days_absent=("days_absent", "sum"),
+        late_days=("late_days", "sum"),
+        total_duration=("total_duration", "sum"),
+    )
+    department_present = df.groupby("department")["duration"].mean()
+    per_department["average_duration"] = department_present.reindex(per_department.index)
+    per_department["attendance_rate"] = (per_department["days_present"]
+                                         / np.maximum(per_department["users"] * working_days, 1)).round(3)
+
+    per_day = df.groupby("date").agg(
+        present=("name", "nunique"),
+        late=("late", "sum"),
+        missing_checkout=("missing_checkout", "sum"),
+        average_checkin=("checkin", "mean"),
+        average_duration=("duration", "mean"),
+    )
+    per_day["absent"] = np.maximum(len(users) - per_day["present"], 0)
+
+    # Định dạng cho báo cáo: thời lượng dạng HH:MM:SS, ngày dạng YYYY-MM-DD
+    summary = pd.DataFrame({
+        "Họ và tên": per_user.index,
+        "Phòng ban": per_user["department"].values,
+        "Số ngày có mặt": per_user["days_present"].values,
+        "Số ngày vắng": per_user["days_absent"].values,
+        "Số lần đi muộn": per_user["late_days"].values,
+        "Thiếu checkout": per_user["missing_checkout"].values,
+        "Tổng thời lượng": format_duration(per_user["total_duration"]).values,
+        "Thời lượng trung bình": format_duration(per_user["average_duration"]).values,
+        "Check-in trung bình": format_duration(per_user["average_checkin"]).values,
+        "Ngày đầu": per_user["first_day"].dt.strftime("%Y-%m-%d").fillna("N/A").values,
+        "Ngày cuối": per_user["last_day"].dt.strftime("%Y-%m-%d").fillna("N/A").values,
+    })
+    departments = pd.DataFrame({
+        "Phòng ban": per_department.index,
+        "Số người": per_department["users"].values,
+        "Tổng ngày có mặt": per_department["days_present"].values,
+        "Tổng ngày vắng": per_department["days_absent"].values,
+        "Số lần đi muộn": per_department["late_days"].values,
+        "Tỉ lệ có mặt": per_department["attendance_rate"].values,
+        "Tổng thời lượng": format_duration(per_department["total_duration"]).values,
+        "Thời lượng trung bình": format_duration(per_department["average_duration"]).values,
+    })
+    daily = pd.DataFrame({
+        "Ngày": per_day.index.strftime("%Y-%m-%d"),
+        "Có mặt": per_day["present"].values,
+        "Vắng mặt": per_day["absent"].values,
+        "Đi muộn": per_day["late"].values.astype(np.int64),
+        "Thiếu checkout": per_day["missing_checkout"].values.astype(np.int64),
+        "Check-in trung bình": format_duration(per_day["average_checkin"]).values,
+        "Thời lượng trung bình": format_duration(per_day["average_duration"]).values,
+    })
+    df = df.sort_values(["date", "name"])
+    detail = pd.DataFrame({
+        "Ngày": df["date"].dt.strftime("%Y-%m-%d").values,
+        "Họ và tên": df["name"].values,
+        "Phòng ban": df["department"].values,
+        "Check-in": format_duration(df["checkin"]).values,
+        "Check-out": format_duration(df["checkout"]).values,
+        "Thời lượng": format_duration(df["duration"]).values,
+        "Đi muộn": format_duration(df["late_by"]).where(df["late"], "").values,
+    })
+
+    return {
+        SUMMARY_SHEET: summary,
+        DEPARTMENT_SHEET: departments,
+        DAILY_SHEET: daily,
+        DETAIL_SHEET: detail,
+    }
+
+
+def export_range_report(report, file_path):
+    """Ghi báo cáo (dict {tên sheet: DataFrame}) ra một workbook Excel nhiều sheet"""
+    with pd.ExcelWriter(file_path) as writer:
+        for sheet_name, df in report.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
@@ -0,0 +1,323 @@
+"""
+Module dịch vụ điểm danh chạy nhiều camera trong một tiến trình
+
+    camera 1 --capture--> [frame mới nhất] --+
+    camera 2 --capture--> [frame mới nhất] --+--> nhóm luồng inference dùng chung --> AttendanceSystem
+    ...                                      |    (lần lượt xoay vòng giữa các camera)
+    camera N --capture--> [frame mới nhất] --+
+
+- Mỗi camera có luồng capture riêng (kèm MotionGate tùy chọn) và chỉ giữ một frame chờ xử lý;
+  với camera trực tiếp frame cũ bị thay bằng frame mới khi inference chưa kịp lấy.
+- Các luồng inference dùng chung chọn camera theo vòng xoay, mỗi camera chỉ có tối đa một frame
+  đang xử lý, nên một camera đông người không chiếm hết inference của các camera khác.
+- Gallery và matcher được nạp một lần và dùng chung; mỗi camera có FrameRecognizer (tracker,
+  profile phát hiện) riêng.
+- Mọi lần ghi điểm danh đi qua một khóa và một tập người đã xác nhận trong phiên, nên một người
+  xuất hiện cùng lúc ở hai camera chỉ được ghi một lần.
+"""
+import threading
+import time
+import datetime
+
+from modules.detection import get_detection_profile
+from modules.frame_source import open_source
+from modules.matcher import UNKNOWN_NAME
+from modules.metrics import timer
+from modules.motion_gate import MotionGate
+from modules.webcam import FrameRecognizer
+
+# Checkout của người chưa check-in được thử lại sau khoảng này (người đó có thể check-in ở nơi khác)
+CHECKOUT_RETRY_SECONDS = 5.0
+
+
+class CameraStream:
+    """Trạng thái của một camera trong service"""
+
+    def __init__(self, capture, recognizer, gate=None):
+        self.capture = capture
+        self.name = capture.name
+        self.is_live = capture.is_live
+        self.recognizer = recognizer
+        self.gate = gate
+
+        # Được bảo vệ bởi khóa của service
+        self.pending = None        # (frame_id, frame, regions) chờ inference
+        self.busy = False          # Đang có frame của camera này trong inference
+        self.done = False          # Nguồn đã hết / lỗi đọc
+        self.latest_frame = None
+        self.latest_frame_id = 0
+        self.result = None
+        self.shown_frame_id = 0
+
+        self.captured_frames = 0
+        self.gated_frames = 0
+        self.dropped_frames = 0
+        self.processed_frames = 0
+        self.events = 0
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "captured_frames": self.captured_frames,
+            "processed_frames": self.processed_frames,
+            "gated_frames": self.gated_frames,
+            "dropped_frames": self.dropped_frames,
+            "events": self.events,
+        }
+
+    def stats_text(self):
+        return (f"{self.name}: captured {self.captured_frames}, processed {self.processed_frames}, "
+                f"gated {self.gated_frames}, dropped {self.dropped_frames}, events {self.events}")
+
+
+class AttendanceService:
+    """
+    Điểm danh đồng thời từ nhiều nguồn camera / video vào một AttendanceSystem
+
+    Args:
+        attendance_system: AttendanceSystem nhận các lần check-in / checkout
+        matcher: GalleryMatcher dùng chung cho mọi camera
+        sources: Danh sách nguồn (id camera, file video, thư mục ảnh - xem frame_source.open_source)
+        num_workers: Số luồng inference dùng chung
+        is_checkout: Ghi checkout thay vì check-in
+        motion_gate: Bỏ qua phát hiện khuôn mặt khi khung cảnh của camera không đổi
+    """
+
+    def __init__(self, attendance_system, matcher, sources, num_workers=2, is_checkout=False, motion_gate=True):
+        self.attendance_system = attendance_system
+        self.matcher = matcher
+        self.sources = list(sources)
+        self.num_workers = max(1, num_workers)
+        self.is_checkout = is_checkout
+        self.motion_gate = motion_gate
+
+        self.streams = []
+        self.confirmed = set()  # Người đã được ghi (hoặc không cần ghi nữa) trong phiên
+        self._checkout_retry_at = {}  # Tên -> thời điểm được thử checkout lại (người chưa check-in)
+        self._condition = threading.Condition()
+        self._record_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._cursor = 0
+
+    def start(self):
+        """Mở các nguồn và khởi động luồng capture của từng camera cùng các luồng inference"""
+        for source in self.sources:
+            capture = open_source(source)
+            if not capture.isOpened():
+                print(f"Lỗi: Không thể mở nguồn {capture.name}, bỏ qua")
+                continue
+            recognizer = FrameRecognizer(self.matcher, profile=get_detection_profile(capture.name))
+            gate = MotionGate() if self.motion_gate else None
+            self.streams.append(CameraStream(capture, recognizer, gate))
+
+        if not self.streams:
+            print("Lỗi: Không mở được nguồn nào")
+            return False
+
+        action_type = "check-out" if self.is_checkout else "điểm danh"
+        print(f"Bắt đầu {action_type} trên {len(self.streams)} nguồn với {self.num_workers} luồng inference: "
+              f"{', '.join(stream.name for stream in self.streams)}")
+
+        for stream in self.streams:
+            self._threads.append(threading.Thread(target=self._capture_loop, args=(stream,),
+                                                  name=f"capture-{stream.name}", daemon=True))
+        for i in range(self.num_workers):
+            self._threads.append(threading.Thread(target=self._inference_loop, name=f"inference-{i}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return True
+
+    def stop(self):
+        """Dừng các luồng, giải phóng các nguồn và lưu dữ liệu điểm danh"""
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._threads = []
+        for stream in self.streams:
+            stream.capture.release()
+        self.attendance_system.compact()
+
+    def _capture_loop(self, stream):
+        """Luồng capture của một camera: đọc frame, lọc bằng MotionGate, giữ một frame chờ inference"""
+        frame_id = 0
+        while not self._stop_event.is_set():
+            with timer('capture'):
+                ret, frame = stream.capture.read()
+            if not ret:
+                break
+            frame_id += 1
+
+            regions = None
+            active = True
+            if stream.gate is not None:
+                with timer('motion_gate'):
+                    active, regions = stream.gate.check(frame)
+
+            with self._condition:
+                stream.captured_frames += 1
+                stream.latest_frame = frame
+                stream.latest_frame_id = frame_id
+                if not active:
+                    stream.gated_frames += 1
+                    self._condition.notify_all()
+                    continue
+
+                if not stream.is_live:
+                    # File video / chuỗi ảnh: chờ frame trước được lấy thay vì bỏ frame
+                    while stream.pending is not None and not self._stop_event.is_set():
+                        self._condition.wait(timeout=0.1)
+                elif stream.pending is not None:
+                    stream.dropped_frames += 1
+                stream.pending = (frame_id, frame, regions)
+                self._condition.notify_all()
+
+        with self._condition:
+            stream.done = True
+            self._condition.notify_all()
+
+    def _next_job(self):
+        """Chọn camera kế tiếp theo vòng xoay có frame chờ và chưa có frame đang xử lý"""
+        with self._condition:
+            while not self._stop_event.is_set():
+                count = len(self.streams)
+                for offset in range(count):
+                    index = (self._cursor + offset) % count
+                    stream = self.streams[index]
+                    if stream.pending is not None and not stream.busy:
+                        item = stream.pending
+                        stream.pending = None
+                        stream.busy = True
+                        self._cursor = index + 1
+                        self._condition.notify_all()
+                        return stream, item
+                if all(stream.done and stream.pending is None and not stream.busy for stream in self.streams):
+                    return None
+                self._condition.wait(timeout=0.1)
+        return None
+
+    def _inference_loop(self):
+        """Luồng inference dùng chung: xử lý frame của các camera và ghi điểm danh"""
+        while True:
+            job = self._next_job()
+            if job is None:
+                break
+            stream, (frame_id, frame, regions) = job
+            try:
+                if regions is None:
+                    result = stream.recognizer(frame)
+                else:
+                    result = stream.recognizer(frame, regions)
+            except Exception as e:
+                print(f"Lỗi khi xử lý frame của {stream.name}: {e}")
+                result = None
+
+            if result is not None:
+                self._record(stream, result[1])
+
+            with self._condition:
+                stream.busy = False
+                if result is not None:
+                    stream.processed_frames += 1
+                    stream.result = result
+                self._condition.notify_all()
+
+    def _record(self, stream, names):
+        """Ghi điểm danh cho những người mới nhận diện; khóa đảm bảo mỗi người chỉ được ghi một lần"""
+        with self._record_lock:
+            for name in names:
+                if name == UNKNOWN_NAME or name in self.confirmed:
+                    continue
+                if self.is_checkout and time.monotonic() < self._checkout_retry_at.get(name, 0.0):
+                    continue
+                timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+                if self.is_checkout:
+                    recorded = self.attendance_system.checkout(name, timestamp, source=stream.name)
+                else:
+                    recorded = self.attendance_system.mark_attendance(name, timestamp, source=stream.name)
+                # Checkout chỉ thất bại khi người này chưa check-in: thử lại sau, không đánh dấu đã ghi.
+                # Check-in thất bại (đã checkout trong ngày) thì không cần thử lại.
+                if not recorded and self.is_checkout:
+                    self._checkout_retry_at[name] = time.monotonic() + CHECKOUT_RETRY_SECONDS
+                    continue
+                # Đánh dấu trong khóa để camera khác thấy cùng người này không ghi lại
+                self.confirmed.add(name)
+                self._checkout_retry_at.pop(name, None)
+                if recorded:
+                    stream.events += 1
+                    action_type = "Check-out" if self.is_checkout else "Điểm danh"
+                    print(f"{action_type} thành công: {name} - {timestamp} ({stream.name})")
+
+    def finished(self):
+        with self._condition:
+            return all(stream.done and stream.pending is None and not stream.busy for stream in self.streams)
+
+    def stats(self):
+        with self._condition:
+            return [stream.stats() for stream in self.streams]
+
+    def stats_text(self):
+        with self._condition:
+            return "\n".join(stream.stats_text() for stream in self.streams)
+
+    def _show_frames(self):
+        """Hiển thị frame mới nhất của từng camera (gọi trên luồng chính); trả về False khi nhấn 'q'"""
+        import cv2
+
+        for stream in self.streams:
+            with self._condition:
+                if stream.latest_frame_id == stream.shown_frame_id:
+                    continue
+                stream.shown_frame_id = stream.latest_frame_id
+                frame = stream.latest_frame.copy()
+                result = stream.result
+
+            if result is not None:
+                for (top, right, bottom, left), name in zip(*result):
+                    color = (0, 0, 255) if name == UNKNOWN_NAME else (0, 255, 0)
+                    cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+                    cv2.putText(frame, name, (left, top - 10), cv2.FONT_HERSHEY_DUPLEX, 0.8, color, 2)
+            cv2.putText(frame, f"Events: {stream.events} | processed {stream.processed_frames}",
+                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            cv2.imshow(f"Attendance - {stream.name}", frame)
+
+        return not (cv2.waitKey(1) & 0xFF == ord('q'))
+
+    def run(self, show=False, duration=None, stats_every=30.0):
+        """
+        Chạy service cho đến khi nhấn 'q' (show=True), Ctrl+C, hết duration giây hoặc mọi nguồn đã hết
+
+        Returns:
+            list: Thống kê của từng camera
+        """
+        if not self.start():
+            return []
+
+        start = time.perf_counter()
+        last_stats = start
+        try:
+            while not self.finished():
+                if show:
+                    if not self._show_frames():
+                        break
+                else:
+                    time.sleep(0.2)
+
+                now = time.perf_counter()
+                if duration is not None and now - start >= duration:
+                    break
+                if stats_every and now - last_stats >= stats_every:
+                    print(self.stats_text())
+                    last_stats = now
+        except KeyboardInterrupt:
+            print("Đã dừng service")
+        finally:
+            self.stop()
+            if show:
+                import cv2
+                cv2.destroyAllWindows()
+
+        print(self.stats_text())
+        return self.stats()
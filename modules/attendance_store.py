@@ -0,0 +1,435 @@
+"""
+Module lưu trữ dữ liệu điểm danh
+
+Hai backend có cùng giao diện, được AttendanceSystem sử dụng:
+    - JsonAttendanceStore: snapshot attendance.json + nhật ký sự kiện attendance_events.jsonl, toàn bộ
+      lịch sử nằm trong bộ nhớ
+    - SqliteAttendanceStore: file SQLite (WAL) với khóa chính (date, name), truy vấn theo ngày/khoảng
+      ngày không cần tải toàn bộ lịch sử; GUI và nhiều tiến trình camera có thể ghi cùng lúc
+
+Mỗi mục điểm danh trả về có dạng {"checkin": "HH:MM:SS", "checkout": "HH:MM:SS"} (checkout có thể thiếu).
+"""
+import os
+import json
+import sqlite3
+import threading
+
+from modules.shared_gallery import LOCK_SUFFIX, _PublishLock
+
+ATTENDANCE_BACKENDS = ('json', 'sqlite')
+DEFAULT_BACKEND = 'json'
+
+
+def _normalize_entry(value):
+    """Chuyển mục điểm danh định dạng cũ (chỉ lưu thời gian check-in) sang dạng dict"""
+    if isinstance(value, str):
+        return {"checkin": value}
+    return value
+
+
+def load_attendance_json(file_path):
+    """Đọc file attendance.json, trả về {ngày: {tên: mục điểm danh}} với mục đã chuẩn hóa"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {date: {name: _normalize_entry(value) for name, value in day.items()} for date, day in data.items()}
+
+
+class JsonAttendanceStore:
+    """
+    Lưu điểm danh dạng snapshot + nhật ký sự kiện
+
+    - attendance_file (attendance.json): snapshot đầy đủ {ngày: {tên: {"checkin", "checkout"}}}.
+    - journal_file (attendance_events.jsonl): mỗi lần check-in/check-out chỉ ghi thêm một dòng
+      {"date", "name", "time", "type", "source"} thay vì ghi lại toàn bộ lịch sử.
+    Khi tải: đọc snapshot rồi áp dụng lại các sự kiện trong nhật ký. Sau compact_every sự kiện
+    nhật ký được gộp vào snapshot rồi làm rỗng.
+    Mọi thao tác đọc / ghi giữ một khóa chung nên có thể gọi từ nhiều luồng (nhiều camera, dịch vụ HTTP).
+    Việc ghi nhật ký và ghi snapshot còn giữ thêm khóa file attendance.json.lock (giống gallery dùng
+    chung): trước khi ghi snapshot, snapshot + nhật ký trên đĩa được đọc lại và gộp với dữ liệu trong
+    bộ nhớ, nên sự kiện do tiến trình khác ghi không bị mất khi làm rỗng nhật ký. Sự kiện của tiến trình
+    khác chỉ hiện ra trong bộ nhớ sau lần gộp đó; cần điểm danh trực tiếp từ nhiều tiến trình thì nên
+    dùng backend SQLite.
+    """
+
+    def __init__(self, attendance_file='data/attendance.json', journal_file=None, compact_every=500):
+        self.attendance_file = attendance_file
+        if journal_file is None:
+            journal_file = os.path.join(os.path.dirname(attendance_file), 'attendance_events.jsonl')
+        self.journal_file = journal_file
+        self.compact_every = compact_every
+        self.pending_events = 0
+        # RLock: ghi sự kiện có thể gọi compact() khi đang giữ khóa
+        self._lock = threading.RLock()
+        self.attendance_data = self.load()
+
+    def load(self):
+        """Tải dữ liệu điểm danh: snapshot rồi áp dụng lại nhật ký sự kiện"""
+        attendance_data, self.pending_events = self._read_files()
+        return attendance_data
+
+    def _read_files(self):
+        """Đọc snapshot và nhật ký trên đĩa, trả về (dữ liệu điểm danh, số sự kiện trong nhật ký)"""
+        attendance_data = {}
+        if os.path.exists(self.attendance_file):
+            try:
+                with open(self.attendance_file, 'r', encoding='utf-8') as f:
+                    attendance_data = json.load(f)
+            except Exception as e:
+                print(f"Lỗi khi tải dữ liệu điểm danh: {e}")
+                attendance_data = {}
+
+        return attendance_data, self._replay_journal(attendance_data)
+
+    def _file_lock(self):
+        """Khóa liên tiến trình cho nhật ký và snapshot"""
+        return _PublishLock(self.attendance_file + LOCK_SUFFIX)
+
+    @classmethod
+    def _merge(cls, attendance_data, other):
+        """
+        Gộp dữ liệu {ngày: {tên: mục}} của other vào attendance_data, trả về số mục đã đọc
+
+        Mục đã có được giữ nguyên; chỉ check-out còn thiếu được bổ sung.
+        """
+        count = 0
+        for date, day in other.items():
+            for name, value in day.items():
+                value = _normalize_entry(value)
+                if "checkin" in value:
+                    cls._apply_event(attendance_data,
+                                     {"date": date, "name": name, "time": value["checkin"], "type": "checkin"})
+                current = _normalize_entry(attendance_data.setdefault(date, {}).get(name, {}))
+                if "checkout" in value and "checkout" not in current:
+                    cls._apply_event(attendance_data,
+                                     {"date": date, "name": name, "time": value["checkout"], "type": "checkout"})
+                count += 1
+        return count
+
+    def _merge_from_disk(self):
+        """Gộp dữ liệu trong bộ nhớ vào snapshot + nhật ký hiện có trên đĩa (gọi khi giữ khóa file)"""
+        attendance_data, _ = self._read_files()
+        self._merge(attendance_data, self.attendance_data)
+        self.attendance_data = attendance_data
+
+    def _replay_journal(self, attendance_data):
+        """Áp dụng các sự kiện trong nhật ký vào attendance_data, trả về số sự kiện đã áp dụng"""
+        if not os.path.exists(self.journal_file):
+            return 0
+
+        replayed = 0
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # Dòng cuối có thể bị cắt nếu chương trình dừng đột ngột khi đang ghi
+                    print(f"Bỏ qua dòng {line_number} không hợp lệ trong {self.journal_file}")
+                    continue
+                self._apply_event(attendance_data, event)
+                replayed += 1
+        return replayed
+
+    @staticmethod
+    def _apply_event(attendance_data, event):
+        """
+        Áp dụng một sự kiện vào dữ liệu điểm danh
+
+        Áp dụng lại cùng một sự kiện không làm thay đổi kết quả, nên việc gộp nhật ký bị
+        gián đoạn (snapshot đã ghi nhưng nhật ký chưa kịp làm rỗng) vẫn an toàn.
+        """
+        day = attendance_data.setdefault(event["date"], {})
+        name = event["name"]
+        entry = day.get(name)
+        if isinstance(entry, str):  # Định dạng cũ chỉ lưu thời gian check-in
+            entry = day[name] = {"checkin": entry}
+
+        if event["type"] == "checkin":
+            if entry is None:
+                day[name] = {"checkin": event["time"]}
+        elif event["type"] == "checkout":
+            if entry is None:
+                entry = day[name] = {}
+            entry["checkout"] = event["time"]
+
+    def _record_event(self, event):
+        """Ghi thêm một sự kiện vào nhật ký, áp dụng vào bộ nhớ và gộp nhật ký khi đủ số sự kiện"""
+        with self._file_lock(), open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self._apply_event(self.attendance_data, event)
+
+        self.pending_events += 1
+        if self.compact_every and self.pending_events >= self.compact_every:
+            self.compact()
+
+    def get_entry(self, date, name):
+        """Mục điểm danh của một người trong một ngày, None nếu chưa có"""
+        with self._lock:
+            entry = self.attendance_data.get(date, {}).get(name)
+            return None if entry is None else dict(_normalize_entry(entry))
+
+    def get_day(self, date):
+        """Dữ liệu điểm danh của một ngày: {tên: mục điểm danh}"""
+        with self._lock:
+            return {name: dict(_normalize_entry(value))
+                    for name, value in self.attendance_data.get(date, {}).items()}
+
+    def get_range(self, start_date, end_date):
+        """Dữ liệu điểm danh từ start_date đến end_date (bao gồm cả hai, dạng YYYY-MM-DD): {ngày: {tên: mục}}"""
+        with self._lock:
+            return {date: self.get_day(date) for date in sorted(self.attendance_data)
+                    if start_date <= date <= end_date}
+
+    def dates(self):
+        """Danh sách các ngày có dữ liệu điểm danh"""
+        with self._lock:
+            return sorted(self.attendance_data)
+
+    def iter_rows(self, start_date=None, end_date=None, chunk_size=10000):
+        """Trả về lần lượt từng lô dòng (date, name, checkin, checkout) theo thứ tự ngày"""
+        chunk = []
+        for date in self.dates():
+            if (start_date and date < start_date) or (end_date and date > end_date):
+                continue
+            # Sao chép từng ngày khi giữ khóa, không giữ khóa trong lúc bên gọi xử lý lô
+            with self._lock:
+                items = list(self.attendance_data.get(date, {}).items())
+            for name, value in items:
+                value = _normalize_entry(value)
+                chunk.append((date, name, value.get("checkin"), value.get("checkout")))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    def record_checkin(self, date, name, timestamp, source=None):
+        """Ghi check-in, trả về False nếu người này đã có mục trong ngày"""
+        with self._lock:
+            if self.get_entry(date, name) is not None:
+                return False
+            self._record_event({"date": date, "name": name, "time": timestamp, "type": "checkin", "source": source})
+            return True
+
+    def record_checkout(self, date, name, timestamp, source=None):
+        """Ghi checkout, trả về False nếu chưa check-in hoặc đã checkout"""
+        with self._lock:
+            entry = self.get_entry(date, name)
+            if entry is None or "checkout" in entry:
+                return False
+            self._record_event({"date": date, "name": name, "time": timestamp, "type": "checkout",
+                                "source": source})
+            return True
+
+    def save(self):
+        """Lưu dữ liệu điểm danh vào file snapshot (gộp với dữ liệu trên đĩa, ghi ra file tạm rồi thay thế)"""
+        with self._lock, self._file_lock():
+            self._merge_from_disk()
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        tmp_file = self.attendance_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.attendance_data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.attendance_file)
+        print(f"Đã lưu dữ liệu điểm danh vào {self.attendance_file}")
+
+    def compact(self):
+        """Gộp nhật ký sự kiện vào snapshot rồi làm rỗng nhật ký"""
+        # Giữ khóa (cả khóa file) từ lúc đọc lại nhật ký tới lúc làm rỗng nó để không mất sự kiện
+        # do luồng hoặc tiến trình khác ghi xen vào giữa
+        with self._lock:
+            if self.pending_events == 0 and os.path.exists(self.attendance_file):
+                return
+            with self._file_lock():
+                self._merge_from_disk()
+                self._write_snapshot()
+                # Snapshot đã chứa mọi sự kiện nên có thể làm rỗng nhật ký
+                open(self.journal_file, 'w', encoding='utf-8').close()
+            self.pending_events = 0
+
+    def import_data(self, attendance_data):
+        """
+        Gộp dữ liệu {ngày: {tên: mục}} vào dữ liệu hiện tại rồi ghi snapshot
+
+        Mục đã có được giữ nguyên; chỉ check-out còn thiếu được bổ sung. Trả về số mục đã đọc.
+        """
+        with self._lock:
+            count = self._merge(self.attendance_data, attendance_data)
+
+            # Ghi thẳng vào snapshot
+            self.pending_events += count
+            self.compact()
+        return count
+
+    def close(self):
+        self.compact()
+
+
+class SqliteAttendanceStore:
+    """
+    Lưu điểm danh trong SQLite
+
+    Bảng attendance có khóa chính (date, name) nên truy vấn theo ngày dùng chỉ mục, và một
+    chỉ mục phụ (name, date) cho truy vấn theo người. WAL cho phép nhiều tiến trình đọc trong khi một
+    tiến trình ghi; ghi check-in/check-out là một câu lệnh nguyên tử nên không cần khóa ở ứng dụng.
+    Mỗi luồng dùng một kết nối riêng.
+
+    Khi tạo CSDL mới, dữ liệu từ import_json_file (attendance.json + nhật ký sự kiện) được nhập một lần.
+    """
+
+    def __init__(self, db_file='data/attendance.db', import_json_file=None, busy_timeout_ms=5000):
+        self.db_file = db_file
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        is_new = not os.path.exists(db_file)
+        self._create_schema()
+        if is_new and import_json_file and os.path.exists(import_json_file):
+            count = self.import_data(JsonAttendanceStore(import_json_file, compact_every=0).attendance_data)
+            print(f"Đã chuyển {count} mục điểm danh từ {import_json_file} sang {db_file}")
+
+    def _connection(self):
+        """Kết nối SQLite của luồng hiện tại"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # check_same_thread=False chỉ để close() đóng được kết nối của luồng khác
+            connection = sqlite3.connect(self.db_file, timeout=self.busy_timeout_ms / 1000.0, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def _create_schema(self):
+        with self._connection() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS attendance (
+                    date TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    checkin TEXT,
+                    checkout TEXT,
+                    checkin_source TEXT,
+                    checkout_source TEXT,
+                    PRIMARY KEY (date, name)
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_attendance_name_date ON attendance (name, date)")
+
+    @staticmethod
+    def _entry(checkin, checkout):
+        entry = {}
+        if checkin is not None:
+            entry["checkin"] = checkin
+        if checkout is not None:
+            entry["checkout"] = checkout
+        return entry
+
+    def get_entry(self, date, name):
+        """Mục điểm danh của một người trong một ngày, None nếu chưa có"""
+        row = self._connection().execute(
+            "SELECT checkin, checkout FROM attendance WHERE date = ? AND name = ?", (date, name)).fetchone()
+        return None if row is None else self._entry(*row)
+
+    def get_day(self, date):
+        """Dữ liệu điểm danh của một ngày: {tên: mục điểm danh}"""
+        rows = self._connection().execute(
+            "SELECT name, checkin, checkout FROM attendance WHERE date = ? ORDER BY rowid", (date,))
+        return {name: self._entry(checkin, checkout) for name, checkin, checkout in rows}
+
+    def get_range(self, start_date, end_date):
+        """Dữ liệu điểm danh từ start_date đến end_date (bao gồm cả hai, dạng YYYY-MM-DD): {ngày: {tên: mục}}"""
+        rows = self._connection().execute(
+            "SELECT date, name, checkin, checkout FROM attendance WHERE date BETWEEN ? AND ? ORDER BY date, rowid",
+            (start_date, end_date))
+        result = {}
+        for date, name, checkin, checkout in rows:
+            result.setdefault(date, {})[name] = self._entry(checkin, checkout)
+        return result
+
+    def dates(self):
+        """Danh sách các ngày có dữ liệu điểm danh"""
+        return [row[0] for row in self._connection().execute("SELECT DISTINCT date FROM attendance ORDER BY date")]
+
+    def iter_rows(self, start_date=None, end_date=None, chunk_size=10000):
+        """Trả về lần lượt từng lô dòng (date, name, checkin, checkout) theo thứ tự ngày, đọc dần từ CSDL"""
+        cursor = self._connection().execute(
+            "SELECT date, name, checkin, checkout FROM attendance WHERE date BETWEEN ? AND ? ORDER BY date, rowid",
+            (start_date or "0000-00-00", end_date or "9999-99-99"))
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def record_checkin(self, date, name, timestamp, source=None):
+        """Ghi check-in, trả về False nếu người này đã có mục trong ngày"""
+        with self._connection() as connection:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO attendance (date, name, checkin, checkin_source) VALUES (?, ?, ?, ?)",
+                (date, name, timestamp, source))
+        return cursor.rowcount == 1
+
+    def record_checkout(self, date, name, timestamp, source=None):
+        """Ghi checkout, trả về False nếu chưa check-in hoặc đã checkout"""
+        with self._connection() as connection:
+            cursor = connection.execute(
+                "UPDATE attendance SET checkout = ?, checkout_source = ? "
+                "WHERE date = ? AND name = ? AND checkout IS NULL",
+                (timestamp, source, date, name))
+        return cursor.rowcount == 1
+
+    def import_data(self, attendance_data):
+        """
+        Nhập hàng loạt dữ liệu {ngày: {tên: mục}} trong một transaction
+
+        Mục đã có được giữ nguyên; chỉ check-out còn thiếu được bổ sung. Trả về số mục đã đọc.
+        """
+        rows = []
+        for date, day in attendance_data.items():
+            for name, value in day.items():
+                value = _normalize_entry(value)
+                rows.append((date, name, value.get("checkin"), value.get("checkout")))
+
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT INTO attendance (date, name, checkin, checkout) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (date, name) DO UPDATE SET checkout = COALESCE(attendance.checkout, excluded.checkout)",
+                rows)
+        return len(rows)
+
+    def compact(self):
+        """Gộp WAL vào file CSDL chính"""
+        self._connection().execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        """Đóng mọi kết nối đã mở"""
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def backend_from_env(default=DEFAULT_BACKEND):
+    """Backend điểm danh theo biến môi trường ATTENDANCE_BACKEND ('json' hoặc 'sqlite')"""
+    backend = os.environ.get('ATTENDANCE_BACKEND', '').strip().lower() or default
+    if backend not in ATTENDANCE_BACKENDS:
+        print(f"Lỗi: ATTENDANCE_BACKEND={backend} không hợp lệ, dùng backend {default}")
+        return default
+    return backend
+
+
+def open_attendance_store(backend='json', attendance_file='data/attendance.json', db_file='data/attendance.db',
+                          **kwargs):
+    """Tạo store điểm danh theo backend ('json' hoặc 'sqlite')"""
+    if backend == 'json':
+        return JsonAttendanceStore(attendance_file, **kwargs)
+    if backend == 'sqlite':
+        return SqliteAttendanceStore(db_file, import_json_file=attendance_file, **kwargs)
+    raise ValueError(f"Unknown attendance backend: {backend}")
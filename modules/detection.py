@@ -0,0 +1,281 @@
+"""
+Module cấu hình độ phân giải và model phát hiện khuôn mặt
+
+DetectionProfile quy định ảnh được thu nhỏ về cạnh dài tối đa bao nhiêu (hoặc theo một tỉ lệ cố định) trước khi phát hiện,
+số lần upsample của bộ phát hiện và model ("hog" hoặc "cnn"). Vị trí khuôn mặt trên ảnh thu nhỏ
+được đổi về tọa độ ảnh gốc bằng scale_boxes.
+
+Mỗi camera / nguồn có thể có profile riêng, lưu trong data/detection_profiles.json theo tên nguồn.
+autotune_profile chọn cạnh dài nhỏ nhất mà vẫn tìm được gần như mọi khuôn mặt tìm thấy ở độ phân
+giải đầy đủ, dựa trên kích thước khuôn mặt quan sát được trên các frame mẫu.
+"""
+import os
+import json
+import numpy as np
+
+from modules.metrics import timer
+from modules.model_runtime import get_runtime
+from modules.tracker import box_iou
+
+DETECTOR_MODELS = ('hog', 'cnn')
+DETECTION_PROFILES_FILE = 'data/detection_profiles.json'
+
+# Cửa sổ nhỏ nhất của bộ phát hiện HOG của dlib là 80 px; mỗi lần upsample giảm một nửa
+HOG_MIN_FACE = 80
+# Các cạnh dài được thử khi tự chỉnh, từ nhỏ đến lớn
+AUTOTUNE_MAX_SIDES = (240, 320, 400, 480, 640, 800, 960, 1280)
+
+
+class DetectionProfile:
+    """Độ phân giải và model dùng để phát hiện khuôn mặt"""
+
+    def __init__(self, max_side=480, upsample=1, model='hog', scale=None):
+        if model not in DETECTOR_MODELS:
+            raise ValueError(f"Unknown detector model: {model}")
+        self.max_side = max_side  # None hoặc 0: giữ nguyên kích thước
+        self.upsample = upsample
+        self.model = model
+        self.scale = scale  # Tỉ lệ cố định, dùng thay cho max_side (ví dụ 0.25 như trước đây)
+
+    def __repr__(self):
+        return (f"DetectionProfile(max_side={self.max_side}, upsample={self.upsample}, "
+                f"model='{self.model}', scale={self.scale})")
+
+    def scale_for(self, shape):
+        """Tỉ lệ thu nhỏ cho ảnh có kích thước shape (không bao giờ phóng to)"""
+        if self.scale:
+            return min(float(self.scale), 1.0)
+        side = max(shape[0], shape[1])
+        if not self.max_side or side <= self.max_side:
+            return 1.0
+        return self.max_side / float(side)
+
+    def min_face_size(self):
+        """Kích thước khuôn mặt nhỏ nhất (px, trên ảnh đã thu nhỏ) mà bộ phát hiện HOG tìm được"""
+        return HOG_MIN_FACE / float(2 ** self.upsample)
+
+    def prepare(self, image, bgr=False, scale=None):
+        """
+        Thu nhỏ ảnh theo profile (và đổi BGR sang RGB nếu bgr=True)
+
+        Args:
+            scale: Tỉ lệ thu nhỏ dùng thay cho tỉ lệ của profile (ví dụ tỉ lệ của cả frame cho một vùng cắt)
+
+        Returns:
+            tuple: (ảnh RGB liền khối đã thu nhỏ, tỉ lệ so với ảnh gốc)
+        """
+        if scale is None:
+            scale = self.scale_for(image.shape)
+        with timer('resize'):
+            if scale < 1.0:
+                import cv2
+                image = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            if bgr:
+                image = image[:, :, ::-1]
+            image = np.ascontiguousarray(image)
+        return image, scale
+
+    def detect(self, image, bgr=False):
+        """
+        Phát hiện khuôn mặt trên ảnh đã thu nhỏ theo profile
+
+        Returns:
+            tuple: (ảnh RGB đã thu nhỏ, vị trí khuôn mặt trên ảnh đó, tỉ lệ so với ảnh gốc)
+        """
+        small_image, scale = self.prepare(image, bgr=bgr)
+        with timer('detect'):
+            face_locations = get_runtime().face_locations(small_image, self.upsample, self.model)
+        return small_image, face_locations, scale
+
+    def detect_regions(self, image, regions, bgr=False):
+        """
+        Phát hiện khuôn mặt chỉ trong các vùng (top, right, bottom, left) của ảnh
+
+        Mỗi vùng được cắt và thu nhỏ theo tỉ lệ của cả ảnh, nên kích thước khuôn mặt giống như
+        khi phát hiện trên cả ảnh nhưng chi phí chỉ tỉ lệ với diện tích các vùng.
+
+        Returns:
+            tuple: (danh sách (ảnh vùng đã thu nhỏ, vị trí trên ảnh đó) để mã hóa,
+                    vị trí của tất cả khuôn mặt theo tọa độ ảnh gốc, theo cùng thứ tự)
+        """
+        scale = self.scale_for(image.shape)
+        runtime = get_runtime()
+        items = []
+        boxes = []
+        for top, right, bottom, left in regions:
+            crop = image[top:bottom, left:right]
+            if crop.shape[0] < 2 or crop.shape[1] < 2:
+                continue
+            small_crop, _ = self.prepare(crop, bgr=bgr, scale=scale)
+            with timer('detect'):
+                face_locations = runtime.face_locations(small_crop, self.upsample, self.model)
+            items.append((small_crop, face_locations))
+            for box in scale_boxes(face_locations, scale, crop.shape):
+                boxes.append((box[0] + top, box[1] + left, box[2] + top, box[3] + left))
+        return items, boxes
+
+    def to_dict(self):
+        return {"max_side": self.max_side, "upsample": self.upsample, "model": self.model, "scale": self.scale}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(max_side=data.get("max_side", 480), upsample=data.get("upsample", 1),
+                   model=data.get("model", 'hog'), scale=data.get("scale"))
+
+
+# Profile mặc định: nhận diện trực tiếp khi nguồn chưa được tự chỉnh (thu nhỏ cố định 0.25 như trước đây,
+# nên chi phí không đổi ở mọi độ phân giải camera) và ảnh tĩnh khi đăng ký / nhận diện từ file
+# (ảnh điện thoại vài nghìn px được thu nhỏ trước khi phát hiện)
+LIVE_PROFILE = DetectionProfile(max_side=None, upsample=1, model='hog', scale=0.25)
+IMAGE_PROFILE = DetectionProfile(max_side=1024, upsample=1, model='hog')
+
+
+def scale_boxes(face_locations, scale, shape=None):
+    """
+    Đổi vị trí (top, right, bottom, left) trên ảnh đã thu nhỏ với tỉ lệ scale về tọa độ ảnh gốc
+
+    Args:
+        shape: Kích thước ảnh gốc; nếu có thì vị trí được giới hạn trong ảnh
+    """
+    if scale == 1.0:
+        return [tuple(int(v) for v in location) for location in face_locations]
+    factor = 1.0 / scale
+    boxes = []
+    for top, right, bottom, left in face_locations:
+        box = [int(round(top * factor)), int(round(right * factor)),
+               int(round(bottom * factor)), int(round(left * factor))]
+        if shape is not None:
+            box = [max(box[0], 0), min(box[1], shape[1]), min(box[2], shape[0]), max(box[3], 0)]
+        boxes.append(tuple(box))
+    return boxes
+
+
+def load_detection_profiles(profiles_file=DETECTION_PROFILES_FILE):
+    """Đọc các profile đã lưu: {tên nguồn: DetectionProfile}"""
+    if not os.path.exists(profiles_file):
+        return {}
+    try:
+        with open(profiles_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return {name: DetectionProfile.from_dict(profile) for name, profile in data.items()}
+    except Exception as e:
+        print(f"Lỗi khi đọc profile phát hiện: {e}")
+        return {}
+
+
+def get_detection_profile(source_name, default=None, profiles_file=DETECTION_PROFILES_FILE):
+    """Profile đã lưu của nguồn source_name, hoặc default (LIVE_PROFILE) nếu chưa có"""
+    profile = load_detection_profiles(profiles_file).get(source_name)
+    if profile is None:
+        profile = LIVE_PROFILE if default is None else default
+    return profile
+
+
+def save_detection_profile(source_name, profile, profiles_file=DETECTION_PROFILES_FILE):
+    """Lưu profile cho nguồn source_name (giữ nguyên profile của các nguồn khác)"""
+    profiles = load_detection_profiles(profiles_file)
+    profiles[source_name] = profile
+    directory = os.path.dirname(profiles_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(profiles_file, 'w', encoding='utf-8') as f:
+        json.dump({name: p.to_dict() for name, p in profiles.items()}, f, ensure_ascii=False, indent=4)
+
+
+def autotune_profile(frames, upsample=1, model='hog', min_recall=0.9, candidates=AUTOTUNE_MAX_SIDES,
+                     reference_max_side=None, bgr=True):
+    """
+    Chọn cạnh dài nhỏ nhất mà vẫn tìm thấy đủ khuôn mặt trên các frame mẫu của một camera
+
+    Khuôn mặt được phát hiện trước ở độ phân giải tham chiếu (mặc định là kích thước gốc) để
+    biết kích thước khuôn mặt thực tế. Các cạnh dài làm khuôn mặt nhỏ nhất quan sát được nhỏ hơn
+    cửa sổ của bộ phát hiện bị bỏ qua; các cạnh còn lại được thử từ nhỏ đến lớn và cạnh đầu tiên
+    tìm lại được ít nhất min_recall số khuôn mặt tham chiếu được chọn.
+
+    Returns:
+        tuple: (DetectionProfile, thống kê {"reference_faces", "min_face", "median_face", "recall"})
+    """
+    reference_profile = DetectionProfile(max_side=reference_max_side, upsample=upsample, model=model)
+    references = []
+    for frame in frames:
+        _, locations, scale = reference_profile.detect(frame, bgr=bgr)
+        references.append(scale_boxes(locations, scale))
+
+    sizes = [min(box[1] - box[3], box[2] - box[0]) for boxes in references for box in boxes]
+    stats = {"reference_faces": len(sizes), "min_face": None, "median_face": None, "recall": None}
+    if not sizes:
+        print("Không tìm thấy khuôn mặt nào trong các frame mẫu, giữ profile mặc định")
+        return DetectionProfile(max_side=None, upsample=upsample, model=model, scale=LIVE_PROFILE.scale), stats
+
+    # Dùng phân vị 10% thay vì nhỏ nhất để một phát hiện nhầm nhỏ không kéo độ phân giải lên
+    smallest_face = float(np.percentile(sizes, 10))
+    stats["min_face"] = smallest_face
+    stats["median_face"] = float(np.median(sizes))
+    frame_side = max(max(frame.shape[0], frame.shape[1]) for frame in frames)
+
+    for max_side in candidates:
+        if max_side >= frame_side:
+            break
+        profile = DetectionProfile(max_side=max_side, upsample=upsample, model=model)
+        # Bỏ qua cạnh dài làm khuôn mặt nhỏ hơn cửa sổ của bộ phát hiện
+        if smallest_face * profile.scale_for((frame_side, frame_side)) < profile.min_face_size():
+            continue
+
+        found = 0
+        for frame, reference_boxes in zip(frames, references):
+            _, locations, scale = profile.detect(frame, bgr=bgr)
+            boxes = scale_boxes(locations, scale)
+            found += sum(1 for ref in reference_boxes if any(box_iou(ref, box) >= 0.3 for box in boxes))
+        recall = found / float(len(sizes))
+        if recall >= min_recall:
+            stats["recall"] = recall
+            return profile, stats
+
+    # Không cạnh nào đủ tốt: giữ độ phân giải tham chiếu
+    stats["recall"] = 1.0
+    return DetectionProfile(max_side=reference_max_side, upsample=upsample, model=model), stats
+
+
+def autotune_source(source, num_frames=30, frame_step=5, upsample=1, model='hog', min_recall=0.9,
+                    profiles_file=DETECTION_PROFILES_FILE):
+    """
+    Đọc các frame mẫu từ một camera / video / thư mục ảnh, tự chỉnh và lưu profile cho nguồn đó
+
+    Returns:
+        DetectionProfile hoặc None nếu không mở / đọc được nguồn
+    """
+    from modules.frame_source import open_source
+
+    if model not in DETECTOR_MODELS:
+        print(f"Lỗi: Model phát hiện không hợp lệ '{model}' (chọn {' hoặc '.join(DETECTOR_MODELS)})")
+        return None
+
+    capture = open_source(source)
+    if not capture.isOpened():
+        print(f"Lỗi: Không thể mở nguồn {capture.name}")
+        return None
+
+    frames = []
+    index = 0
+    try:
+        while len(frames) < num_frames:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            if index % frame_step == 0:
+                frames.append(frame)
+            index += 1
+    finally:
+        capture.release()
+
+    if not frames:
+        print(f"Lỗi: Không đọc được frame nào từ {capture.name}")
+        return None
+
+    print(f"Đang tự chỉnh profile phát hiện cho {capture.name} với {len(frames)} frame mẫu...")
+    profile, stats = autotune_profile(frames, upsample=upsample, model=model, min_recall=min_recall)
+    save_detection_profile(capture.name, profile, profiles_file)
+    print(f"Khuôn mặt tham chiếu: {stats['reference_faces']}, nhỏ nhất ~{stats['min_face'] or 0:.0f}px, "
+          f"recall {stats['recall'] or 0:.0%}")
+    print(f"Đã lưu {profile} cho {capture.name}")
+    return profile
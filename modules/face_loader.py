@@ -1,30 +1,177 @@
-import face_recognition
 import os
 import pickle
 import numpy as np
 import json
 import shutil
-import cv2
 import uuid
-from modules.camera_utils import select_camera
+import hashlib
+import itertools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from modules.gallery_store import ENCODING_DIM, UserRegistry, write_gallery, read_gallery, gallery_fingerprint
+from modules.detection import IMAGE_PROFILE
+from modules.gallery_index import IVFIndex, index_path_for
+from modules.matcher import GalleryMatcher
+from modules.metrics import timer
+from modules.model_runtime import get_runtime
+from modules.prototypes import PrototypeMatcher
+from modules.shared_gallery import LiveMatcher, SharedGallery
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Số khuôn mặt tối đa trong một lần gọi batch của dlib, số ảnh trong một lô gửi cho process con
+BATCH_ENCODE_FACES = 32
+PHOTO_BATCH_SIZE = 8
+MANIFEST_VERSION = 1
+
+
+def _file_digest(path, chunk_size=1 << 20):
+    """Tính SHA-1 nội dung file theo từng khối để không phải đọc cả file vào bộ nhớ"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stack_encodings(encodings):
+    """Gộp danh sách encoding thành một ma trận float32 liền khối N x 128"""
+    if len(encodings) == 0:
+        return np.empty((0, ENCODING_DIM), dtype=np.float32)
+    return np.asarray(encodings, dtype=np.float32).reshape(len(encodings), ENCODING_DIM)
+
+
+def batch_face_encodings(items, num_jitters=1, chunk_size=None):
+    """
+    Mã hóa khuôn mặt của nhiều ảnh, gom thành các lô để gọi batch của dlib
+
+    Args:
+        items: Danh sách cặp (ảnh RGB, danh sách vị trí khuôn mặt); vị trí None nghĩa là tự phát hiện
+        chunk_size: Số khuôn mặt tối đa trong một lần gọi dlib (giới hạn bộ nhớ cho ảnh khuôn mặt đã căn chỉnh)
+
+    Returns:
+        list: Với mỗi cặp, danh sách encoding theo thứ tự vị trí
+    """
+    if chunk_size is None:
+        chunk_size = BATCH_ENCODE_FACES
+    runtime = get_runtime()
+    results = []
+    images, locations = [], []
+    pending_faces = 0
+
+    for image, face_locations in items:
+        if face_locations is None:
+            face_locations = runtime.face_locations(image)
+        images.append(image)
+        locations.append(face_locations)
+        pending_faces += len(face_locations)
+        if pending_faces >= chunk_size:
+            with timer('encode'):
+                results.extend(runtime.face_encodings_batch(images, locations, num_jitters))
+            images, locations = [], []
+            pending_faces = 0
+
+    if images:
+        with timer('encode'):
+            results.extend(runtime.face_encodings_batch(images, locations, num_jitters))
+    return results
+
+
+def _encode_image_files(image_paths):
+    """
+    Mã hóa khuôn mặt đầu tiên trong mỗi file ảnh của một lô (một lần gọi batch của dlib cho cả lô)
+
+    Hàm ở cấp module để có thể gửi sang process con của ProcessPoolExecutor.
+
+    Returns:
+        list: (encoding hoặc None, thông báo lỗi hoặc None) cho từng ảnh
+    """
+    # Model dùng chung của tiến trình (trong process con được nạp ở lần gọi đầu tiên)
+    runtime = get_runtime()
+    results = [(None, None)] * len(image_paths)
+    loaded = []
+    for i, image_path in enumerate(image_paths):
+        try:
+            with timer('photos_decode'):
+                image = runtime.load_image_file(image_path)
+            # Ảnh lớn được thu nhỏ trước khi phát hiện; chỉ giữ ảnh đã thu nhỏ cho bước mã hóa
+            small_image, face_locations, _ = IMAGE_PROFILE.detect(image)
+            if face_locations:
+                loaded.append((i, small_image, face_locations[:1]))
+        except Exception as e:
+            results[i] = (None, str(e))
+
+    try:
+        encodings = batch_face_encodings([(image, locations) for _, image, locations in loaded])
+    except Exception as e:
+        for i, _, _ in loaded:
+            results[i] = (None, str(e))
+        return results
+
+    for (i, _, _), image_encodings in zip(loaded, encodings):
+        results[i] = (image_encodings[0], None)
+    return results
+
+
+class _GalleryState:
+    """
+    Gallery của FaceEncoder tại một thời điểm
+
+    Không bị sửa sau khi tạo (trừ matcher, được dựng một lần từ chính encodings / registry của nó);
+    thay gallery là thay cả đối tượng bằng một phép gán, nên luồng khác không bao giờ thấy encodings
+    mới đi cùng registry cũ.
+    """
+
+    __slots__ = ('encodings', 'registry', 'generation', 'dirty', 'matcher')
+
+    def __init__(self, encodings, registry, generation=0, dirty=False):
+        self.encodings = encodings  # Ma trận float32 N x 128
+        self.registry = registry  # Nhãn của từng dòng, tên -> dòng, tập người dùng
+        self.generation = generation  # Thế hệ gallery dùng chung (0 nếu chưa công bố)
+        self.dirty = dirty  # True khi có thay đổi chưa được lưu
+        self.matcher = None
+
 
 class FaceEncoder:
-    def __init__(self, photos_dir='photo', encodings_file='data/face_encodings.pkl', user_info_file='data/user_info.json'):
+    def __init__(self, photos_dir='photo', encodings_file='data/face_encodings.pkl', user_info_file='data/user_info.json',
+                 manifest_file='data/face_manifest.json', gallery_file='data/face_gallery.bin',
+                 index_kind='brute', n_probe=8, prototype_mode=None, prototypes_per_user=3, warm_up=True,
+                 shared_gallery=True):
         self.photos_dir = photos_dir
-        self.encodings_file = encodings_file
+        self.encodings_file = encodings_file  # File pickle cũ, chỉ dùng để chuyển đổi sang gallery
         self.user_info_file = user_info_file
-        self.known_face_encodings = []
-        self.known_face_names = []
+        self.manifest_file = manifest_file
+        self.gallery_file = gallery_file
+        self.index_kind = index_kind  # 'brute' (chính xác) hoặc 'ivf' (xấp xỉ, cho gallery rất lớn)
+        self.n_probe = n_probe
+        self.prototype_mode = prototype_mode  # None, 'mean' hoặc 'medoids': so khớp với prototype của từng người
+        self.prototypes_per_user = prototypes_per_user
+        self._gallery = _GalleryState(_stack_encodings([]), UserRegistry())
+        # Tuần tự hóa việc thay gallery (làm mới / thêm / xóa / lưu) và việc dựng matcher giữa các luồng
+        self._gallery_lock = threading.RLock()
+        self._matcher_lock = threading.Lock()
+        # Gallery dùng chung giữa các process theo thế hệ (xem shared_gallery); None để chỉ dùng gallery_file
+        self.shared_gallery = SharedGallery(gallery_file) if shared_gallery else None
         self.user_info = {}  # Dictionary lưu thông tin người dùng
         
+        # Nạp model nhận diện trên luồng nền để lần nhận diện/đăng ký đầu tiên không phải chờ
+        self.runtime = get_runtime()
+        if warm_up:
+            self.runtime.start()
+        
         # Tạo thư mục data nếu chưa tồn tại
-        os.makedirs(os.path.dirname(self.encodings_file), exist_ok=True)
+        os.makedirs(os.path.dirname(self.gallery_file), exist_ok=True)
         
         # Tải thông tin người dùng nếu có
         self.load_user_info()
         
-    def load_photos(self):
-        """Load face encodings from photo directory"""
+    def load_photos(self, parallel=False, workers=None):
+        """
+        Load face encodings from photo directory
+
+        Args:
+            parallel: Mã hóa ảnh song song bằng nhiều process
+            workers: Số process khi chạy song song (mặc định = số CPU)
+        """
         print("Loading face photos...")
         # Đảm bảo thư mục photos tồn tại
         if not os.path.exists(self.photos_dir):
@@ -32,17 +179,147 @@ class FaceEncoder:
             return False
             
         # Reset danh sách để tải lại
-        self.known_face_encodings = []
-        self.known_face_names = []
+        encodings = []
+        names = []
+        
+        tasks = self._collect_photo_tasks()
+        with timer('photos_load'):
+            for (person_name, _, _), encoding, _ in self._encode_photo_tasks(tasks, parallel, workers):
+                if encoding is not None:
+                    encodings.append(encoding)
+                    names.append(person_name)
+        
+        self._set_gallery(_stack_encodings(encodings), names)
+        print(f"Loaded {len(self.known_face_encodings)} faces")
+        # Lưu thông tin người dùng sau khi tải ảnh
+        self.save_user_info()
+        return len(self.known_face_encodings) > 0
+    
+    def sync_photos(self, parallel=False, workers=None):
+        """
+        Đồng bộ dữ liệu khuôn mặt với thư mục ảnh theo kiểu tăng dần
+
+        Chỉ mã hóa những ảnh mới hoặc đã thay đổi nội dung, bỏ các ảnh đã bị xóa.
+        Manifest lưu đường dẫn, kích thước, mtime, SHA-1 và encoding của từng ảnh;
+        ảnh nào có kích thước và mtime không đổi thì dùng lại encoding mà không cần đọc file.
+
+        Args:
+            parallel: Mã hóa ảnh mới song song bằng nhiều process
+            workers: Số process khi chạy song song (mặc định = số CPU)
+        """
+        print("Syncing face photos...")
+        if not os.path.exists(self.photos_dir):
+            print(f"Error: Directory '{self.photos_dir}' not found.")
+            return False
+        
+        old_manifest = self.load_manifest()
+        known_users = len(self.user_info)
+        tasks = self._collect_photo_tasks()
+        
+        manifest = {}
+        pending = []
+        pending_stats = {}
+        changed = False
+        
+        for task in tasks:
+            person_name, _, image_path = task
+            key = os.path.relpath(image_path, self.photos_dir).replace(os.sep, '/')
+            try:
+                stat = os.stat(image_path)
+                entry = old_manifest.get(key)
+                if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+                    manifest[key] = entry
+                    continue
+                
+                digest = _file_digest(image_path)
+            except OSError as e:
+                print(f"  Error reading {image_path}: {e}")
+                continue
+            
+            changed = True
+            if entry is not None and entry["sha1"] == digest:
+                # Nội dung không đổi (chỉ bị chạm vào), cập nhật lại thông tin file
+                entry.update(size=stat.st_size, mtime=stat.st_mtime_ns)
+                manifest[key] = entry
+            else:
+                pending.append(task)
+                pending_stats[image_path] = (key, stat, digest)
+        
+        encoded = 0
+        with timer('photos_load'):
+            for (person_name, _, image_path), encoding, error in self._encode_photo_tasks(pending, parallel, workers):
+                if error is not None:
+                    # Không lưu vào manifest để lần sau thử lại
+                    continue
+                key, stat, digest = pending_stats[image_path]
+                manifest[key] = {
+                    "name": person_name,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime_ns,
+                    "sha1": digest,
+                    # Ảnh không có khuôn mặt vẫn được ghi lại để không phải quét lại
+                    "encoding": encoding.tolist() if encoding is not None else None
+                }
+                encoded += 1
+        
+        removed = len(set(old_manifest) - set(manifest))
+        if changed or removed or len(manifest) != len(old_manifest):
+            self.save_manifest(manifest)
+        
+        # Dựng lại danh sách theo thứ tự (tên, file) giống load_photos
+        encodings = []
+        names = []
+        for key in sorted(manifest, key=lambda k: tuple(k.split('/', 1))):
+            entry = manifest[key]
+            if entry["encoding"] is not None:
+                encodings.append(entry["encoding"])
+                names.append(entry["name"])
+        encodings = _stack_encodings(encodings)
+        # Đồng bộ không thay đổi gì thì giữ nguyên gallery (không phải ghi / công bố lại)
+        if names != self.known_face_names or not np.array_equal(encodings, self.known_face_encodings):
+            self._set_gallery(encodings, names)
+        
+        print(f"Encoded {encoded} new/changed photos, removed {removed} deleted photos, "
+              f"reused {len(manifest) - encoded} cached photos")
+        print(f"Loaded {len(self.known_face_encodings)} faces")
+        
+        if len(self.user_info) != known_users:
+            self.save_user_info()
+        return len(self.known_face_encodings) > 0
+    
+    def load_manifest(self):
+        """Tải manifest mã hóa ảnh, trả về dict rỗng nếu chưa có hoặc không hợp lệ"""
+        if not os.path.exists(self.manifest_file):
+            return {}
+        
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                print(f"Manifest {self.manifest_file} has an unsupported version, rebuilding.")
+                return {}
+            return data["files"]
+        except Exception as e:
+            print(f"Error loading manifest: {e}")
+            return {}
+    
+    def save_manifest(self, files):
+        """Lưu manifest mã hóa ảnh (ghi ra file tạm rồi thay thế để tránh hỏng file)"""
+        tmp_file = self.manifest_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": MANIFEST_VERSION, "files": files}, f, ensure_ascii=False)
+        os.replace(tmp_file, self.manifest_file)
+    
+    def _collect_photo_tasks(self):
+        """Liệt kê các ảnh cần mã hóa dưới dạng (tên người, tên file, đường dẫn), đã sắp xếp"""
+        tasks = []
         
         # Duyệt từng thư mục con trong photo (mỗi thư mục là tên người)
-        for person_name in os.listdir(self.photos_dir):
+        for person_name in sorted(os.listdir(self.photos_dir)):
             person_folder = os.path.join(self.photos_dir, person_name)
             
             if not os.path.isdir(person_folder):
                 continue
-                
-            print(f"Processing photos for {person_name}...")
             
             # Thêm người dùng vào danh sách thông tin nếu chưa có
             if person_name not in self.user_info:
@@ -52,63 +329,281 @@ class FaceEncoder:
                 }
             
             # Duyệt từng ảnh trong thư mục con
-            for filename in os.listdir(person_folder):
-                if filename.endswith(('.jpg', '.jpeg', '.png')):
-                    image_path = os.path.join(person_folder, filename)
-                    print(f"  Processing {filename}")
-                    
-                    try:
-                        # Tải và mã hóa khuôn mặt
-                        image = face_recognition.load_image_file(image_path)
-                        encodings = face_recognition.face_encodings(image)
-                        
-                        if len(encodings) > 0:
-                            self.known_face_encodings.append(encodings[0])
-                            self.known_face_names.append(person_name)
-                        else:
-                            print(f"  Warning: No face found in {filename}")
-                    except Exception as e:
-                        print(f"  Error processing {filename}: {e}")
+            for filename in sorted(os.listdir(person_folder)):
+                if filename.endswith(IMAGE_EXTENSIONS):
+                    tasks.append((person_name, filename, os.path.join(person_folder, filename)))
         
-        print(f"Loaded {len(self.known_face_encodings)} faces")
-        # Lưu thông tin người dùng sau khi tải ảnh
-        self.save_user_info()
-        return len(self.known_face_encodings) > 0
+        return tasks
+    
+    def _encode_photo_tasks(self, tasks, parallel=False, workers=None):
+        """
+        Mã hóa các ảnh trong tasks, in thông báo cho từng ảnh theo đúng thứ tự
+
+        Yields:
+            tuple: (task, encoding hoặc None, thông báo lỗi hoặc None)
+        """
+        image_paths = [image_path for _, _, image_path in tasks]
+        # Mỗi lô ảnh được mã hóa bằng một lần gọi batch của dlib
+        batches = [image_paths[i:i + PHOTO_BATCH_SIZE] for i in range(0, len(image_paths), PHOTO_BATCH_SIZE)]
+        
+        if parallel and len(batches) > 1:
+            if workers is None:
+                workers = os.cpu_count() or 1
+            workers = max(1, min(workers, len(batches)))
+            print(f"Encoding {len(image_paths)} photos with {workers} worker processes...")
+            # Không fork giữa lúc luồng warm-up đang nạp model
+            get_runtime().join()
+            # executor.map trả kết quả theo đúng thứ tự đầu vào nên thứ tự (tên, file) được giữ nguyên
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(_encode_image_files, batches)
+                yield from self._report_photo_results(tasks, itertools.chain.from_iterable(results))
+        else:
+            results = map(_encode_image_files, batches)
+            yield from self._report_photo_results(tasks, itertools.chain.from_iterable(results))
+    
+    def _report_photo_results(self, tasks, results):
+        """In thông báo cho từng ảnh giống vòng lặp tuần tự trước đây"""
+        current_person = None
+        
+        for task, (encoding, error) in zip(tasks, results):
+            person_name, filename, _ = task
+            if person_name != current_person:
+                print(f"Processing photos for {person_name}...")
+                current_person = person_name
+            
+            print(f"  Processing {filename}")
+            
+            if error is not None:
+                print(f"  Error processing {filename}: {error}")
+            elif encoding is None:
+                print(f"  Warning: No face found in {filename}")
+            
+            yield task, encoding, error
     
     def save_encodings(self):
-        """Save encodings to file"""
-        data = {
-            "encodings": self.known_face_encodings,
-            "names": self.known_face_names
-        }
-        
-        with open(self.encodings_file, 'wb') as f:
-            pickle.dump(data, f)
-        
-        print(f"Saved {len(self.known_face_encodings)} face encodings to {self.encodings_file}")
+        """
+        Save encodings to the gallery file
+
+        Với gallery dùng chung chỉ ghi file của thế hệ mới (gallery_file chỉ còn là nguồn chuyển đổi ban đầu),
+        và chỉ khi gallery có thay đổi chưa lưu: thêm / xóa người dùng đã được công bố ngay khi thực hiện.
+        """
+        with self._gallery_lock:
+            state = self._gallery
+            if self.shared_gallery is None:
+                write_gallery(self.gallery_file, state.encodings, registry=state.registry)
+                print(f"Saved {len(state.encodings)} face encodings to {self.gallery_file}")
+                self._set_gallery(state.encodings, registry=state.registry, dirty=False)
+                return
+            
+            if state.dirty:
+                # Thay cả gallery (ví dụ sau khi đồng bộ thư mục ảnh) rồi dùng bản ánh xạ của thế hệ mới
+                self._adopt_snapshot(self.shared_gallery.update(lambda current: (state.encodings, state.registry)))
+            print(f"Saved {len(self.known_face_encodings)} face encodings to shared gallery "
+                  f"(generation {self.gallery_generation})")
+    
+    def _adopt_snapshot(self, snapshot):
+        """Dùng một thế hệ gallery dùng chung làm gallery hiện tại"""
+        self._set_gallery(snapshot.encodings, registry=snapshot.registry(), generation=snapshot.generation,
+                          dirty=False)
+    
+    def refresh_gallery(self):
+        """
+        Chuyển sang thế hệ gallery mới nhất nếu process khác đã thêm / xóa người dùng
+
+        Chỉ tốn một lần os.stat khi không có gì thay đổi; thế hệ mới được ánh xạ (không sao chép).
+
+        Returns:
+            bool: True nếu gallery đã được thay
+        """
+        # Gallery có thay đổi chưa lưu (vừa đồng bộ ảnh) được giữ cho tới khi save_encodings công bố nó
+        if self.shared_gallery is None or self.gallery_dirty:
+            return False
+        snapshot = self.shared_gallery.snapshot()
+        if snapshot is None or snapshot.generation <= self.gallery_generation:
+            return False
+        with self._gallery_lock:
+            # Luồng khác có thể đã chuyển sang thế hệ này (hoặc mới hơn) trong lúc chờ khóa
+            state = self._gallery
+            if state.dirty or snapshot.generation <= state.generation:
+                return False
+            self._adopt_snapshot(snapshot)
+        return True
     
     def load_encodings(self):
-        """Load encodings from file"""
-        if not os.path.exists(self.encodings_file):
-            print(f"Encodings file {self.encodings_file} not found. Will create after loading photos.")
+        """Load encodings from the gallery file (memory-mapped), migrating the old pickle file if needed"""
+        if self.shared_gallery is not None and self.shared_gallery.exists():
+            if self.refresh_gallery() or self.gallery_generation:
+                print(f"Loaded {len(self.known_face_encodings)} face encodings from shared gallery "
+                      f"(generation {self.gallery_generation})")
+                return True
+        
+        if not os.path.exists(self.gallery_file):
+            if os.path.exists(self.encodings_file):
+                return self._migrate_pickle_encodings()
+            print(f"Encodings file {self.gallery_file} not found. Will create after loading photos.")
             return False
         
+        try:
+            encodings, label_ids, labels = read_gallery(self.gallery_file)
+            registry = UserRegistry(labels, label_ids)
+            self._set_gallery(encodings, registry=registry, dirty=False)
+            if self.shared_gallery is not None:
+                # Lần đầu: công bố gallery_file thành thế hệ 1 (nếu process khác chưa làm) và dùng bản
+                # ánh xạ của thế hệ mới nhất; từ đó gallery_file không bị ghi lại nữa
+                self.shared_gallery.update(lambda current: (encodings, registry) if current is None else None)
+                self.refresh_gallery()
+            
+            print(f"Loaded {len(self.known_face_encodings)} face encodings from file")
+            return True
+        except Exception as e:
+            print(f"Error loading encodings: {e}")
+            return False
+    
+    def _migrate_pickle_encodings(self):
+        """Chuyển file encodings dạng pickle cũ sang định dạng gallery mới"""
+        print(f"Migrating legacy encodings file {self.encodings_file} to {self.gallery_file}...")
         try:
             with open(self.encodings_file, 'rb') as f:
                 data = pickle.load(f)
-                
-            self.known_face_encodings = data["encodings"]
-            self.known_face_names = data["names"]
+            
+            self._set_gallery(_stack_encodings(data["encodings"]), list(data["names"]))
+            self.save_encodings()
             
             print(f"Loaded {len(self.known_face_encodings)} face encodings from file")
             return True
         except Exception as e:
-            print(f"Error loading encodings: {e}")
+            print(f"Error migrating encodings: {e}")
             return False
     
+    def _update_gallery(self, change):
+        """
+        Áp dụng change(encodings, registry) -> (encodings, registry) mới, hoặc None nếu không đổi
+
+        Với gallery dùng chung, change chạy trên thế hệ mới nhất khi giữ khóa ghi liên process và kết quả
+        được công bố ngay, nên hai process cùng thêm / xóa người dùng không ghi đè thay đổi của nhau.
+        Nếu gallery đang có thay đổi chưa lưu thì change được áp dụng trong RAM và lưu ở save_encodings.
+
+        Returns:
+            bool: True nếu gallery đã thay đổi
+        """
+        with self._gallery_lock:
+            state = self._gallery
+            if self.shared_gallery is not None and not state.dirty:
+                def apply(current):
+                    if current is None:
+                        return change(state.encodings, state.registry)
+                    return change(current.encodings, current.registry())
+                snapshot = self.shared_gallery.update(apply)
+                if snapshot is None:
+                    return False
+                self._adopt_snapshot(snapshot)
+                return True
+            
+            result = change(state.encodings, state.registry)
+            if result is None:
+                return False
+            self._set_gallery(result[0], registry=result[1])
+            return True
+    
+    def _append_encodings(self, encodings, user_name):
+        """Thêm các encoding mới của một người dùng vào cuối gallery"""
+        if len(encodings) == 0:
+            return
+        new_rows = _stack_encodings(encodings)
+        self._update_gallery(lambda current, registry: (np.concatenate([current, new_rows]),
+                                                        registry.append(user_name, len(new_rows))))
+    
+    def _set_gallery(self, encodings, names=None, registry=None, generation=None, dirty=True):
+        """
+        Thay gallery hiện tại (theo danh sách tên hoặc UserRegistry đã dựng sẵn)
+
+        Trạng thái mới được dựng đầy đủ rồi mới thay bằng một phép gán; matcher được dựng lại khi cần.
+        """
+        if registry is None:
+            registry = UserRegistry.from_names(names)
+        if generation is None:
+            generation = self._gallery.generation
+        self._gallery = _GalleryState(encodings, registry, generation, dirty)
+    
+    @property
+    def known_face_encodings(self):
+        """Ma trận encoding float32 N x 128 của gallery hiện tại"""
+        return self._gallery.encodings
+    
+    @property
+    def registry(self):
+        """UserRegistry của gallery hiện tại"""
+        return self._gallery.registry
+    
+    @property
+    def gallery_generation(self):
+        """Thế hệ gallery dùng chung đang dùng (0 nếu chưa có)"""
+        return self._gallery.generation
+    
+    @property
+    def gallery_dirty(self):
+        """True khi gallery trong RAM có thay đổi chưa được lưu"""
+        return self._gallery.dirty
+    
+    @property
+    def known_face_names(self):
+        """Tên của từng dòng gallery (danh sách dựng một lần cho mỗi registry)"""
+        return self.registry.names()
+    
     def get_encodings(self):
         """Return the current encodings and names"""
-        return self.known_face_encodings, self.known_face_names
+        state = self._gallery
+        return state.encodings, state.registry.names()
+    
+    def get_matcher(self):
+        """
+        Trả về GalleryMatcher cho gallery hiện tại (được cache cho tới khi gallery thay đổi)
+
+        An toàn khi gọi từ nhiều luồng: matcher được dựng từ một trạng thái gallery duy nhất.
+        Vòng lặp nhận diện nên dùng get_live_matcher() để việc dựng lại nằm trên luồng nền.
+        """
+        self.refresh_gallery()
+        state = self._gallery
+        if state.matcher is None:
+            with self._matcher_lock:
+                if state.matcher is None:
+                    state.matcher = self._build_matcher(state)
+        return state.matcher
+    
+    def _build_matcher(self, state):
+        """Dựng matcher (prototype, IVF hoặc quét toàn bộ) cho một trạng thái gallery"""
+        if self.prototype_mode is not None:
+            return PrototypeMatcher(state.encodings, mode=self.prototype_mode, per_user=self.prototypes_per_user,
+                                    registry=state.registry)
+        index = None
+        if self.index_kind == 'ivf' and len(state.encodings) > 0:
+            index = self._load_or_build_index(state)
+        return GalleryMatcher(state.encodings, index=index, registry=state.registry)
+    
+    def get_live_matcher(self, check_every=1.0):
+        """Matcher cho vòng lặp chạy lâu (webcam, nhiều camera): tự chuyển sang gallery mới sau khi thêm / xóa"""
+        return LiveMatcher(self, check_every)
+    
+    def build_index(self, n_lists=None, state=None):
+        """Xây chỉ mục IVF cho gallery hiện tại và lưu cạnh file gallery"""
+        state = state or self._gallery
+        index = IVFIndex.build(state.encodings, n_lists=n_lists, n_probe=self.n_probe)
+        index_file = index_path_for(self.gallery_file, IVFIndex.kind)
+        index.save(index_file, gallery_fingerprint(state.encodings, registry=state.registry))
+        print(f"Built IVF index with {index.n_lists} lists for {len(index)} encodings: {index_file}")
+        return index
+    
+    def _load_or_build_index(self, state):
+        """Tải chỉ mục IVF đã lưu nếu còn khớp với gallery, nếu không thì xây lại"""
+        index_file = index_path_for(self.gallery_file, IVFIndex.kind)
+        try:
+            fingerprint = gallery_fingerprint(state.encodings, registry=state.registry)
+            index = IVFIndex.load(index_file, state.encodings, fingerprint, n_probe=self.n_probe)
+            if index is not None:
+                return index
+        except Exception as e:
+            print(f"Error loading index: {e}")
+        return self.build_index(state=state)
         
     def save_user_info(self):
         """Lưu thông tin người dùng vào file JSON"""
@@ -135,7 +630,7 @@ class FaceEncoder:
             
     def update_user_info(self, name, age=None, address=None):
         """Cập nhật thông tin cho người dùng cụ thể"""
-        if name not in self.known_face_names and name not in self.user_info:
+        if name not in self.registry and name not in self.user_info:
             print(f"User {name} not found in database")
             return False
             
@@ -165,7 +660,7 @@ class FaceEncoder:
     
     def get_unique_users(self):
         """Trả về danh sách tên người dùng không trùng lặp"""
-        return list(set(self.known_face_names))
+        return self.registry.users()
     
     def add_user_from_image(self, image_path, user_name, age=None, address=None):
         """
@@ -177,8 +672,8 @@ class FaceEncoder:
             return False
             
         # Kiểm tra ảnh có chứa khuôn mặt không
-        image = face_recognition.load_image_file(image_path)
-        face_locations = face_recognition.face_locations(image)
+        image = get_runtime().load_image_file(image_path)
+        small_image, face_locations, _ = IMAGE_PROFILE.detect(image)
         
         if not face_locations:
             print("Lỗi: Không tìm thấy khuôn mặt trong ảnh.")
@@ -195,7 +690,7 @@ class FaceEncoder:
             file_extension = '.jpg'  # Mặc định là jpg nếu không có phần mở rộng
         
         # Đếm số file ảnh đã có trong thư mục
-        existing_files = [f for f in os.listdir(user_folder) if f.endswith(('.jpg', '.jpeg', '.png'))]
+        existing_files = [f for f in os.listdir(user_folder) if f.endswith(IMAGE_EXTENSIONS)]
         new_file_name = f"{user_name}_{len(existing_files) + 1:03d}{file_extension}"
         
         dest_path = os.path.join(user_folder, new_file_name)
@@ -207,9 +702,8 @@ class FaceEncoder:
         self.update_user_info(user_name, age, address)
         
         # Cập nhật danh sách khuôn mặt
-        encoding = face_recognition.face_encodings(image)[0]
-        self.known_face_encodings.append(encoding)
-        self.known_face_names.append(user_name)
+        encoding = batch_face_encodings([(small_image, face_locations[:1])])[0][0]
+        self._append_encodings([encoding], user_name)
         
         # Lưu dữ liệu
         self.save_encodings()
@@ -233,6 +727,7 @@ class FaceEncoder:
             print("Không thể chọn camera, sử dụng camera mặc định (0)")
         
         # Mở webcam
+        import cv2
         cap = cv2.VideoCapture(camera_id)
         if not cap.isOpened():
             print(f"Lỗi: Không thể mở camera {camera_id}")
@@ -288,28 +783,7 @@ class FaceEncoder:
             print("Không có ảnh nào được chụp")
             return False
         
-        encodings_added = 0
-        
-        for i, image in enumerate(images):
-            # Lưu ảnh vào thư mục người dùng
-            new_file_name = f"{user_name}_{i + 1:03d}.jpg"
-            image_path = os.path.join(user_folder, new_file_name)
-            
-            # Lưu ảnh
-            cv2.imwrite(image_path, image)
-            
-            try:
-                # Thêm encoding vào danh sách
-                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                face_locations = face_recognition.face_locations(rgb_image)
-                
-                if face_locations:
-                    encoding = face_recognition.face_encodings(rgb_image, face_locations)[0]
-                    self.known_face_encodings.append(encoding)
-                    self.known_face_names.append(user_name)
-                    encodings_added += 1
-            except Exception as e:
-                print(f"Lỗi khi mã hóa khuôn mặt: {e}")
+        encodings_added = self._encode_captured_images(user_name, user_folder, images)
         
         # Thêm thông tin người dùng và lưu encoding
         if encodings_added > 0:
@@ -321,16 +795,18 @@ class FaceEncoder:
             print("Không thể mã hóa khuôn mặt từ ảnh chụp")
             return False
     
-    def process_user_images(self, user_name, images, age=None, address=None):
+    def _encode_captured_images(self, user_name, user_folder, images):
         """
-        Xử lý ảnh chụp cho người dùng mới
+        Lưu các ảnh BGR đã chụp và thêm encoding của khuôn mặt đầu tiên trong mỗi ảnh
+
+        Các khuôn mặt của tất cả ảnh được mã hóa bằng batch_face_encodings thay vì từng ảnh một.
+
+        Returns:
+            int: Số encoding đã thêm
         """
-        # Tạo thư mục cho người dùng nếu chưa tồn tại
-        user_folder = os.path.join(self.photos_dir, user_name)
-        os.makedirs(user_folder, exist_ok=True)
-        
-        encodings_added = 0
+        import cv2
         
+        detected = []
         for i, image in enumerate(images):
             # Lưu ảnh vào thư mục người dùng
             new_file_name = f"{user_name}_{i + 1:03d}.jpg"
@@ -340,18 +816,35 @@ class FaceEncoder:
             cv2.imwrite(image_path, image)
             
             try:
-                # Thêm encoding vào danh sách
-                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                face_locations = face_recognition.face_locations(rgb_image)
-                
+                rgb_image, face_locations, _ = IMAGE_PROFILE.detect(image, bgr=True)
                 if face_locations:
-                    encoding = face_recognition.face_encodings(rgb_image, face_locations)[0]
-                    self.known_face_encodings.append(encoding)
-                    self.known_face_names.append(user_name)
-                    encodings_added += 1
+                    detected.append((rgb_image, face_locations[:1]))
             except Exception as e:
                 print(f"Lỗi khi mã hóa khuôn mặt: {e}")
         
+        if not detected:
+            return 0
+        
+        try:
+            encodings = [image_encodings[0] for image_encodings in batch_face_encodings(detected)]
+        except Exception as e:
+            print(f"Lỗi khi mã hóa khuôn mặt: {e}")
+            return 0
+        
+        # Thêm encoding vào danh sách
+        self._append_encodings(encodings, user_name)
+        return len(encodings)
+    
+    def process_user_images(self, user_name, images, age=None, address=None):
+        """
+        Xử lý ảnh chụp cho người dùng mới
+        """
+        # Tạo thư mục cho người dùng nếu chưa tồn tại
+        user_folder = os.path.join(self.photos_dir, user_name)
+        os.makedirs(user_folder, exist_ok=True)
+        
+        encodings_added = self._encode_captured_images(user_name, user_folder, images)
+        
         # Thêm thông tin người dùng nếu đã thêm ít nhất một encoding
         if encodings_added > 0:
             self.update_user_info(user_name, age, address)
@@ -371,20 +864,21 @@ class FaceEncoder:
             bool: True nếu xóa thành công, False nếu có lỗi
         """
         try:
+            self.refresh_gallery()
             # Kiểm tra nếu người dùng tồn tại
-            if user_name not in self.known_face_names and user_name not in self.user_info:
+            if user_name not in self.registry and user_name not in self.user_info:
                 print(f"User '{user_name}' not found.")
                 return False
-                
-            # Xóa các encoding liên quan đến người dùng
-            if user_name in self.known_face_names:
-                # Tìm tất cả vị trí của user_name trong known_face_names
-                indices_to_remove = [i for i, name in enumerate(self.known_face_names) if name == user_name]
-                
-                # Xóa từ cuối lên để tránh thay đổi index
-                for idx in sorted(indices_to_remove, reverse=True):
-                    self.known_face_names.pop(idx)
-                    self.known_face_encodings.pop(idx)
+            
+            def remove_user(encodings, registry):
+                # Giữ lại các dòng không thuộc về user_name (một mặt nạ trên cột label id)
+                if user_name not in registry:
+                    return None
+                keep, registry = registry.without(user_name)
+                return np.ascontiguousarray(encodings[keep]), registry
+            
+            # Xóa các encoding liên quan đến người dùng (trên thế hệ mới nhất của gallery dùng chung)
+            self._update_gallery(remove_user)
             
             # Xóa thông tin người dùng
             if user_name in self.user_info:
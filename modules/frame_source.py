@@ -0,0 +1,123 @@
+"""
+Module nguồn frame cho các vòng lặp nhận diện và điểm danh
+
+Tất cả nguồn có cùng giao diện với cv2.VideoCapture (isOpened, read, release) nên có thể
+đưa thẳng vào FramePipeline:
+    - CameraSource: camera trực tiếp
+    - VideoFileSource: file video đã ghi (ví dụ camera sảnh, file xuất từ CCTV)
+    - ImageSequenceSource: thư mục (hoặc mẫu glob) chứa các ảnh frame
+"""
+import os
+import glob
+import cv2
+
+FRAME_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class CameraSource:
+    """Camera trực tiếp"""
+
+    is_live = True
+
+    def __init__(self, camera_id=1):
+        self.camera_id = camera_id
+        self.name = f"camera {camera_id}"
+        self.fps = 0.0
+        self.capture = cv2.VideoCapture(camera_id)
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self):
+        return self.capture.read()
+
+    def release(self):
+        self.capture.release()
+
+    def describe_frame(self, frame_id):
+        return {}
+
+
+class VideoFileSource:
+    """File video, đọc tuần tự từng frame"""
+
+    is_live = False
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.capture = cv2.VideoCapture(path)
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 0.0
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self):
+        return self.capture.read()
+
+    def release(self):
+        self.capture.release()
+
+    def describe_frame(self, frame_id):
+        """Vị trí của frame trong video (giây), frame_id bắt đầu từ 1"""
+        if self.fps > 0:
+            return {"time_s": round((frame_id - 1) / self.fps, 3)}
+        return {}
+
+
+class ImageSequenceSource:
+    """Chuỗi ảnh frame trong một thư mục hoặc theo mẫu glob, đọc theo thứ tự tên file"""
+
+    is_live = False
+
+    def __init__(self, pattern):
+        if os.path.isdir(pattern):
+            paths = [os.path.join(pattern, f) for f in os.listdir(pattern)]
+        else:
+            paths = glob.glob(pattern)
+        self.paths = sorted(p for p in paths if p.lower().endswith(FRAME_EXTENSIONS))
+        self.name = pattern
+        self.fps = 0.0
+        self._position = 0
+        # Đường dẫn của các frame đã đọc thành công, theo thứ tự frame
+        self._frame_paths = []
+
+    def isOpened(self):
+        return len(self.paths) > 0
+
+    def read(self):
+        # Bỏ qua các file không đọc được thay vì dừng cả chuỗi
+        while self._position < len(self.paths):
+            frame = cv2.imread(self.paths[self._position])
+            self._position += 1
+            if frame is not None:
+                self._frame_paths.append(self.paths[self._position - 1])
+                return True, frame
+            print(f"Warning: Could not read frame {self.paths[self._position - 1]}")
+        return False, None
+
+    def release(self):
+        self._position = len(self.paths)
+
+    def describe_frame(self, frame_id):
+        """Đường dẫn ảnh của frame đã đọc (frame_id bắt đầu từ 1)"""
+        if 0 < frame_id <= len(self._frame_paths):
+            return {"file": self._frame_paths[frame_id - 1]}
+        return {}
+
+
+def open_source(source):
+    """
+    Tạo nguồn frame từ mô tả
+
+    Args:
+        source: Số camera (int hoặc chuỗi số), thư mục/mẫu glob chứa ảnh frame, đường dẫn file video,
+                hoặc một nguồn đã tạo sẵn (được trả về nguyên vẹn)
+    """
+    if hasattr(source, 'read') and hasattr(source, 'release'):
+        return source
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        return CameraSource(int(source))
+    if os.path.isdir(source) or any(ch in source for ch in '*?['):
+        return ImageSequenceSource(source)
+    return VideoFileSource(source)
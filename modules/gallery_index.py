@@ -0,0 +1,288 @@
+"""
+Module chỉ mục tìm kiếm láng giềng gần nhất cho gallery khuôn mặt
+
+- BruteForceIndex: quét toàn bộ gallery, kết quả chính xác (mặc định)
+- IVFIndex: chia gallery thành các cụm bằng k-means (numpy thuần), khi tìm kiếm chỉ
+  quét n_probe cụm gần nhất. Tăng n_probe để tăng recall, giảm để tăng tốc độ.
+
+Mỗi chỉ mục có hàm search(queries) trả về danh sách (row ids, khoảng cách) ứng viên
+cho từng khuôn mặt; GalleryMatcher chọn kết quả tốt nhất từ các ứng viên này.
+"""
+import os
+import time
+import numpy as np
+
+INDEX_VERSION = 1
+
+
+def _as_matrix(vectors):
+    """Chuyển về ma trận float32 liền khối"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2:
+        # reshape(0, -1) không xác định được số cột, nên ma trận rỗng N x dim được giữ nguyên
+        vectors = vectors.reshape(len(vectors), -1)
+    return np.ascontiguousarray(vectors)
+
+
+def _row_sq_norms(matrix):
+    """Bình phương chuẩn của từng dòng"""
+    return np.einsum('ij,ij->i', matrix, matrix)
+
+
+def _pairwise_distances(queries, query_sq_norms, vectors, vector_sq_norms):
+    """Khoảng cách Euclid giữa từng query và từng vector qua ||q||^2 + ||v||^2 - 2 q.v"""
+    sq_distances = query_sq_norms[:, None] + vector_sq_norms[None, :] - 2.0 * (queries @ vectors.T)
+    np.maximum(sq_distances, 0.0, out=sq_distances)
+    return np.sqrt(sq_distances)
+
+
+def index_path_for(gallery_file, kind):
+    """Đường dẫn file chỉ mục đặt cạnh file gallery, ví dụ data/face_gallery.ivf.npz"""
+    return f"{os.path.splitext(gallery_file)[0]}.{kind}.npz"
+
+
+class BruteForceIndex:
+    """Quét toàn bộ gallery bằng một phép nhân ma trận cho cả lô query"""
+
+    kind = 'brute'
+
+    def __init__(self, vectors, sq_norms=None):
+        self.vectors = _as_matrix(vectors)
+        self.sq_norms = _row_sq_norms(self.vectors) if sq_norms is None else sq_norms
+        self.ids = np.arange(len(self.vectors))
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries):
+        """Trả về danh sách (row ids, khoảng cách) cho từng query; ở đây là toàn bộ gallery"""
+        queries = _as_matrix(queries)
+        if len(queries) == 0:
+            return []
+        distances = _pairwise_distances(queries, _row_sq_norms(queries), self.vectors, self.sq_norms)
+        return [(self.ids, row) for row in distances]
+
+
+class IVFIndex:
+    """
+    Chỉ mục IVF (inverted file): k-means chia gallery thành n_lists cụm
+
+    Danh sách các dòng của từng cụm được lưu dạng CSR (list_rows + list_offsets). Các vector
+    cũng được sắp lại theo cụm thành một bản sao liền khối, nên mỗi cụm được quét bằng một
+    lát cắt liên tục thay vì gom các dòng rải rác (đổi thêm một bản sao gallery lấy tốc độ).
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, vectors, centroids, list_rows, list_offsets, n_probe=8, sq_norms=None):
+        self.vectors = _as_matrix(vectors)
+        self.sq_norms = _row_sq_norms(self.vectors) if sq_norms is None else sq_norms
+        self.centroids = _as_matrix(centroids)
+        self.centroid_sq_norms = _row_sq_norms(self.centroids)
+        self.list_rows = list_rows
+        self.list_offsets = list_offsets
+        self.list_vectors = self.vectors[list_rows]
+        self.list_sq_norms = self.sq_norms[list_rows]
+        self.n_probe = n_probe
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, n_probe=8, n_iter=20, train_size=None, seed=0, sq_norms=None):
+        """
+        Xây chỉ mục từ gallery
+
+        Args:
+            vectors: Ma trận encoding N x dim
+            n_lists: Số cụm (mặc định ~ căn bậc hai của N)
+            n_probe: Số cụm quét khi tìm kiếm (núm điều chỉnh recall / độ trễ)
+            n_iter: Số vòng lặp k-means
+            train_size: Số dòng dùng để huấn luyện k-means (mặc định 256 dòng mỗi cụm)
+            seed: Seed để kết quả xây chỉ mục ổn định
+        """
+        vectors = _as_matrix(vectors)
+        num_rows = len(vectors)
+        if num_rows == 0:
+            raise ValueError("Cannot build an IVF index on an empty gallery")
+
+        if n_lists is None:
+            n_lists = int(round(np.sqrt(num_rows)))
+        n_lists = max(1, min(n_lists, num_rows))
+
+        rng = np.random.RandomState(seed)
+        if train_size is None:
+            train_size = 256 * n_lists
+        if train_size < num_rows:
+            train = vectors[np.sort(rng.choice(num_rows, train_size, replace=False))]
+        else:
+            train = vectors
+
+        centroids = _kmeans(train, n_lists, n_iter, rng)
+        assignments = _assign(vectors, centroids)
+
+        # Sắp xếp ổn định để các dòng trong mỗi cụm giữ thứ tự gallery
+        list_rows = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(vectors, centroids, list_rows, list_offsets, n_probe=n_probe, sq_norms=sq_norms)
+
+    def search(self, queries):
+        """Trả về danh sách (row ids, khoảng cách) của các dòng thuộc n_probe cụm gần nhất"""
+        queries = _as_matrix(queries)
+        if len(queries) == 0:
+            return []
+
+        query_sq_norms = _row_sq_norms(queries)
+        centroid_distances = _pairwise_distances(queries, query_sq_norms,
+                                                 self.centroids, self.centroid_sq_norms)
+        n_probe = max(1, min(self.n_probe, self.n_lists))
+        if n_probe < self.n_lists:
+            probes = np.argpartition(centroid_distances, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            probes = np.broadcast_to(np.arange(self.n_lists), centroid_distances.shape)
+
+        results = []
+        for query, query_sq_norm, probe in zip(queries, query_sq_norms, probes):
+            id_parts = []
+            sq_distance_parts = []
+            for p in probe:
+                start, end = self.list_offsets[p], self.list_offsets[p + 1]
+                id_parts.append(self.list_rows[start:end])
+                sq_distance_parts.append(self.list_sq_norms[start:end] - 2.0 * (self.list_vectors[start:end] @ query))
+            sq_distances = np.concatenate(sq_distance_parts) + query_sq_norm
+            np.maximum(sq_distances, 0.0, out=sq_distances)
+            results.append((np.concatenate(id_parts), np.sqrt(sq_distances)))
+        return results
+
+    def save(self, path, fingerprint=None):
+        """Lưu chỉ mục (chỉ lưu centroid và danh sách cụm, không lưu lại gallery)"""
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path,
+                 version=np.array(INDEX_VERSION),
+                 num_rows=np.array(len(self.vectors)),
+                 fingerprint=np.array(fingerprint if fingerprint is not None else ''),
+                 centroids=self.centroids,
+                 list_rows=self.list_rows,
+                 list_offsets=self.list_offsets,
+                 n_probe=np.array(self.n_probe))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, vectors, fingerprint=None, n_probe=None, sq_norms=None):
+        """
+        Tải chỉ mục đã lưu cho gallery hiện tại
+
+        Returns:
+            IVFIndex hoặc None nếu file không tồn tại hoặc không còn khớp với gallery
+        """
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path) as data:
+            if int(data["version"]) != INDEX_VERSION or int(data["num_rows"]) != len(vectors):
+                return None
+            if fingerprint is not None and str(data["fingerprint"]) != fingerprint:
+                return None
+            return cls(vectors, data["centroids"], data["list_rows"], data["list_offsets"],
+                       n_probe=int(data["n_probe"]) if n_probe is None else n_probe,
+                       sq_norms=sq_norms)
+
+
+def _assign(vectors, centroids, chunk_size=16384):
+    """Gán từng vector vào centroid gần nhất, xử lý theo khối để giới hạn bộ nhớ"""
+    centroid_sq_norms = _row_sq_norms(centroids)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = vectors[start:start + chunk_size]
+        # ||v||^2 không ảnh hưởng tới argmin nên bỏ qua
+        scores = centroid_sq_norms[None, :] - 2.0 * (chunk @ centroids.T)
+        assignments[start:start + chunk_size] = np.argmin(scores, axis=1)
+    return assignments
+
+
+def _kmeans(vectors, k, n_iter, rng):
+    """K-means (Lloyd) bằng numpy; cụm rỗng được khởi tạo lại bằng một điểm ngẫu nhiên"""
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _assign(vectors, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+    return centroids
+
+
+def build_index(kind, vectors, sq_norms=None, **params):
+    """Tạo chỉ mục theo tên: 'brute' (chính xác) hoặc 'ivf' (xấp xỉ)"""
+    if kind == 'brute':
+        return BruteForceIndex(vectors, sq_norms=sq_norms)
+    if kind == 'ivf':
+        return IVFIndex.build(vectors, sq_norms=sq_norms, **params)
+    raise ValueError(f"Unknown index kind: {kind}")
+
+
+def measure_recall(index, vectors, queries):
+    """
+    Đo recall@1 của một chỉ mục so với quét toàn bộ, cùng độ trễ trung bình mỗi query
+
+    Returns:
+        dict: {"recall": tỉ lệ query tìm đúng láng giềng gần nhất, "latency_ms": ms/query,
+               "candidates": số ứng viên trung bình mỗi query}
+    """
+    queries = _as_matrix(queries)
+    exact = BruteForceIndex(vectors).search(queries)
+    expected = np.array([ids[np.argmin(distances)] for ids, distances in exact])
+
+    start = time.perf_counter()
+    found = []
+    num_candidates = 0
+    for query in queries:
+        ids, distances = index.search(query[None, :])[0]
+        found.append(ids[np.argmin(distances)] if len(ids) > 0 else -1)
+        num_candidates += len(ids)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "recall": float(np.mean(np.array(found) == expected)) if len(queries) else 1.0,
+        "latency_ms": elapsed * 1000.0 / max(1, len(queries)),
+        "candidates": num_candidates / max(1, len(queries))
+    }
+
+
+if __name__ == '__main__':
+    # Đo recall / độ trễ của IVF so với quét toàn bộ trên dữ liệu tổng hợp có dạng cụm
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure IVF recall against brute force")
+    parser.add_argument('--rows', type=int, default=150000, help="Số dòng gallery tổng hợp")
+    parser.add_argument('--identities', type=int, default=5000, help="Số người tổng hợp")
+    parser.add_argument('--queries', type=int, default=500, help="Số query")
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    centers = rng.randn(args.identities, 128).astype(np.float32)
+    centers *= 0.5 / np.linalg.norm(centers, axis=1, keepdims=True)
+    rows = centers[rng.randint(0, args.identities, args.rows)] + 0.03 * rng.randn(args.rows, 128).astype(np.float32)
+    queries = rows[rng.choice(args.rows, args.queries)] + 0.02 * rng.randn(args.queries, 128).astype(np.float32)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(rows)
+    print(f"Built IVF index with {index.n_lists} lists on {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+    brute = measure_recall(BruteForceIndex(rows), rows, queries)
+    print(f"brute force   recall={brute['recall']:.3f}  latency={brute['latency_ms']:.3f} ms/query")
+    for n_probe in args.probes:
+        index.n_probe = n_probe
+        result = measure_recall(index, rows, queries)
+        print(f"n_probe={n_probe:<4d} recall={result['recall']:.3f}  latency={result['latency_ms']:.3f} ms/query"
+              f"  candidates={result['candidates']:.0f}")
@@ -0,0 +1,258 @@
+"""
+Module lưu trữ gallery khuôn mặt dưới dạng ma trận float32 có thể memory-map
+
+Cấu trúc file (little-endian):
+    - Header 64 byte: magic, version, số chiều, số dòng, số nhãn và các offset
+    - Ma trận encoding N x dim kiểu float32, liền một khối ngay sau header
+    - Cột label id (int32, N phần tử) trỏ vào danh sách nhãn
+    - Danh sách nhãn (tên người dùng) dạng JSON UTF-8 ở cuối file
+
+Ma trận được mở bằng np.memmap ở chế độ chỉ đọc nên việc khởi động chỉ là một lần
+ánh xạ trang, và nhiều process mở cùng file sẽ dùng chung các trang vật lý.
+"""
+import os
+import json
+import struct
+import time
+import hashlib
+import numpy as np
+
+GALLERY_MAGIC = b'FRGALLRY'
+GALLERY_VERSION = 1
+ENCODING_DIM = 128
+HEADER_SIZE = 64
+# magic, version, dim, count, num_labels, label_ids_offset, labels_offset
+_HEADER_STRUCT = struct.Struct('<8sIIQIQQ')
+
+
+def intern_labels(names):
+    """
+    Chuyển danh sách tên thành (danh sách nhãn không trùng, mảng label id)
+
+    Thứ tự nhãn theo lần xuất hiện đầu tiên để kết quả ổn định.
+    """
+    label_index = {}
+    labels = []
+    label_ids = np.empty(len(names), dtype=np.int32)
+    for i, name in enumerate(names):
+        label_id = label_index.get(name)
+        if label_id is None:
+            label_id = len(labels)
+            label_index[name] = label_id
+            labels.append(name)
+        label_ids[i] = label_id
+    return labels, label_ids
+
+
+class UserRegistry:
+    """
+    Nhãn của các dòng gallery: label id cho từng dòng, tên -> các dòng, tập người dùng
+
+    Đối tượng không bị sửa sau khi tạo; append() / without() trả về registry mới cùng với thay đổi
+    tương ứng của ma trận encoding, nên registry luôn khớp với ma trận mà nó đi kèm.
+    Kiểm tra một tên có trong gallery không và lấy danh sách người dùng đều không phải quét các dòng.
+    """
+
+    def __init__(self, labels=(), label_ids=None):
+        self.labels = list(labels)
+        self.label_ids = np.asarray(label_ids if label_ids is not None else [], dtype=np.int32)
+        self._label_index = {name: i for i, name in enumerate(self.labels)}
+        self._names = None
+        self._rows = None
+
+    @classmethod
+    def from_names(cls, names):
+        labels, label_ids = intern_labels(names)
+        return cls(labels, label_ids)
+
+    def __len__(self):
+        """Số dòng"""
+        return len(self.label_ids)
+
+    def __contains__(self, name):
+        return name in self._label_index
+
+    def users(self):
+        """Danh sách người dùng không trùng (theo thứ tự xuất hiện đầu tiên)"""
+        return list(self.labels)
+
+    def label_id(self, name):
+        return self._label_index.get(name)
+
+    def names(self):
+        """Tên của từng dòng (dựng một lần, các chuỗi được dùng chung)"""
+        if self._names is None:
+            self._names = expand_labels(self.label_ids, self.labels)
+        return self._names
+
+    def rows(self, name):
+        """Chỉ số các dòng của một người (mảng rỗng nếu không có)"""
+        if self._rows is None:
+            # Dựng map tên -> dòng một lần cho mọi người bằng một lần sắp xếp ổn định
+            order = np.argsort(self.label_ids, kind='stable')
+            counts = np.bincount(self.label_ids, minlength=len(self.labels))
+            self._rows = dict(zip(self.labels, np.split(order, np.cumsum(counts)[:-1])))
+        return self._rows.get(name, np.empty(0, dtype=np.intp))
+
+    def append(self, name, count):
+        """Registry mới sau khi thêm count dòng của name vào cuối gallery"""
+        labels = self.labels
+        label_id = self._label_index.get(name)
+        if label_id is None:
+            label_id = len(labels)
+            labels = labels + [name]
+        label_ids = np.concatenate([self.label_ids, np.full(count, label_id, dtype=np.int32)])
+        return UserRegistry(labels, label_ids)
+
+    def without(self, name):
+        """
+        Bỏ mọi dòng của name
+
+        Returns:
+            tuple: (mặt nạ bool các dòng được giữ lại, registry mới)
+        """
+        label_id = self._label_index.get(name)
+        if label_id is None:
+            return np.ones(len(self.label_ids), dtype=bool), self
+        keep = self.label_ids != label_id
+        # Đánh số lại các nhãn phía sau nhãn bị bỏ
+        remap = np.arange(len(self.labels), dtype=np.int32)
+        remap[label_id + 1:] -= 1
+        labels = self.labels[:label_id] + self.labels[label_id + 1:]
+        return keep, UserRegistry(labels, remap[self.label_ids[keep]])
+
+
+def replace_file(src, dst, retries=50, delay=0.02):
+    """
+    os.replace có thử lại
+
+    Trên Windows, os.replace thất bại (PermissionError) khi file đích đang được process khác mở
+    hoặc memory-map; thử lại trong khoảng retries * delay giây rồi mới báo lỗi.
+    """
+    for attempt in range(retries):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if attempt == retries - 1:
+                raise
+            time.sleep(delay)
+
+
+def write_gallery(path, encodings, names=None, registry=None):
+    """
+    Ghi gallery ra file (ghi file tạm rồi thay thế để reader không đọc phải file dở)
+
+    Args:
+        path: Đường dẫn file gallery
+        encodings: Ma trận hoặc danh sách encoding N x dim
+        names: Danh sách tên tương ứng với từng dòng
+        registry: UserRegistry đã dựng sẵn, dùng thay cho names (không phải gán nhãn lại)
+    """
+    if registry is None:
+        labels, label_ids = intern_labels(names)
+    else:
+        labels, label_ids = registry.labels, registry.label_ids
+    if len(label_ids) == 0:
+        # Gallery rỗng (ví dụ vừa xóa người dùng cuối cùng)
+        matrix = np.empty((0, ENCODING_DIM), dtype=np.float32)
+    else:
+        matrix = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(len(label_ids), -1))
+    count, dim = matrix.shape
+
+    labels_blob = json.dumps(labels, ensure_ascii=False).encode('utf-8')
+
+    label_ids_offset = HEADER_SIZE + matrix.nbytes
+    labels_offset = label_ids_offset + label_ids.nbytes
+    header = _HEADER_STRUCT.pack(GALLERY_MAGIC, GALLERY_VERSION, dim, count, len(labels),
+                                 label_ids_offset, labels_offset)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        f.write(matrix.tobytes())
+        f.write(label_ids.astype('<i4').tobytes())
+        f.write(labels_blob)
+    replace_file(tmp_path, path)
+
+
+def read_gallery_header(path):
+    """Đọc header của file gallery, trả về dict hoặc raise ValueError nếu không hợp lệ"""
+    with open(path, 'rb') as f:
+        raw = f.read(HEADER_SIZE)
+
+    if len(raw) < HEADER_SIZE:
+        raise ValueError(f"{path} is too small to be a gallery file")
+
+    magic, version, dim, count, num_labels, label_ids_offset, labels_offset = _HEADER_STRUCT.unpack_from(raw)
+    if magic != GALLERY_MAGIC:
+        raise ValueError(f"{path} is not a gallery file")
+    if version != GALLERY_VERSION:
+        raise ValueError(f"Unsupported gallery version {version} in {path}")
+
+    return {
+        "version": version,
+        "dim": dim,
+        "count": count,
+        "num_labels": num_labels,
+        "label_ids_offset": label_ids_offset,
+        "labels_offset": labels_offset
+    }
+
+
+def read_gallery(path, mmap=True):
+    """
+    Mở file gallery
+
+    Args:
+        path: Đường dẫn file gallery
+        mmap: True để ánh xạ ma trận bằng np.memmap (chỉ đọc), False để đọc hẳn vào RAM
+
+    Returns:
+        tuple: (ma trận float32 N x dim, mảng label id int32, danh sách nhãn)
+    """
+    header = read_gallery_header(path)
+    count, dim = header["count"], header["dim"]
+
+    if count == 0:
+        encodings = np.empty((0, dim), dtype=np.float32)
+        label_ids = np.empty(0, dtype=np.int32)
+    elif mmap:
+        encodings = np.memmap(path, dtype='<f4', mode='r', offset=HEADER_SIZE, shape=(count, dim))
+        label_ids = np.memmap(path, dtype='<i4', mode='r', offset=header["label_ids_offset"], shape=(count,))
+    else:
+        with open(path, 'rb') as f:
+            f.seek(HEADER_SIZE)
+            encodings = np.fromfile(f, dtype='<f4', count=count * dim).reshape(count, dim)
+            label_ids = np.fromfile(f, dtype='<i4', count=count)
+
+    with open(path, 'rb') as f:
+        f.seek(header["labels_offset"])
+        labels = json.loads(f.read().decode('utf-8'))
+
+    if len(labels) != header["num_labels"]:
+        raise ValueError(f"Corrupted label table in {path}")
+
+    return encodings, label_ids, labels
+
+
+def expand_labels(label_ids, labels):
+    """Chuyển cột label id thành danh sách tên (các chuỗi được dùng chung, không bị nhân bản)"""
+    return [labels[i] for i in np.asarray(label_ids).tolist()]
+
+
+def gallery_fingerprint(encodings, names=None, registry=None):
+    """
+    Dấu vân tay nội dung gallery, dùng để biết chỉ mục đã lưu còn khớp với gallery hay không
+
+    Băm danh sách nhãn và cột label id (không dựng lại tên của từng dòng).
+    """
+    if registry is None:
+        labels, label_ids = intern_labels(names)
+    else:
+        labels, label_ids = registry.labels, registry.label_ids
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(encodings, dtype=np.float32).tobytes())
+    digest.update(json.dumps(list(labels), ensure_ascii=False).encode('utf-8'))
+    digest.update(np.ascontiguousarray(label_ids, dtype='<i4').tobytes())
+    return digest.hexdigest()
@@ -1,9 +1,23 @@
-import face_recognition
 import cv2
 import numpy as np
 import os
+import glob
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from modules.detection import IMAGE_PROFILE, scale_boxes
+from modules.face_loader import batch_face_encodings
+from modules.matcher import GalleryMatcher, DEFAULT_TOLERANCE, UNKNOWN_NAME
+from modules.model_runtime import get_runtime
+from modules.shared_gallery import SharedGallery
 
-def recognize_from_image(image_path, known_face_encodings, known_face_names, user_info=None):
+BATCH_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Matcher của từng process con trong chế độ batch, được dựng một lần bởi _init_batch_worker
+_batch_matcher = None
+_batch_annotate_dir = None
+
+def recognize_from_image(image_path, known_face_encodings, known_face_names, user_info=None, matcher=None):
     """
     Nhận diện khuôn mặt từ file ảnh và hiển thị thông tin người dùng
     """
@@ -15,31 +29,29 @@ def recognize_from_image(image_path, known_face_encodings, known_face_names, use
     try:
         # Tải ảnh và tìm khuôn mặt
         print(f"Processing image: {image_path}")
-        img = face_recognition.load_image_file(image_path)
-        face_locations = face_recognition.face_locations(img)
+        img = get_runtime().load_image_file(image_path)
+        # Ảnh lớn được thu nhỏ trước khi phát hiện; vị trí được đổi về tọa độ ảnh gốc để vẽ
+        small_img, small_locations, scale = IMAGE_PROFILE.detect(img)
         
-        if len(face_locations) == 0:
+        if len(small_locations) == 0:
             print("No faces found in the image.")
             return
             
-        print(f"Found {len(face_locations)} face(s) in the image.")
-        face_encodings = face_recognition.face_encodings(img, face_locations)
+        print(f"Found {len(small_locations)} face(s) in the image.")
+        face_encodings = batch_face_encodings([(small_img, small_locations)])[0]
+        face_locations = scale_boxes(small_locations, scale, img.shape)
+        
+        # So khớp tất cả khuôn mặt trong ảnh với gallery trong một lần
+        if matcher is None:
+            matcher = GalleryMatcher(known_face_encodings, known_face_names)
+        matches = matcher.match(face_encodings)
         
         # Xử lý từng khuôn mặt trong ảnh
-        for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-            # So sánh với khuôn mặt đã biết
-            matches = face_recognition.compare_faces(known_face_encodings, face_encoding)
-            name = 'Unknown'
-            
-            # Tìm khuôn mặt gần giống nhất
-            if len(known_face_encodings) > 0:
-                face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-                best_match_index = np.argmin(face_distances)
-                if matches[best_match_index]:
-                    name = known_face_names[best_match_index]
+        for (top, right, bottom, left), match in zip(face_locations, matches):
+            name = match.name
             
             # Vẽ hộp quanh khuôn mặt
-            if name == 'Unknown':
+            if name == UNKNOWN_NAME:
                 color = (0, 0, 255)  # Đỏ cho unknown
                 text = name
             else:
@@ -75,4 +87,139 @@ def recognize_from_image(image_path, known_face_encodings, known_face_names, use
         cv2.destroyAllWindows()
         
     except Exception as e:
-        print(f"Error processing image: {e}")
\ No newline at end of file
+        print(f"Error processing image: {e}")
+
+def collect_image_paths(source):
+    """Danh sách ảnh (đã sắp xếp) trong thư mục source (kể cả thư mục con) hoặc theo mẫu glob"""
+    if os.path.isdir(source):
+        paths = [os.path.join(root, filename)
+                 for root, _, filenames in os.walk(source) for filename in filenames]
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(p for p in paths if p.lower().endswith(BATCH_IMAGE_EXTENSIONS))
+
+def _init_batch_worker(known_face_encodings, known_face_names, tolerance, annotate_dir, gallery_file=None):
+    """
+    Initializer của process con: dựng matcher một lần cho mọi ảnh mà process đó xử lý
+
+    Nếu có gallery_file, process con ánh xạ thế hệ hiện tại của gallery dùng chung; khi chưa có thế hệ
+    nào (hoặc không ánh xạ được) thì dùng known_face_encodings / known_face_names nhận qua pickle.
+    """
+    global _batch_matcher, _batch_annotate_dir
+    snapshot = SharedGallery(gallery_file).snapshot() if gallery_file is not None else None
+    if snapshot is not None:
+        _batch_matcher = GalleryMatcher(snapshot.encodings, tolerance=tolerance, registry=snapshot.registry())
+    else:
+        _batch_matcher = GalleryMatcher(known_face_encodings, known_face_names, tolerance=tolerance)
+    _batch_annotate_dir = annotate_dir
+    # Nạp model của process con ngay khi khởi tạo thay vì ở ảnh đầu tiên
+    get_runtime().load()
+
+def _annotated_path(image_path, root, annotate_dir):
+    """Đường dẫn ảnh đánh dấu trong annotate_dir, giữ cấu trúc thư mục con so với root"""
+    relative = os.path.relpath(image_path, root) if root else os.path.basename(image_path)
+    if relative.startswith('..'):
+        relative = os.path.basename(image_path)
+    return os.path.join(annotate_dir, relative)
+
+def _recognize_batch_image(task):
+    """
+    Nhận diện một ảnh trong process con (không mở cửa sổ)
+
+    Returns:
+        dict: {"path", "faces": [{"box": [top, right, bottom, left], "name", "distance"}], "annotated"?, "error"?}
+    """
+    image_path, root = task
+    record = {"path": image_path, "faces": []}
+    try:
+        img = get_runtime().load_image_file(image_path)
+        small_img, small_locations, scale = IMAGE_PROFILE.detect(img)
+        face_encodings = batch_face_encodings([(small_img, small_locations)])[0]
+        face_locations = scale_boxes(small_locations, scale, img.shape)
+        matches = _batch_matcher.match(face_encodings)
+
+        for location, match in zip(face_locations, matches):
+            record["faces"].append({
+                "box": [int(v) for v in location],
+                "name": match.name,
+                "distance": round(float(match.distance), 4) if np.isfinite(match.distance) else None
+            })
+
+        if _batch_annotate_dir is not None:
+            # Ảnh đánh dấu được ghi ra file thay vì hiển thị
+            image_bgr = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+            for (top, right, bottom, left), match in zip(face_locations, matches):
+                color = (0, 0, 255) if match.name == UNKNOWN_NAME else (0, 255, 0)
+                cv2.rectangle(image_bgr, (left, top), (right, bottom), color, 2)
+                cv2.putText(image_bgr, match.name, (left, top - 10), cv2.FONT_HERSHEY_DUPLEX, 1.0, color, 2)
+            annotated_path = _annotated_path(image_path, root, _batch_annotate_dir)
+            os.makedirs(os.path.dirname(annotated_path), exist_ok=True)
+            cv2.imwrite(annotated_path, image_bgr)
+            record["annotated"] = annotated_path
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+def recognize_batch(source, known_face_encodings, known_face_names, results_file=None, annotate_dir=None,
+                    workers=None, tolerance=DEFAULT_TOLERANCE, gallery_file=None):
+    """
+    Nhận diện hàng loạt ảnh trong thư mục hoặc theo mẫu glob bằng nhiều process, không mở cửa sổ nào
+
+    Mỗi ảnh được giải mã, phát hiện, mã hóa và so khớp trong process con; kết quả được ghi
+    theo thứ tự ảnh vào results_file (JSONL, mỗi dòng một ảnh: path, faces [box, name, distance]).
+
+    Args:
+        annotate_dir: Nếu có, lưu bản sao ảnh đã vẽ khung và tên vào thư mục này
+        workers: Số process (mặc định bằng số CPU)
+        gallery_file: Gallery dùng chung (xem shared_gallery) để process con ánh xạ thế hệ mới nhất;
+                      known_face_encodings / known_face_names được dùng khi chưa có thế hệ nào
+
+    Returns:
+        dict: Thống kê (số ảnh, số khuôn mặt, số khuôn mặt nhận ra, số lỗi, thời gian) hoặc None nếu không có ảnh
+    """
+    image_paths = collect_image_paths(source)
+    if not image_paths:
+        print(f"No images found in '{source}'.")
+        return None
+
+    if results_file is None:
+        results_file = os.path.join('reports', f"batch_recognition_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+    directory = os.path.dirname(results_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    root = source if os.path.isdir(source) else None
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(image_paths)))
+    chunksize = max(1, min(16, len(image_paths) // (workers * 4)))
+    # Gallery gửi qua pickle luôn có mặt để process con dùng khi không ánh xạ được gallery dùng chung
+    initargs = (np.asarray(known_face_encodings, dtype=np.float32), list(known_face_names), tolerance,
+                annotate_dir, gallery_file)
+
+    print(f"Recognizing {len(image_paths)} images with {workers} worker processes...")
+    stats = {"images": 0, "faces": 0, "known_faces": 0, "errors": 0}
+    start = time.perf_counter()
+    tasks = [(path, root) for path in image_paths]
+    # Không fork giữa lúc luồng warm-up đang nạp model
+    get_runtime().join()
+    with open(results_file, 'w', encoding='utf-8') as f, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker, initargs=initargs) as executor:
+        # executor.map trả kết quả theo đúng thứ tự ảnh
+        for record in executor.map(_recognize_batch_image, tasks, chunksize=chunksize):
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            stats["images"] += 1
+            stats["faces"] += len(record["faces"])
+            stats["known_faces"] += sum(face["name"] != UNKNOWN_NAME for face in record["faces"])
+            if "error" in record:
+                stats["errors"] += 1
+                print(f"Error processing {record['path']}: {record['error']}")
+            if stats["images"] % 100 == 0:
+                print(f"Processed {stats['images']}/{len(image_paths)} images...")
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["results_file"] = results_file
+    print(f"Done: {stats['images']} images, {stats['faces']} faces ({stats['known_faces']} known), "
+          f"{stats['errors']} errors in {stats['seconds']:.1f}s "
+          f"({stats['images'] / max(stats['seconds'], 1e-9):.1f} images/s). Results: {results_file}")
+    return stats
@@ -0,0 +1,93 @@
+"""
+Module so khớp khuôn mặt với gallery bằng phép toán ma trận theo lô
+"""
+from collections import namedtuple
+import numpy as np
+from modules.gallery_store import ENCODING_DIM, intern_labels
+from modules.gallery_index import BruteForceIndex, build_index
+
+# Ngưỡng mặc định giống face_recognition.compare_faces
+DEFAULT_TOLERANCE = 0.6
+UNKNOWN_NAME = "Unknown"
+
+# name: tên người (hoặc "Unknown"), distance: khoảng cách tới dòng gần nhất,
+# margin: khoảng cách tới người gần nhì trừ đi khoảng cách tốt nhất (càng lớn càng chắc chắn)
+MatchResult = namedtuple('MatchResult', ['name', 'distance', 'margin'])
+
+
+def _as_matrix(encodings):
+    """Chuyển danh sách/ma trận encoding thành ma trận float32 liền khối"""
+    return np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM))
+
+
+class GalleryMatcher:
+    """
+    So khớp tất cả khuôn mặt trong một frame với gallery theo lô
+
+    Gallery được xếp sẵn thành ma trận float32 cùng bình phương chuẩn của từng dòng, nên
+    khoảng cách Euclid được tính bằng ||q||^2 + ||g||^2 - 2 q.g cho cả lô cùng lúc.
+    Việc chọn ứng viên do một chỉ mục đảm nhận (xem modules.gallery_index): mặc định là
+    quét toàn bộ (chính xác), hoặc IVF cho gallery rất lớn.
+    """
+
+    def __init__(self, known_face_encodings, known_face_names=None, tolerance=DEFAULT_TOLERANCE, index=None,
+                 registry=None, **index_params):
+        """
+        Args:
+            known_face_encodings: Ma trận hoặc danh sách encoding của gallery
+            known_face_names: Tên tương ứng với từng dòng
+            tolerance: Ngưỡng khoảng cách để chấp nhận là cùng một người
+            index: None/'brute', 'ivf' hoặc một chỉ mục đã xây sẵn trên cùng gallery
+            registry: UserRegistry của gallery, dùng thay cho known_face_names (không phải gán nhãn lại)
+            index_params: Tham số khi xây chỉ mục theo tên (ví dụ n_probe, n_lists)
+        """
+        self.encodings = _as_matrix(known_face_encodings)
+        if registry is None:
+            self.labels, self.label_ids = intern_labels(known_face_names)
+        else:
+            self.labels, self.label_ids = registry.labels, registry.label_ids
+        self.sq_norms = np.einsum('ij,ij->i', self.encodings, self.encodings)
+        self.tolerance = tolerance
+
+        if index is None or index == 'brute':
+            index = BruteForceIndex(self.encodings, sq_norms=self.sq_norms)
+        elif isinstance(index, str):
+            index = build_index(index, self.encodings, sq_norms=self.sq_norms, **index_params)
+        self.index = index
+
+    def __len__(self):
+        return len(self.encodings)
+
+    def match(self, face_encodings):
+        """
+        So khớp một lô khuôn mặt với gallery
+
+        Args:
+            face_encodings: Danh sách (hoặc ma trận) encoding của các khuôn mặt trong frame
+
+        Returns:
+            list: MatchResult cho từng khuôn mặt, theo đúng thứ tự đầu vào
+        """
+        num_faces = len(face_encodings)
+        if num_faces == 0:
+            return []
+        if len(self.encodings) == 0:
+            return [MatchResult(UNKNOWN_NAME, float('inf'), 0.0) for _ in range(num_faces)]
+
+        results = []
+        for ids, distances in self.index.search(face_encodings):
+            if len(ids) == 0:
+                results.append(MatchResult(UNKNOWN_NAME, float('inf'), 0.0))
+                continue
+
+            best = int(np.argmin(distances))
+            best_distance = float(distances[best])
+            best_label = self.label_ids[ids[best]]
+
+            # Khoảng cách tới người khác gần nhất (bỏ qua các ứng viên cùng nhãn với kết quả tốt nhất)
+            other_distances = distances[self.label_ids[ids] != best_label]
+            margin = float(other_distances.min()) - best_distance if len(other_distances) else float('inf')
+
+            name = self.labels[best_label] if best_distance <= self.tolerance else UNKNOWN_NAME
+            results.append(MatchResult(name, best_distance, margin))
+        return results
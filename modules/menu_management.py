@@ -10,12 +10,14 @@ def display_main_menu():
     print("3. Reload face data")
     print("4. User management")
     print("5. Quản lý điểm danh")
-    print("6. Exit")
+    print("6. Recognize from video file / frame folder")
+    print("7. Batch recognize image folder")
+    print("8. Auto-tune detection resolution for a camera / video")
+    print("9. Exit")
 
 def handle_main_menu(encoder):
     """Xử lý menu chính của ứng dụng"""
-    from modules.webcam import recognize_from_webcam
-    from modules.image_processor import recognize_from_image
+    # Các module nhận diện (face_recognition, cv2) chỉ được import khi chọn chức năng tương ứng
     from modules.user_management import user_management_menu
     from modules.attendance_management import attendance_management
     
@@ -28,30 +30,35 @@ def handle_main_menu(encoder):
     
     while True:
         display_main_menu()
-        choice = input("Choose an option (1-6): ")
+        choice = input("Choose an option (1-9): ")
         
         if choice == '1':
             # Nhận diện từ webcam
+            from modules.webcam import recognize_from_webcam
             recognize_from_webcam(
                 known_face_encodings, 
                 known_face_names, 
                 encoder.get_all_users(), 
-                camera_id=1  # Sử dụng camera 1 mặc định
+                camera_id=1,  # Sử dụng camera 1 mặc định
+                matcher=encoder.get_live_matcher()
             )
         elif choice == '2':
             # Nhận diện từ file ảnh
             image_path = input("Enter image path: ")
+            from modules.image_processor import recognize_from_image
             recognize_from_image(
                 image_path, 
                 known_face_encodings, 
                 known_face_names, 
-                encoder.get_all_users()
+                encoder.get_all_users(),
+                matcher=encoder.get_matcher()
             )
         elif choice == '3':
             # Tải lại dữ liệu khuôn mặt
             print("Reloading face data...")
-            encoder.load_photos()
-            encoder.save_encodings()
+            # Chỉ ghi lại gallery khi đồng bộ có thay đổi
+            if encoder.sync_photos(parallel=True) and encoder.gallery_dirty:
+                encoder.save_encodings()
             known_face_encodings, known_face_names = encoder.get_encodings()
             print("Face data reloaded.")
         elif choice == '4':
@@ -64,6 +71,43 @@ def handle_main_menu(encoder):
             # Quản lý điểm danh
             attendance_management(encoder)
         elif choice == '6':
+            # Nhận diện từ file video hoặc thư mục ảnh frame
+            from modules.webcam import recognize_from_webcam
+            source = input("Enter video file, frame folder or glob pattern: ").strip()
+            headless = input("Headless mode, write results to JSONL? (y/n): ").strip().lower() == 'y'
+            results_file = None
+            if headless:
+                results_file = input("Results file (Enter for default in reports/): ").strip() or None
+            recognize_from_webcam(
+                known_face_encodings,
+                known_face_names,
+                encoder.get_all_users(),
+                matcher=encoder.get_live_matcher(),
+                source=source,
+                headless=headless,
+                results_file=results_file
+            )
+        elif choice == '7':
+            # Nhận diện hàng loạt ảnh, ghi kết quả ra file (không mở cửa sổ)
+            source = input("Enter image folder or glob pattern: ").strip()
+            results_file = input("Results file (Enter for default in reports/): ").strip() or None
+            annotate_dir = input("Folder for annotated copies (Enter to skip): ").strip() or None
+            from modules.image_processor import recognize_batch
+            recognize_batch(
+                source,
+                known_face_encodings,
+                known_face_names,
+                results_file=results_file,
+                annotate_dir=annotate_dir,
+                gallery_file=encoder.gallery_file if encoder.shared_gallery is not None else None
+            )
+        elif choice == '8':
+            # Tự chỉnh độ phân giải phát hiện cho một camera / video, lưu vào data/detection_profiles.json
+            source = input("Enter camera id, video file or frame folder (Enter for camera 1): ").strip() or '1'
+            model = input("Detector model, hog or cnn (Enter for hog): ").strip().lower() or 'hog'
+            from modules.detection import autotune_source
+            autotune_source(source, model=model)
+        elif choice == '9':
             # Thoát chương trình
             print("Exiting program...")
             return True
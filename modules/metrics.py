@@ -0,0 +1,340 @@
+"""
+Module đo thời gian từng bước của các vòng lặp nhận diện / điểm danh
+
+    with timer('detect'):
+        ...
+
+Mỗi bước có một Histogram (số lần, tổng thời gian, số lần theo từng ngưỡng thời gian và các
+mẫu gần nhất để tính trung vị / p95). Khi tắt (mặc định), timer() trả về một context manager
+rỗng dùng chung nên chi phí chỉ là một lần gọi hàm.
+
+Kết quả được đưa ra qua:
+    - dòng log định kỳ (MetricsReporter)
+    - overlay trên khung hình (overlay_lines)
+    - HTTP cục bộ: /metrics (định dạng text của Prometheus) và /metrics.json (MetricsServer)
+
+Bật bằng configure(enabled=True, log_every=30, http_port=9105) hoặc các biến môi trường
+FACE_METRICS=1, FACE_METRICS_LOG_EVERY, FACE_METRICS_PORT (configure_from_env).
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Ngưỡng thời gian (giây) của histogram, giống các bucket mặc định của Prometheus thu nhỏ về phía ms
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_SAMPLES = 256
+METRIC_PREFIX = "face_app"
+# Thứ tự các bước khi hiển thị (các bước khác được xếp sau theo tên)
+STAGE_ORDER = ('capture', 'motion_gate', 'resize', 'detect', 'encode', 'match', 'draw', 'display',
+               'attendance_save', 'attendance_compact', 'photos_decode', 'photos_load')
+
+
+class Histogram:
+    """Thống kê thời gian của một bước (an toàn khi gọi từ nhiều luồng)"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.recent.append(seconds)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+
+    def snapshot(self):
+        """Số lần, tổng (giây), số lần tích lũy theo ngưỡng và trung vị / p95 / max (ms) của các mẫu gần nhất"""
+        with self._lock:
+            recent = sorted(self.recent)
+            counts = list(self.bucket_counts)
+            count, total = self.count, self.total
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            cumulative.append((bound, running))
+        result = {"count": count, "sum_s": total, "buckets": cumulative,
+                  "mean_ms": total / count * 1000.0 if count else 0.0}
+        if recent:
+            result["p50_ms"] = recent[len(recent) // 2] * 1000.0
+            result["p95_ms"] = recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000.0
+            result["max_ms"] = recent[-1] * 1000.0
+        else:
+            result["p50_ms"] = result["p95_ms"] = result["max_ms"] = 0.0
+        return result
+
+
+class _Timer:
+    """Context manager ghi thời gian của khối lệnh vào một Histogram"""
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    """Context manager không làm gì (khi metrics bị tắt)"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """Tập các Histogram theo tên bước và các bộ đếm"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.time()
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def timer(self, name):
+        """Context manager đo thời gian của bước name (không làm gì khi metrics bị tắt)"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.histogram(name))
+
+    def observe(self, name, seconds):
+        if self.enabled:
+            self.histogram(name).observe(seconds)
+
+    def incr(self, name, amount=1):
+        if self.enabled:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+            self.started = time.time()
+
+    def snapshot(self):
+        """Trạng thái hiện tại dạng dict (dùng cho /metrics.json)"""
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+        order = {name: i for i, name in enumerate(STAGE_ORDER)}
+        names = sorted(histograms, key=lambda name: (order.get(name, len(order)), name))
+        return {
+            "enabled": self.enabled,
+            "uptime_s": time.time() - self.started,
+            "stages": {name: histograms[name].snapshot() for name in names},
+            "counters": counters,
+        }
+
+    def prometheus_text(self):
+        """Định dạng text của Prometheus: một histogram theo nhãn stage và các bộ đếm"""
+        snapshot = self.snapshot()
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [f"# HELP {name} Time spent in each recognition / attendance stage.",
+                 f"# TYPE {name} histogram"]
+        for stage, stats in snapshot["stages"].items():
+            for bound, count in stats["buckets"]:
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {stats["sum_s"]:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {stats["count"]}')
+        for counter, value in sorted(snapshot["counters"].items()):
+            metric = f"{METRIC_PREFIX}_{counter}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_uptime_seconds gauge")
+        lines.append(f"{METRIC_PREFIX}_uptime_seconds {snapshot['uptime_s']:.1f}")
+        return "\n".join(lines) + "\n"
+
+    def summary_text(self):
+        """Một dòng log: trung vị / p95 (ms) và số lần của từng bước"""
+        parts = []
+        for stage, stats in self.snapshot()["stages"].items():
+            parts.append(f"{stage} {stats['p50_ms']:.1f}/{stats['p95_ms']:.1f}ms x{stats['count']}")
+        return "Metrics (p50/p95): " + (", ".join(parts) if parts else "no samples")
+
+    def overlay_lines(self):
+        """Các dòng ngắn để vẽ lên khung hình: tên bước và trung vị (ms)"""
+        return [f"{stage}: {stats['p50_ms']:.1f} ms (p95 {stats['p95_ms']:.1f})"
+                for stage, stats in self.snapshot()["stages"].items()]
+
+
+class MetricsReporter:
+    """Luồng nền in dòng thống kê sau mỗi interval giây"""
+
+    def __init__(self, registry, interval=30.0):
+        self.registry = registry
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-reporter", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            print(self.registry.summary_text())
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+
+class MetricsServer:
+    """
+    HTTP server cục bộ cho các công cụ thu thập metrics
+
+    GET /metrics       -> định dạng text của Prometheus
+    GET /metrics.json  -> snapshot dạng JSON
+    """
+
+    def __init__(self, registry, port=9105, host='127.0.0.1'):
+        self.registry = registry
+        self.port = port
+        self.host = host
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Chạy server trên luồng nền; trả về False nếu không mở được cổng"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/metrics':
+                    body = registry.prometheus_text().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif path == '/metrics.json':
+                    body = json.dumps(registry.snapshot(), ensure_ascii=False).encode('utf-8')
+                    content_type = 'application/json; charset=utf-8'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Không in mỗi lần scraper gọi
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"Lỗi: Không thể mở cổng metrics {self.host}:{self.port}: {e}")
+            return False
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        print(f"Metrics: http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+_registry = MetricsRegistry()
+_reporter = None
+_server = None
+
+
+def get_metrics():
+    """MetricsRegistry dùng chung của tiến trình"""
+    return _registry
+
+
+def timer(name):
+    """Đo thời gian của bước name trong registry dùng chung (xem MetricsRegistry.timer)"""
+    if not _registry.enabled:
+        return _NULL_TIMER
+    return _Timer(_registry.histogram(name))
+
+
+def metrics_enabled():
+    return _registry.enabled
+
+
+def configure(enabled=True, log_every=None, http_port=None, http_host='127.0.0.1'):
+    """
+    Bật / tắt metrics cho cả tiến trình
+
+    Args:
+        log_every: In dòng thống kê sau mỗi chừng này giây (None để không in)
+        http_port: Cổng của MetricsServer (None để không mở; 0 để chọn cổng trống)
+    """
+    global _reporter, _server
+    _registry.enabled = enabled
+    if _reporter is not None:
+        _reporter.stop()
+        _reporter = None
+    if _server is not None:
+        _server.stop()
+        _server = None
+    if not enabled:
+        return _registry
+
+    if log_every:
+        _reporter = MetricsReporter(_registry, log_every).start()
+    if http_port is not None:
+        server = MetricsServer(_registry, http_port, http_host)
+        if server.start():
+            _server = server
+    return _registry
+
+
+def configure_from_env():
+    """Bật metrics theo biến môi trường FACE_METRICS, FACE_METRICS_LOG_EVERY, FACE_METRICS_PORT"""
+    if os.environ.get('FACE_METRICS', '').lower() not in ('1', 'true', 'yes', 'on'):
+        return _registry
+    try:
+        log_every = float(os.environ.get('FACE_METRICS_LOG_EVERY', '30'))
+        port = os.environ.get('FACE_METRICS_PORT')
+        http_port = int(port) if port else None
+    except ValueError as e:
+        print(f"Lỗi cấu hình metrics: {e}")
+        return _registry
+    return configure(True, log_every=log_every or None, http_port=http_port)
@@ -0,0 +1,168 @@
+"""
+Module quản lý model nhận diện (dlib) dùng chung cho cả ứng dụng
+
+Import face_recognition sẽ nạp bộ phát hiện HOG, shape predictor và model ResNet của dlib;
+lần gọi đầu tiên còn tốn thêm thời gian cấp phát. ModelRuntime thực hiện việc này trên một
+luồng nền ngay khi ứng dụng khởi động (warm-up), giữ các handle của dlib và báo trạng thái
+qua `ready` (threading.Event) để giao diện hiển thị.
+
+Mọi module nhận diện lấy runtime qua get_runtime() nên chỉ có một bộ model trong mỗi tiến trình.
+"""
+import threading
+import time
+import numpy as np
+
+WARMUP_IMAGE_SIZE = 160
+
+
+class ModelRuntime:
+    """Giữ các handle model dlib và cung cấp các hàm phát hiện / mã hóa khuôn mặt"""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.error = None
+        self.load_seconds = None
+        self.detector = None            # Bộ phát hiện HOG
+        self.cnn_detector = None        # Bộ phát hiện CNN (chậm hơn, chính xác hơn)
+        self.shape_predictor_5 = None   # Landmark 5 điểm (dùng khi mã hóa, model="small")
+        self.shape_predictor_68 = None  # Landmark 68 điểm
+        self.encoder = None             # Model ResNet tạo encoding 128 chiều
+        self._api = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Bắt đầu nạp model trên luồng nền (gọi nhiều lần cũng chỉ nạp một lần)"""
+        with self._lock:
+            if self._thread is None and not self.ready.is_set():
+                self._thread = threading.Thread(target=self.load, name="model-warmup", daemon=True)
+                self._thread.start()
+        return self
+
+    def load(self):
+        """Nạp model và chạy thử một lần; chặn cho đến khi xong (an toàn khi gọi từ nhiều luồng)"""
+        with self._lock:
+            if self.ready.is_set():
+                return self.error is None
+            start = time.perf_counter()
+            try:
+                # face_recognition nạp các model dlib khi import; dùng lại các handle đó để không nạp hai lần
+                from face_recognition import api
+
+                self._api = api
+                self.detector = api.face_detector
+                self.cnn_detector = api.cnn_face_detector
+                self.shape_predictor_5 = api.pose_predictor_5_point
+                self.shape_predictor_68 = api.pose_predictor_68_point
+                self.encoder = api.face_encoder
+
+                # Chạy thử bộ phát hiện và model mã hóa để lần gọi thật đầu tiên không phải chờ cấp phát
+                dummy = np.zeros((WARMUP_IMAGE_SIZE, WARMUP_IMAGE_SIZE, 3), dtype=np.uint8)
+                self.detector(dummy, 1)
+                box = (10, WARMUP_IMAGE_SIZE - 10, WARMUP_IMAGE_SIZE - 10, 10)
+                api.face_encodings(dummy, [box])
+            except Exception as e:
+                self.error = str(e)
+                print(f"Lỗi khi nạp model nhận diện: {e}")
+            self.load_seconds = time.perf_counter() - start
+            self.ready.set()
+            return self.error is None
+
+    def wait(self, timeout=None):
+        """Chờ model sẵn sàng; nếu chưa ai bắt đầu nạp thì nạp ngay trên luồng hiện tại"""
+        if not self.ready.is_set() and self._thread is None:
+            self.load()
+        self.ready.wait(timeout)
+        if self.error is not None:
+            raise RuntimeError(f"Face recognition models failed to load: {self.error}")
+        return self.ready.is_set()
+
+    def join(self):
+        """
+        Chờ luồng warm-up (nếu đang chạy) kết thúc, không tự nạp và không báo lỗi
+
+        Gọi trước khi tạo process con bằng fork: fork giữa lúc luồng nền đang import / nạp model
+        làm process con bị treo ở khóa mà luồng đó đang giữ. Sau khi nạp xong, process con
+        dùng lại model của process cha (copy-on-write) thay vì nạp lại.
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def is_ready(self):
+        return self.ready.is_set() and self.error is None
+
+    def status_text(self):
+        """Trạng thái ngắn gọn cho thanh trạng thái"""
+        if not self.ready.is_set():
+            return "🧠 Đang nạp model..."
+        if self.error is not None:
+            return "🧠 Lỗi nạp model"
+        return f"🧠 Model sẵn sàng ({self.load_seconds:.1f}s)"
+
+    # Các hàm dưới đây có cùng tham số và kết quả với các hàm tương ứng của face_recognition
+
+    def load_image_file(self, file, mode='RGB'):
+        self.wait()
+        return self._api.load_image_file(file, mode)
+
+    def face_locations(self, img, number_of_times_to_upsample=1, model="hog"):
+        self.wait()
+        return self._api.face_locations(img, number_of_times_to_upsample, model)
+
+    def face_encodings(self, face_image, known_face_locations=None, num_jitters=1, model="small"):
+        self.wait()
+        return self._api.face_encodings(face_image, known_face_locations, num_jitters, model)
+
+    def face_encodings_batch(self, images, face_locations, num_jitters=1, model="small"):
+        """
+        Mã hóa các khuôn mặt của nhiều ảnh bằng một lần gọi batch của dlib
+
+        Args:
+            images: Danh sách ảnh RGB
+            face_locations: Danh sách vị trí (top, right, bottom, left) tương ứng với từng ảnh
+
+        Returns:
+            list: Với mỗi ảnh, danh sách encoding theo thứ tự vị trí (rỗng nếu ảnh không có vị trí nào)
+        """
+        self.wait()
+        import dlib
+
+        predictor = self.shape_predictor_68 if model == "large" else self.shape_predictor_5
+        results = [[] for _ in images]
+        batch_indices, batch_images, batch_shapes = [], [], []
+        for i, (image, locations) in enumerate(zip(images, face_locations)):
+            if len(locations) == 0:
+                continue
+            # dlib cần mảng liền khối (frame BGR->RGB bằng [:, :, ::-1] thì không)
+            image = np.ascontiguousarray(image)
+            shapes = dlib.full_object_detections()
+            for top, right, bottom, left in locations:
+                shapes.append(predictor(image, dlib.rectangle(left, top, right, bottom)))
+            batch_indices.append(i)
+            batch_images.append(image)
+            batch_shapes.append(shapes)
+
+        if batch_images:
+            descriptors = self.encoder.compute_face_descriptor(batch_images, batch_shapes, num_jitters)
+            for i, image_descriptors in zip(batch_indices, descriptors):
+                results[i] = [np.array(descriptor) for descriptor in image_descriptors]
+        return results
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime():
+    """ModelRuntime dùng chung của tiến trình hiện tại (chưa nạp model cho đến khi start/wait)"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = ModelRuntime()
+        return _runtime
+
+
+def start_warmup():
+    """Bắt đầu nạp model trên luồng nền, trả về runtime dùng chung"""
+    return get_runtime().start()
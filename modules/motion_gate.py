@@ -0,0 +1,170 @@
+"""
+Module lọc frame tĩnh trước bước phát hiện khuôn mặt
+
+MotionGate so sánh một ảnh thu nhỏ xám (vài chục pixel) của mỗi frame với nền (trung bình trượt
+của các frame trước). Khi không có thay đổi, frame bị bỏ qua và không chạy phát hiện khuôn mặt;
+khi có thay đổi, gate trả về các vùng thay đổi (theo tọa độ frame gốc) để chỉ tìm khuôn mặt trong
+các vùng đó. Việc kiểm tra chỉ tốn một lần thu nhỏ và vài phép toán trên mảng rất nhỏ, nên khi
+khung cảnh đứng yên CPU gần như không phải làm gì.
+"""
+import threading
+import numpy as np
+
+
+def merge_regions(regions):
+    """Gộp các vùng (top, right, bottom, left) chồng lên nhau thành một vùng bao"""
+    regions = [list(region) for region in regions]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[3] < b[1] and b[3] < a[1] and a[0] < b[2] and b[0] < a[2]:
+                    regions[i] = [min(a[0], b[0]), max(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(region) for region in regions]
+
+
+class MotionGate:
+    """
+    Quyết định frame nào cần chạy phát hiện khuôn mặt và tìm ở vùng nào
+
+    Args:
+        thumb_width: Chiều rộng ảnh thu nhỏ dùng để so sánh
+        threshold: Chênh lệch độ sáng (0-255) để một pixel được coi là thay đổi
+        min_changed: Tỉ lệ pixel thay đổi tối thiểu để coi là có chuyển động
+        background_alpha: Tốc độ cập nhật nền (vật đứng yên được hòa vào nền sau khoảng 1/alpha frame)
+        hold_frames: Số frame tiếp tục xử lý sau khi hết chuyển động (để có kết quả của cảnh đã ổn định)
+        refresh_every: Cứ sau chừng này frame bị bỏ qua thì xử lý lại một frame đầy đủ (0 để tắt)
+        padding: Nới rộng mỗi vùng thay đổi theo tỉ lệ kích thước của nó (khuôn mặt nằm trên thân người)
+        max_regions: Số vùng tối đa; nhiều hơn thì gộp thành một vùng bao
+        full_frame_ratio: Nếu tổng diện tích các vùng vượt tỉ lệ này thì tìm trên cả frame
+    """
+
+    def __init__(self, thumb_width=64, threshold=18, min_changed=0.003, background_alpha=0.05, hold_frames=10,
+                 refresh_every=300, padding=0.3, max_regions=3, full_frame_ratio=0.5):
+        self.thumb_width = thumb_width
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.background_alpha = background_alpha
+        self.hold_frames = hold_frames
+        self.refresh_every = refresh_every
+        self.padding = padding
+        self.max_regions = max_regions
+        self.full_frame_ratio = full_frame_ratio
+
+        self._background = None
+        self._hold = 0
+        self._since_processed = 0
+        self._last_regions = None
+        self._lock = threading.Lock()
+
+        self.checked_frames = 0
+        self.gated_frames = 0
+        self.region_frames = 0
+        self.full_frames = 0
+
+    def _thumbnail(self, frame):
+        import cv2
+        height, width = frame.shape[:2]
+        thumb_height = max(1, int(round(height * self.thumb_width / float(width))))
+        small = cv2.resize(frame, (self.thumb_width, thumb_height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.float32)
+
+    def _changed_regions(self, mask, frame_shape):
+        """Các vùng thay đổi (tọa độ frame gốc) từ mặt nạ trên ảnh thu nhỏ"""
+        import cv2
+        mask = cv2.dilate(mask.astype(np.uint8), np.ones((3, 3), np.uint8))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        # Bỏ nhãn 0 (nền), giữ các vùng lớn nhất
+        components = sorted(stats[1:count], key=lambda s: s[cv2.CC_STAT_AREA], reverse=True)
+        if not components:
+            return None
+
+        height, width = frame_shape[:2]
+        factor_y = height / float(mask.shape[0])
+        factor_x = width / float(mask.shape[1])
+        regions = []
+        for x, y, w, h, _ in components:
+            pad_x, pad_y = w * self.padding, h * self.padding
+            regions.append((
+                max(0, int((y - pad_y) * factor_y)),
+                min(width, int((x + w + pad_x) * factor_x)),
+                min(height, int((y + h + pad_y) * factor_y)),
+                max(0, int((x - pad_x) * factor_x)),
+            ))
+        regions = merge_regions(regions)
+        if len(regions) > self.max_regions:
+            regions = [(min(r[0] for r in regions), max(r[1] for r in regions),
+                        max(r[2] for r in regions), min(r[3] for r in regions))]
+
+        area = sum((r[1] - r[3]) * (r[2] - r[0]) for r in regions)
+        if area >= self.full_frame_ratio * width * height:
+            return None
+        return regions
+
+    def check(self, frame):
+        """
+        Kiểm tra một frame BGR
+
+        Returns:
+            tuple: (có cần phát hiện không, danh sách vùng cần tìm hoặc None để tìm trên cả frame)
+        """
+        thumbnail = self._thumbnail(frame)
+        with self._lock:
+            self.checked_frames += 1
+            if self._background is None or self._background.shape != thumbnail.shape:
+                # Frame đầu tiên: chưa có nền, tìm trên cả frame
+                self._background = thumbnail
+                self._hold = self.hold_frames
+                self._since_processed = 0
+                self.full_frames += 1
+                return True, None
+
+            changed = np.abs(thumbnail - self._background) > self.threshold
+            self._background += self.background_alpha * (thumbnail - self._background)
+
+            if changed.mean() >= self.min_changed:
+                self._hold = self.hold_frames
+                self._last_regions = self._changed_regions(changed, frame.shape)
+                regions = self._last_regions
+            elif self._hold > 0:
+                # Vừa hết chuyển động: tiếp tục xử lý vài frame ở vùng thay đổi gần nhất
+                self._hold -= 1
+                regions = self._last_regions
+            elif self.refresh_every and self._since_processed >= self.refresh_every:
+                regions = None
+            else:
+                self._since_processed += 1
+                self.gated_frames += 1
+                return False, None
+
+            self._since_processed = 0
+            if regions is None:
+                self.full_frames += 1
+            else:
+                self.region_frames += 1
+            return True, regions
+
+    def stats(self):
+        with self._lock:
+            checked = self.checked_frames
+            return {
+                "checked_frames": checked,
+                "gated_frames": self.gated_frames,
+                "region_frames": self.region_frames,
+                "full_frames": self.full_frames,
+                "gated_ratio": self.gated_frames / float(checked) if checked else 0.0,
+            }
+
+    def stats_text(self):
+        stats = self.stats()
+        return (f"Gated {stats['gated_frames']}/{stats['checked_frames']} ({stats['gated_ratio']:.0%}), "
+                f"regions {stats['region_frames']}, full {stats['full_frames']}")
@@ -0,0 +1,302 @@
+"""
+Module pipeline nhiều luồng cho các vòng lặp webcam
+
+    capture (luồng riêng) -> hàng đợi có giới hạn -> inference (1 hoặc nhiều luồng) -> render (luồng gọi)
+
+- Luồng capture đọc camera liên tục và chỉ giữ frame mới nhất; khi inference không theo
+  kịp, frame cũ trong hàng đợi bị bỏ thay vì xếp hàng chờ.
+- Các luồng inference chạy hàm xử lý (phát hiện + mã hóa + so khớp) trên frame lấy từ hàng đợi.
+- Render (vòng lặp hiển thị của luồng gọi) lấy frame mới nhất cùng kết quả inference mới nhất.
+
+Với nguồn không trực tiếp (file video, chuỗi ảnh) có thể tắt việc bỏ frame (drop_frames=False):
+capture khi đó chờ inference thay vì bỏ frame, và iter_results() trả về kết quả của mọi frame
+theo đúng thứ tự (chế độ headless).
+
+Có thể gắn một MotionGate (gate) vào luồng capture: frame không có thay đổi được bỏ qua ngay tại
+capture (không đưa sang inference), frame có thay đổi được xử lý kèm các vùng thay đổi.
+"""
+import threading
+import queue
+import time
+from collections import deque
+
+from modules.metrics import timer
+
+# Đánh dấu frame bị MotionGate bỏ qua trong hàng đợi kết quả (iter_results không trả về frame này)
+_GATED = object()
+
+
+class RateMeter:
+    """Đếm số sự kiện mỗi giây trên một cửa sổ thời gian trượt"""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self.times = deque()
+
+    def tick(self, now=None):
+        now = time.perf_counter() if now is None else now
+        self.times.append(now)
+        while self.times and now - self.times[0] > self.window:
+            self.times.popleft()
+
+    def rate(self):
+        if len(self.times) < 2:
+            return 0.0
+        elapsed = self.times[-1] - self.times[0]
+        return (len(self.times) - 1) / elapsed if elapsed > 0 else 0.0
+
+
+class FramePipeline:
+    """
+    Pipeline capture / inference / render nối với nhau bằng hàng đợi có giới hạn
+
+    Args:
+        video_capture: Đối tượng có hàm read() -> (ret, frame), ví dụ cv2.VideoCapture
+        process_frame: Hàm inference nhận frame, trả về kết quả bất kỳ (chạy trên luồng worker)
+        num_workers: Số luồng inference
+        max_pending: Số frame tối đa chờ inference; frame cũ hơn bị bỏ khi hàng đợi đầy
+        drop_frames: False để capture chờ inference thay vì bỏ frame (nguồn không trực tiếp)
+        collect_results: True để giữ kết quả của mọi frame cho iter_results() (thay cho read())
+        gate: MotionGate tùy chọn; khi có, process_frame được gọi là process_frame(frame, regions)
+              với các vùng thay đổi (hoặc process_frame(frame) khi cần tìm trên cả frame)
+    """
+
+    def __init__(self, video_capture, process_frame, num_workers=1, max_pending=1, drop_frames=True,
+                 collect_results=False, gate=None):
+        self.video_capture = video_capture
+        self.process_frame = process_frame
+        self.gate = gate
+        self.num_workers = max(1, num_workers)
+        self.drop_frames = drop_frames
+        self._frames = queue.Queue(maxsize=max(1, max_pending))
+        # Kết quả theo từng frame cho iter_results(); có giới hạn để inference không chạy quá xa
+        self._results = queue.Queue(maxsize=max(1, max_pending) + self.num_workers) if collect_results else None
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._threads = []
+
+        # Trạng thái dùng chung, được bảo vệ bởi self._condition
+        self._latest_frame = None
+        self._latest_frame_id = 0
+        self._rendered_frame_id = 0
+        self._result = None
+        self._result_frame_id = 0
+        self._result_capture_time = None
+        self._rendered_result_frame_id = 0
+        self._capture_done = False
+        self._active_workers = 0
+
+        self.capture_meter = RateMeter()
+        self.inference_meter = RateMeter()
+        self.latency_ms = 0.0
+        self.captured_frames = 0
+        self.dropped_frames = 0
+        self.processed_frames = 0
+        self.gated_frames = 0
+
+    def start(self):
+        """Khởi động luồng capture và các luồng inference"""
+        self._active_workers = self.num_workers
+        self._threads = [threading.Thread(target=self._capture_loop, name="capture", daemon=True)]
+        for i in range(self.num_workers):
+            self._threads.append(threading.Thread(target=self._inference_loop, name=f"inference-{i}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """Dừng các luồng (không giải phóng camera, việc đó do nơi gọi đảm nhận)"""
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+
+    def _capture_loop(self):
+        """Luồng capture: đọc frame liên tục, chỉ giữ frame mới nhất cho inference"""
+        frame_id = 0
+        while not self._stop_event.is_set():
+            with timer('capture'):
+                ret, frame = self.video_capture.read()
+            if not ret:
+                break
+
+            now = time.perf_counter()
+            frame_id += 1
+            self.capture_meter.tick(now)
+            self.captured_frames += 1
+
+            with self._condition:
+                self._latest_frame = frame
+                self._latest_frame_id = frame_id
+                self._condition.notify_all()
+
+            regions = None
+            if self.gate is not None:
+                with timer('motion_gate'):
+                    active, regions = self.gate.check(frame)
+                if not active:
+                    # Khung cảnh không đổi: không chạy inference, kết quả cũ vẫn được hiển thị
+                    self.gated_frames += 1
+                    if self._results is not None:
+                        self._put(self._results, (frame_id, _GATED))
+                    continue
+
+            if self.drop_frames:
+                self._offer((frame_id, now, frame, regions))
+            else:
+                self._put(self._frames, (frame_id, now, frame, regions))
+
+        with self._condition:
+            self._capture_done = True
+            self._condition.notify_all()
+
+    def _offer(self, item):
+        """Đưa frame vào hàng đợi inference, bỏ frame cũ nhất nếu hàng đợi đầy"""
+        while True:
+            try:
+                self._frames.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._frames.get_nowait()
+                    self.dropped_frames += 1
+                except queue.Empty:
+                    pass
+
+    def _put(self, target, value):
+        """Đưa phần tử vào hàng đợi, chờ khi hàng đợi đầy (dừng chờ nếu pipeline bị dừng)"""
+        while not self._stop_event.is_set():
+            try:
+                target.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _inference_loop(self):
+        """Luồng inference: xử lý frame từ hàng đợi và công bố kết quả mới nhất"""
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    frame_id, capture_time, frame, regions = self._frames.get(timeout=0.1)
+                except queue.Empty:
+                    if self._capture_done:
+                        break
+                    continue
+
+                try:
+                    if regions is None:
+                        result = self.process_frame(frame)
+                    else:
+                        result = self.process_frame(frame, regions)
+                except Exception as e:
+                    print(f"Lỗi khi xử lý frame: {e}")
+                    result = None
+                    if self._results is None:
+                        continue
+
+                if self._results is not None:
+                    self._put(self._results, (frame_id, result))
+
+                with self._condition:
+                    self.inference_meter.tick()
+                    self.processed_frames += 1
+                    # Với nhiều worker, kết quả có thể về không theo thứ tự; chỉ giữ kết quả mới hơn
+                    if frame_id > self._result_frame_id:
+                        self._result = result
+                        self._result_frame_id = frame_id
+                        self._result_capture_time = capture_time
+                    self._condition.notify_all()
+        finally:
+            with self._condition:
+                self._active_workers -= 1
+                self._condition.notify_all()
+
+    def _finished(self):
+        return self._capture_done and self._active_workers == 0
+
+    def read(self):
+        """
+        Render stage: chờ frame mới và trả về (frame, kết quả mới nhất, kết quả có mới không)
+
+        Frame trả về là bản sao nên có thể vẽ lên mà không ảnh hưởng tới inference.
+        Trả về None khi nguồn đã hết (hoặc pipeline đã dừng) và không còn gì để hiển thị.
+        """
+        with self._condition:
+            while True:
+                has_new_frame = self._latest_frame_id > self._rendered_frame_id
+                has_new_result = self._result_frame_id > self._rendered_result_frame_id
+                if has_new_frame or (has_new_result and self._capture_done):
+                    break
+                if self._stop_event.is_set() or self._finished():
+                    return None
+                self._condition.wait(timeout=0.5)
+
+            self._rendered_frame_id = self._latest_frame_id
+            result_is_new = self._result_frame_id > self._rendered_result_frame_id
+            if result_is_new:
+                self._rendered_result_frame_id = self._result_frame_id
+                latency_ms = (time.perf_counter() - self._result_capture_time) * 1000.0
+                # Làm mượt độ trễ bằng trung bình trượt mũ
+                self.latency_ms = latency_ms if self.latency_ms == 0.0 else 0.8 * self.latency_ms + 0.2 * latency_ms
+
+            return self._latest_frame.copy(), self._result, result_is_new
+
+    def iter_results(self):
+        """
+        Trả về lần lượt (frame_id, kết quả) của mọi frame theo thứ tự frame (cần collect_results=True)
+
+        Với nhiều worker, kết quả về sớm được giữ lại cho đến khi các frame trước đó xong.
+        Kết quả là None nếu frame đó bị lỗi khi xử lý; frame bị MotionGate bỏ qua không được trả về.
+        """
+        if self._results is None:
+            raise RuntimeError("FramePipeline was created without collect_results=True")
+
+        pending = {}
+        next_id = 1
+        while True:
+            while next_id in pending:
+                result = pending.pop(next_id)
+                if result is not _GATED:
+                    yield next_id, result
+                next_id += 1
+            try:
+                frame_id, result = self._results.get(timeout=0.1)
+            except queue.Empty:
+                with self._condition:
+                    finished = self._finished()
+                if (finished and self._results.empty()) or self._stop_event.is_set():
+                    # Trả nốt các kết quả còn giữ lại (nếu có frame lỗi ở giữa)
+                    for frame_id in sorted(pending):
+                        if pending[frame_id] is not _GATED:
+                            yield frame_id, pending[frame_id]
+                    return
+                continue
+            if self.drop_frames:
+                # Có frame bị bỏ nên không thể chờ đủ thứ tự; trả kết quả ngay khi có
+                if result is not _GATED:
+                    yield frame_id, result
+            else:
+                pending[frame_id] = result
+
+    def stats(self):
+        """Trả về FPS của capture, FPS của inference, độ trễ end-to-end (ms), số frame bị bỏ và bị gate bỏ qua"""
+        return {
+            "capture_fps": self.capture_meter.rate(),
+            "inference_fps": self.inference_meter.rate(),
+            "latency_ms": self.latency_ms,
+            "captured_frames": self.captured_frames,
+            "processed_frames": self.processed_frames,
+            "dropped_frames": self.dropped_frames,
+            "gated_frames": self.gated_frames
+        }
+
+    def stats_text(self):
+        """Chuỗi thống kê ngắn để vẽ lên khung hình"""
+        stats = self.stats()
+        text = (f"Capture {stats['capture_fps']:.0f} FPS | Inference {stats['inference_fps']:.1f} FPS | "
+                f"Latency {stats['latency_ms']:.0f} ms")
+        if self.gate is not None and stats['captured_frames']:
+            text += f" | Gated {stats['gated_frames'] / float(stats['captured_frames']):.0%}"
+        return text
@@ -0,0 +1,282 @@
+"""
+Module nén gallery theo từng người dùng bằng các prototype (trung bình hoặc k-medoids)
+
+Thay vì so khớp với mọi ảnh đã đăng ký, PrototypeMatcher so khớp trước với vài prototype
+của mỗi người; chỉ khi kết quả không rõ ràng mới quay lại các dòng đầy đủ của những người
+ứng viên gần nhất.
+
+Các dòng đầy đủ không bị sao chép: khi gallery được ánh xạ từ file (np.memmap, xem
+modules.gallery_store) chúng chỉ được đọc từ đĩa ở nhánh tinh chỉnh, nên phần nằm thường trực
+trong RAM chỉ là prototype và chỉ mục dòng theo người. Với gallery vừa mã hóa trong RAM (chưa
+lưu) thì các dòng vẫn nằm trong FaceEncoder, lúc đó chỉ chi phí so khớp giảm chứ bộ nhớ thì không.
+"""
+import numpy as np
+from modules.gallery_store import UserRegistry, intern_labels
+from modules.matcher import GalleryMatcher, MatchResult, DEFAULT_TOLERANCE, UNKNOWN_NAME, _as_matrix
+
+PROTOTYPE_MODES = ('mean', 'medoids')
+
+
+def _row_reference(encodings):
+    """Giữ nguyên gallery đã ánh xạ (np.memmap) để các trang chỉ được đọc khi cần tinh chỉnh"""
+    if isinstance(encodings, np.memmap) and encodings.dtype == np.float32 and encodings.ndim == 2:
+        return encodings
+    return _as_matrix(encodings)
+
+
+def _medoids(vectors, k, n_iter=10):
+    """Chọn k medoid trong các vector của một người (khởi tạo farthest-point, lặp Voronoi)"""
+    if len(vectors) <= k:
+        return vectors.copy()
+
+    distances = np.sqrt(np.maximum(
+        np.einsum('ij,ij->i', vectors, vectors)[:, None]
+        + np.einsum('ij,ij->i', vectors, vectors)[None, :]
+        - 2.0 * (vectors @ vectors.T), 0.0))
+
+    # Medoid đầu tiên là điểm có tổng khoảng cách nhỏ nhất, các medoid sau là điểm xa nhất
+    medoids = [int(np.argmin(distances.sum(axis=1)))]
+    while len(medoids) < k:
+        medoids.append(int(np.argmax(distances[:, medoids].min(axis=1))))
+    medoids = np.array(medoids)
+
+    for _ in range(n_iter):
+        assignments = np.argmin(distances[:, medoids], axis=1)
+        new_medoids = medoids.copy()
+        for cluster in range(k):
+            members = np.flatnonzero(assignments == cluster)
+            if len(members) > 0:
+                within = distances[np.ix_(members, members)].sum(axis=1)
+                new_medoids[cluster] = members[np.argmin(within)]
+        if np.array_equal(new_medoids, medoids):
+            break
+        medoids = new_medoids
+
+    return vectors[medoids]
+
+
+def build_prototypes(encodings, names=None, mode='mean', per_user=3, registry=None):
+    """
+    Tạo prototype cho từng người dùng
+
+    Args:
+        encodings: Ma trận encoding N x 128 của gallery đầy đủ
+        names: Tên tương ứng với từng dòng
+        mode: 'mean' (1 vector trung bình mỗi người) hoặc 'medoids' (tối đa per_user ảnh đại diện)
+        per_user: Số medoid tối đa mỗi người
+        registry: UserRegistry của gallery, dùng thay cho names
+
+    Returns:
+        tuple: (ma trận prototype, danh sách tên tương ứng); prototype của cùng một người nằm liền nhau
+    """
+    if mode not in PROTOTYPE_MODES:
+        raise ValueError(f"Unknown prototype mode: {mode}")
+
+    encodings = _as_matrix(encodings)
+    if registry is None:
+        labels, label_ids = intern_labels(names)
+    else:
+        labels, label_ids = registry.labels, registry.label_ids
+
+    # Các dòng của từng người bằng một lần sắp xếp ổn định (không quét cả gallery cho mỗi người)
+    order = np.argsort(label_ids, kind='stable')
+    counts = np.bincount(label_ids, minlength=len(labels))
+    rows_by_label = np.split(order, np.cumsum(counts)[:-1]) if len(labels) else []
+
+    prototypes = []
+    prototype_names = []
+    for name, rows in zip(labels, rows_by_label):
+        vectors = encodings[rows]
+        if mode == 'mean':
+            selected = vectors.mean(axis=0, keepdims=True)
+        else:
+            selected = _medoids(vectors, per_user)
+        prototypes.append(selected)
+        prototype_names.extend([name] * len(selected))
+
+    if not prototypes:
+        return _as_matrix([]), []
+    return _as_matrix(np.concatenate(prototypes)), prototype_names
+
+
+class PrototypeMatcher:
+    """
+    So khớp hai tầng: prototype trước, dòng đầy đủ khi kết quả không rõ ràng
+
+    Một kết quả được coi là không rõ ràng khi margin giữa người gần nhất và người gần nhì
+    nhỏ hơn ambiguity_margin, hoặc khi khoảng cách nằm gần ngưỡng tolerance. Khi đó chỉ
+    các dòng đầy đủ của refine_labels người gần nhất được so khớp lại.
+
+    self.encodings chỉ là tham chiếu tới gallery (không sao chép); memory_usage cho biết phần
+    nằm thường trực so với kích thước gallery đầy đủ.
+    """
+
+    def __init__(self, known_face_encodings, known_face_names=None, mode='mean', per_user=3,
+                 tolerance=DEFAULT_TOLERANCE, ambiguity_margin=0.05, tolerance_band=0.08, refine_labels=3,
+                 registry=None):
+        self.encodings = _row_reference(known_face_encodings)
+        if registry is None:
+            registry = UserRegistry.from_names(known_face_names)
+        self.labels, self.label_ids = registry.labels, registry.label_ids
+        self.tolerance = tolerance
+        self.ambiguity_margin = ambiguity_margin
+        self.tolerance_band = tolerance_band
+        self.refine_labels = refine_labels
+
+        prototypes, prototype_names = build_prototypes(self.encodings, mode=mode, per_user=per_user,
+                                                       registry=registry)
+        self.prototype_matcher = GalleryMatcher(prototypes, prototype_names, tolerance=tolerance)
+        # Ánh xạ nhãn của prototype sang nhãn của gallery đầy đủ
+        label_index = {name: i for i, name in enumerate(self.labels)}
+        self.prototype_label_ids = np.array([label_index[name] for name in self.prototype_matcher.labels],
+                                            dtype=np.int32)[self.prototype_matcher.label_ids]
+
+        # Các dòng đầy đủ của từng người, dạng CSR, để lấy lại khi cần tinh chỉnh
+        self.label_rows = np.argsort(self.label_ids, kind='stable')
+        counts = np.bincount(self.label_ids, minlength=len(self.labels))
+        self.label_offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.refined = 0
+        self.matched = 0
+
+    def __len__(self):
+        return len(self.encodings)
+
+    @property
+    def num_prototypes(self):
+        return len(self.prototype_matcher)
+
+    def memory_usage(self):
+        """
+        Số byte của các dòng đầy đủ và của phần thường trực (prototype, chỉ mục dòng theo người)
+
+        Returns:
+            dict: {"full_bytes", "resident_bytes", "mapped": True nếu các dòng đầy đủ được ánh xạ từ file}
+        """
+        resident = (self.prototype_matcher.encodings.nbytes + self.prototype_matcher.sq_norms.nbytes
+                    + self.prototype_label_ids.nbytes + self.label_ids.nbytes
+                    + self.label_rows.nbytes + self.label_offsets.nbytes)
+        return {"full_bytes": int(self.encodings.nbytes), "resident_bytes": int(resident),
+                "mapped": isinstance(self.encodings, np.memmap)}
+
+    def _is_ambiguous(self, result):
+        return (result.margin < self.ambiguity_margin
+                or abs(result.distance - self.tolerance) < self.tolerance_band)
+
+    def match(self, face_encodings):
+        """So khớp một lô khuôn mặt, trả về MatchResult cho từng khuôn mặt"""
+        num_faces = len(face_encodings)
+        if num_faces == 0:
+            return []
+        if len(self.encodings) == 0:
+            return [MatchResult(UNKNOWN_NAME, float('inf'), 0.0) for _ in range(num_faces)]
+
+        queries = _as_matrix(face_encodings)
+        candidates = self.prototype_matcher.index.search(queries)
+        results = []
+        for query, (ids, distances) in zip(queries, candidates):
+            self.matched += 1
+            prototype_labels = self.prototype_label_ids[ids]
+
+            # Khoảng cách nhỏ nhất tới từng người
+            label_distances = np.full(len(self.labels), np.inf)
+            np.minimum.at(label_distances, prototype_labels, distances)
+            order = np.argsort(label_distances)
+
+            best_label = order[0]
+            best_distance = float(label_distances[best_label])
+            margin = float(label_distances[order[1]]) - best_distance if len(order) > 1 else float('inf')
+            result = MatchResult(self.labels[best_label] if best_distance <= self.tolerance else UNKNOWN_NAME,
+                                 best_distance, margin)
+
+            if self._is_ambiguous(result):
+                self.refined += 1
+                result = self._refine(query, order[:self.refine_labels])
+            results.append(result)
+        return results
+
+    def _refine(self, query, candidate_labels):
+        """So khớp lại với các dòng đầy đủ của những người ứng viên"""
+        rows = np.concatenate([self.label_rows[self.label_offsets[label]:self.label_offsets[label + 1]]
+                               for label in candidate_labels])
+        vectors = self.encodings[rows]
+        distances = np.sqrt(np.maximum(np.einsum('ij,ij->i', vectors, vectors)
+                                       + query @ query - 2.0 * (vectors @ query), 0.0))
+
+        best = int(np.argmin(distances))
+        best_distance = float(distances[best])
+        best_label = self.label_ids[rows[best]]
+        other_distances = distances[self.label_ids[rows] != best_label]
+        margin = float(other_distances.min()) - best_distance if len(other_distances) else float('inf')
+        name = self.labels[best_label] if best_distance <= self.tolerance else UNKNOWN_NAME
+        return MatchResult(name, best_distance, margin)
+
+
+def evaluate_prototypes(encodings, names, mode='mean', per_user=3, tolerance=DEFAULT_TOLERANCE):
+    """
+    So sánh độ chính xác leave-one-out giữa so khớp đầy đủ và so khớp bằng prototype
+
+    Mỗi ảnh lần lượt bị bỏ khỏi gallery rồi được nhận diện lại. Ảnh của người chỉ có một ảnh
+    được bỏ qua vì không còn gì để so khớp.
+
+    Returns:
+        dict: độ chính xác của hai cách, số ảnh đã đánh giá, số dòng/prototype, tỉ lệ tinh chỉnh
+              và số byte của gallery đầy đủ / phần thường trực của PrototypeMatcher
+    """
+    gallery_matcher = PrototypeMatcher(encodings, names, mode=mode, per_user=per_user)
+    encodings = _as_matrix(encodings)
+    names = list(names)
+    full_correct = 0
+    prototype_correct = 0
+    evaluated = 0
+    refined = 0
+
+    for i, name in enumerate(names):
+        rest_names = names[:i] + names[i + 1:]
+        if name not in rest_names:
+            continue
+        rest_encodings = np.delete(encodings, i, axis=0)
+        query = encodings[i:i + 1]
+
+        full = GalleryMatcher(rest_encodings, rest_names, tolerance=tolerance).match(query)[0]
+        prototype_matcher = PrototypeMatcher(rest_encodings, rest_names, mode=mode, per_user=per_user,
+                                             tolerance=tolerance)
+        prototype = prototype_matcher.match(query)[0]
+
+        evaluated += 1
+        full_correct += full.name == name
+        prototype_correct += prototype.name == name
+        refined += prototype_matcher.refined
+
+    return {
+        "mode": mode,
+        "per_user": per_user if mode == 'medoids' else 1,
+        "evaluated": evaluated,
+        "full_accuracy": full_correct / evaluated if evaluated else 0.0,
+        "prototype_accuracy": prototype_correct / evaluated if evaluated else 0.0,
+        "refine_rate": refined / evaluated if evaluated else 0.0,
+        "rows": len(names),
+        "prototypes": gallery_matcher.num_prototypes,
+        **gallery_matcher.memory_usage()
+    }
+
+
+if __name__ == '__main__':
+    # Báo cáo chênh lệch độ chính xác trên bộ ảnh trong thư mục photo/
+    from modules.face_loader import FaceEncoder
+
+    encoder = FaceEncoder()
+    if not encoder.load_encodings():
+        encoder.sync_photos(parallel=True)
+    encodings, names = encoder.get_encodings()
+
+    print("\n===== PROTOTYPE ACCURACY REPORT =====")
+    for mode, per_user in (('mean', 1), ('medoids', 1), ('medoids', 3)):
+        report = evaluate_prototypes(encodings, names, mode=mode, per_user=per_user)
+        delta = report["prototype_accuracy"] - report["full_accuracy"]
+        print(f"{mode:<8} k={report['per_user']}: full={report['full_accuracy']:.3f} "
+              f"prototype={report['prototype_accuracy']:.3f} delta={delta:+.3f} "
+              f"rows={report['rows']} prototypes={report['prototypes']} "
+              f"refined={report['refine_rate']:.1%} (n={report['evaluated']})")
+        print(f"{'':<8}      memory: full rows={report['full_bytes'] / 1024.0:.1f} KiB "
+              f"({'memory-mapped, read on refine' if report['mapped'] else 'in RAM'}) "
+              f"resident={report['resident_bytes'] / 1024.0:.1f} KiB")
@@ -0,0 +1,467 @@
+"""
+Module dịch vụ nhận diện qua HTTP cục bộ (asyncio, chỉ dùng thư viện chuẩn)
+
+Gallery (FaceEncoder) và model được nạp một lần cho cả tiến trình. Các ứng dụng khác gọi qua HTTP:
+
+    POST   /recognize[?mark=checkin|checkout]    thân là file ảnh (JPEG/PNG) -> khuôn mặt và tên
+    POST   /users/<tên>[?age=..&address=..]      thân là file ảnh -> thêm ảnh / người dùng
+    DELETE /users/<tên>                          xóa người dùng
+    GET    /users                                danh sách người dùng
+    GET    /attendance[?date=YYYY-MM-DD]         điểm danh của một ngày (mặc định hôm nay)
+    GET    /attendance?start=..&end=..           điểm danh của một khoảng ngày
+    GET    /health                               trạng thái model, gallery, hàng đợi và batch
+
+Các request nhận diện đến gần nhau (trong batch_window_ms) được gom thành một batch: một lần phát
+hiện cho từng ảnh, một lần gọi batch_face_encodings và một lần so khớp cho tất cả khuôn mặt.
+Batch chạy trên một nhóm luồng có giới hạn (num_workers); khi các luồng đều bận, request tiếp tục
+dồn vào batch kế tiếp, và khi hàng đợi đầy thì trả về 503.
+
+Chạy:
+    python -m modules.recognition_service --port 8765
+"""
+import asyncio
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+from modules.detection import IMAGE_PROFILE, scale_boxes
+from modules.face_loader import batch_face_encodings
+from modules.matcher import UNKNOWN_NAME
+from modules.metrics import get_metrics, timer
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 20 * 1024 * 1024
+CONTENT_TYPE_EXTENSIONS = {'image/jpeg': '.jpg', 'image/jpg': '.jpg', 'image/png': '.png', 'image/bmp': '.bmp'}
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class HttpError(Exception):
+    """Lỗi trả về cho client với mã HTTP tương ứng"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def check_user_name(user_name):
+    """
+    Kiểm tra tên người dùng lấy từ URL trước khi dùng làm tên thư mục trong photo/
+
+    Tên đã được giải mã %XX nên có thể chứa '/', '..' ...; các tên đó bị từ chối với mã 400.
+    """
+    if not user_name or user_name in ('.', '..'):
+        raise HttpError(400, "Invalid user name")
+    separators = {'/', '\\', os.sep} | ({os.altsep} if os.altsep else set())
+    if any(char in separators or ord(char) < 32 or ord(char) == 127 for char in user_name):
+        raise HttpError(400, "Invalid user name")
+    return user_name
+
+
+def decode_image(data):
+    """Giải mã file ảnh (bytes) thành ảnh BGR; trả về None nếu không đọc được"""
+    import cv2
+    if not data:
+        return None
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+class RecognitionService:
+    """
+    Gom các request nhận diện thành batch và thực hiện các thao tác trên gallery / điểm danh
+
+    Args:
+        encoder: FaceEncoder đã nạp gallery
+        attendance_system: AttendanceSystem cho /attendance và ?mark= (None để tắt)
+        num_workers: Số batch chạy đồng thời (số luồng của nhóm luồng)
+        max_batch: Số ảnh tối đa trong một batch
+        batch_window_ms: Thời gian chờ thêm request sau request đầu tiên của một batch
+        max_queue: Số request nhận diện tối đa đang chờ; vượt quá thì trả về 503
+    """
+
+    def __init__(self, encoder, attendance_system=None, num_workers=2, max_batch=16, batch_window_ms=5.0,
+                 max_queue=256):
+        self.encoder = encoder
+        self.attendance_system = attendance_system
+        self.num_workers = max(1, num_workers)
+        self.max_batch = max(1, max_batch)
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="recognition")
+        # Thêm / xóa người dùng được tuần tự hóa; nhận diện đọc matcher mà luồng nền của LiveMatcher
+        # dựng lại khi gallery đổi, nên các luồng của nhóm luồng không phải dựng matcher
+        self._gallery_lock = threading.RLock()
+        self.matcher = encoder.get_live_matcher()
+        self._queue = None
+        self._slots = None
+        self._batcher = None
+        self._server = None
+
+        self.requests = 0
+        self.batches = 0
+        self.batched_images = 0
+        self.rejected = 0
+
+    # ==================== NHẬN DIỆN THEO BATCH ====================
+
+    def recognize_images(self, images):
+        """
+        Nhận diện khuôn mặt trên nhiều ảnh BGR bằng một lần mã hóa và một lần so khớp
+
+        Returns:
+            list: Với mỗi ảnh, danh sách {"name", "distance", "box"} hoặc None nếu ảnh không đọc được
+        """
+        items = []
+        boxes = []
+        for image in images:
+            if image is None:
+                items.append(None)
+                boxes.append([])
+                continue
+            small_image, face_locations, scale = IMAGE_PROFILE.detect(image, bgr=True)
+            items.append((small_image, face_locations))
+            boxes.append(scale_boxes(face_locations, scale, image.shape))
+
+        encoded = batch_face_encodings([item for item in items if item is not None])
+        face_encodings = [encoding for encodings in encoded for encoding in encodings]
+        matcher = self.matcher.current()
+        if face_encodings and len(matcher) > 0:
+            with timer('match'):
+                matches = matcher.match(face_encodings)
+        else:
+            matches = [None] * len(face_encodings)
+
+        results = []
+        position = 0
+        for item, image_boxes in zip(items, boxes):
+            if item is None:
+                results.append(None)
+                continue
+            faces = []
+            for box in image_boxes:
+                match = matches[position]
+                position += 1
+                faces.append({
+                    "name": match.name if match is not None else UNKNOWN_NAME,
+                    "distance": float(match.distance) if match is not None else None,
+                    "box": [int(v) for v in box],
+                })
+            results.append(faces)
+        return results
+
+    def _run_batch(self, payloads):
+        """Chạy trên nhóm luồng: giải mã ảnh và nhận diện cả batch"""
+        with timer('service_batch'):
+            images = [decode_image(payload) for payload in payloads]
+            return self.recognize_images(images)
+
+    async def recognize(self, payload):
+        """Đưa một ảnh (bytes) vào hàng đợi và chờ kết quả của batch chứa nó"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            self._queue.put_nowait((payload, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise HttpError(503, "Recognition queue is full")
+        self.requests += 1
+        get_metrics().incr('service_requests')
+        return await future
+
+    async def _batch_loop(self):
+        """Gom request trong hàng đợi thành batch và gửi sang nhóm luồng (tối đa num_workers batch cùng lúc)"""
+        loop = asyncio.get_running_loop()
+        while True:
+            # Chờ có luồng rảnh trước khi gom: khi các luồng đều bận, request dồn lại thành batch lớn hơn
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            loop.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self._run_batch, [payload for payload, _ in batch])
+            self.batches += 1
+            self.batched_images += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    # ==================== GALLERY VÀ ĐIỂM DANH ====================
+
+    def enroll(self, user_name, data, content_type=None, age=None, address=None):
+        """Thêm ảnh cho người dùng (tạo mới nếu chưa có) qua FaceEncoder.add_user_from_image"""
+        extension = CONTENT_TYPE_EXTENSIONS.get((content_type or '').split(';')[0].strip().lower(), '.jpg')
+        temp_dir = tempfile.mkdtemp(prefix="enroll_")
+        try:
+            image_path = os.path.join(temp_dir, f"upload{extension}")
+            with open(image_path, 'wb') as f:
+                f.write(data)
+            with self._gallery_lock:
+                added = self.encoder.add_user_from_image(image_path, user_name, age, address)
+                # Batch tiếp theo nhận ra người dùng mới ngay, không chờ lượt làm mới của luồng nền
+                self.matcher.refresh()
+                return added
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def delete(self, user_name):
+        with self._gallery_lock:
+            deleted = self.encoder.delete_user(user_name)
+            self.matcher.refresh()
+            return deleted
+
+    def users(self):
+        with self._gallery_lock:
+            return sorted(self.encoder.get_unique_users())
+
+    def mark(self, faces, action):
+        """Ghi check-in / checkout cho các khuôn mặt đã nhận diện; trả về {tên: đã ghi chưa}"""
+        recorded = {}
+        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        for face in faces:
+            name = face["name"]
+            if name == UNKNOWN_NAME or name in recorded:
+                continue
+            if action == 'checkout':
+                recorded[name] = self.attendance_system.checkout(name, timestamp, source="http")
+            else:
+                recorded[name] = self.attendance_system.mark_attendance(name, timestamp, source="http")
+        return recorded
+
+    def health(self):
+        runtime = self.encoder.runtime
+        return {
+            "model_ready": runtime.is_ready(),
+            "gallery_size": len(self.encoder.known_face_names),
+            "users": len(self.encoder.get_unique_users()),
+            "queue": self._queue.qsize() if self._queue is not None else 0,
+            "workers": self.num_workers,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "batched_images": self.batched_images,
+            "mean_batch_size": self.batched_images / float(self.batches) if self.batches else 0.0,
+        }
+
+    # ==================== HTTP ====================
+
+    async def handle(self, method, path, query, headers, body):
+        """Xử lý một request; trả về (mã HTTP, dữ liệu JSON)"""
+        loop = asyncio.get_running_loop()
+        parts = [unquote(part) for part in path.strip('/').split('/') if part]
+
+        if parts == ['recognize']:
+            if method != 'POST':
+                raise HttpError(405, "Use POST with an image body")
+            action = query.get('mark')
+            if action is not None and action not in ('checkin', 'checkout'):
+                raise HttpError(400, "mark must be 'checkin' or 'checkout'")
+            if action is not None and self.attendance_system is None:
+                raise HttpError(400, "Attendance is not enabled on this service")
+            start = time.perf_counter()
+            faces = await self.recognize(body)
+            if faces is None:
+                raise HttpError(400, "Could not decode image")
+            result = {"faces": faces, "elapsed_ms": (time.perf_counter() - start) * 1000.0}
+            if action is not None:
+                result["recorded"] = await loop.run_in_executor(self.executor, self.mark, faces, action)
+            return 200, result
+
+        if parts == ['users'] and method == 'GET':
+            return 200, {"users": await loop.run_in_executor(self.executor, self.users)}
+
+        if len(parts) == 2 and parts[0] == 'users':
+            user_name = check_user_name(parts[1])
+            if method == 'POST':
+                if not body:
+                    raise HttpError(400, "Missing image body")
+                added = await loop.run_in_executor(self.executor, self.enroll, user_name, body,
+                                                   headers.get('content-type'), query.get('age'),
+                                                   query.get('address'))
+                if not added:
+                    raise HttpError(400, "No face found in image")
+                return 200, {"user": user_name, "added": True}
+            if method == 'DELETE':
+                if not await loop.run_in_executor(self.executor, self.delete, user_name):
+                    raise HttpError(404, f"User '{user_name}' not found")
+                return 200, {"user": user_name, "deleted": True}
+            raise HttpError(405, "Use POST or DELETE")
+
+        if parts == ['attendance'] and method == 'GET':
+            if self.attendance_system is None:
+                raise HttpError(404, "Attendance is not enabled on this service")
+            if 'start' in query or 'end' in query:
+                start_date = query.get('start') or query.get('end')
+                end_date = query.get('end') or start_date
+                data = await loop.run_in_executor(self.executor, self.attendance_system.get_range_attendance,
+                                                  start_date, end_date)
+                return 200, {"start": start_date, "end": end_date, "attendance": data}
+            date = query.get('date') or datetime.date.today().isoformat()
+            data = await loop.run_in_executor(self.executor, self.attendance_system.get_date_attendance, date)
+            return 200, {"date": date, "attendance": data}
+
+        if parts == ['health'] and method == 'GET':
+            return 200, self.health()
+
+        raise HttpError(404, f"Unknown endpoint: {method} {path}")
+
+    async def _handle_connection(self, reader, writer):
+        """Đọc các request HTTP/1.1 trên một kết nối (hỗ trợ keep-alive) và ghi phản hồi JSON"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._write_response(writer, 400, {"error": "Malformed request line"}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                try:
+                    length = int(headers.get('content-length') or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self._write_response(writer, 400, {"error": "Invalid Content-Length"}, False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._write_response(writer, 413, {"error": "Request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                url = urlsplit(target)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                try:
+                    status, payload = await self.handle(method.upper(), url.path, query, headers, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": e.message}
+                except Exception as e:
+                    print(f"Lỗi khi xử lý request {method} {target}: {e}")
+                    status, payload = 500, {"error": str(e)}
+                await self._write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _write_response(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Mở cổng và khởi động bộ gom batch (trong event loop hiện tại)"""
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._slots = asyncio.Semaphore(self.num_workers)
+        self._batcher = asyncio.get_running_loop().create_task(self._batch_loop())
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+        self.executor.shutdown(wait=True)
+        self.matcher.close()
+
+    async def serve_forever(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        port = await self.start(host, port)
+        print(f"Recognition service: http://{host}:{port} ({self.num_workers} workers, "
+              f"batch <= {self.max_batch}, window {self.batch_window * 1000:.0f} ms)")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+
+def run_service(encoder, attendance_system=None, host=DEFAULT_HOST, port=DEFAULT_PORT, **options):
+    """Chạy dịch vụ cho đến khi nhấn Ctrl+C"""
+    service = RecognitionService(encoder, attendance_system, **options)
+    try:
+        asyncio.run(service.serve_forever(host, port))
+    except KeyboardInterrupt:
+        print("Đã dừng dịch vụ nhận diện")
+    if attendance_system is not None:
+        attendance_system.compact()
+
+
+if __name__ == '__main__':
+    import argparse
+    from modules.attendance import AttendanceSystem
+    from modules.face_loader import FaceEncoder
+    from modules.metrics import configure_from_env
+
+    parser = argparse.ArgumentParser(description="Local HTTP face recognition service")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=2, help="concurrent recognition batches")
+    parser.add_argument('--max-batch', type=int, default=16)
+    parser.add_argument('--batch-window-ms', type=float, default=5.0)
+    parser.add_argument('--max-queue', type=int, default=256)
+    parser.add_argument('--no-attendance', action='store_true', help="disable /attendance and ?mark=")
+    parser.add_argument('--attendance-backend', choices=('json', 'sqlite'),
+                        help="attendance store (default: ATTENDANCE_BACKEND or json)")
+    args = parser.parse_args()
+
+    configure_from_env()
+    encoder = FaceEncoder()
+    if not encoder.load_encodings():
+        if encoder.sync_photos(parallel=True):
+            encoder.save_encodings()
+        else:
+            print("Error: Could not load face data.")
+            raise SystemExit(1)
+    attendance_system = None if args.no_attendance else AttendanceSystem(backend=args.attendance_backend)
+    run_service(encoder, attendance_system, args.host, args.port, num_workers=args.workers,
+                max_batch=args.max_batch, batch_window_ms=args.batch_window_ms, max_queue=args.max_queue)
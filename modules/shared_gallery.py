@@ -0,0 +1,295 @@
+"""
+Module chia sẻ gallery giữa nhiều process theo thế hệ (generation)
+
+Mỗi lần gallery thay đổi (thêm / xóa người dùng, đồng bộ ảnh), process ghi một file gallery mới
+cho thế hệ kế tiếp rồi cập nhật file con trỏ:
+
+    data/face_gallery.bin.current      {"generation": 7, "file": "face_gallery.g000007.bin", ...}
+    data/face_gallery.g000006.bin      thế hệ cũ (giữ lại vài thế hệ cho reader đang dùng)
+    data/face_gallery.g000007.bin      thế hệ hiện tại
+
+- File của một thế hệ không bao giờ bị ghi đè, nên reader ánh xạ nó bằng np.memmap (không sao chép,
+  các process dùng chung trang vật lý) mà không cần khóa trong lúc so khớp. Điều này cũng tránh lỗi
+  của Windows khi os.replace lên một file đang được memory-map.
+- Reader chỉ cần os.stat file con trỏ để biết có thế hệ mới; khi có, snapshot mới được ánh xạ và
+  thay tham chiếu (một phép gán), các lượt so khớp đang chạy vẫn dùng snapshot cũ cho tới khi xong.
+- Ghi thế hệ mới được tuần tự hóa giữa các process bằng một file khóa. Thêm / xóa người dùng đi qua
+  SharedGallery.update: thế hệ hiện tại được đọc lại, sửa và ghi thành thế hệ mới trong cùng một lần
+  giữ khóa, nên hai process cùng thêm / xóa không làm mất thay đổi của nhau.
+"""
+import json
+import os
+import threading
+import time
+import weakref
+
+from modules.gallery_store import UserRegistry, expand_labels, read_gallery, replace_file, write_gallery
+
+POINTER_SUFFIX = '.current'
+LOCK_SUFFIX = '.lock'
+KEEP_GENERATIONS = 3
+LOCK_TIMEOUT = 10.0
+STALE_LOCK_SECONDS = 60.0
+
+
+def pointer_path(gallery_file):
+    """File con trỏ tới thế hệ hiện tại của gallery_file"""
+    return gallery_file + POINTER_SUFFIX
+
+
+def generation_path(gallery_file, generation):
+    """File của một thế hệ, ví dụ data/face_gallery.g000007.bin"""
+    base, ext = os.path.splitext(gallery_file)
+    return f"{base}.g{generation:06d}{ext}"
+
+
+def read_pointer(gallery_file):
+    """Đọc file con trỏ; trả về dict hoặc None nếu chưa có thế hệ nào"""
+    path = pointer_path(gallery_file)
+    for _ in range(5):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (PermissionError, ValueError):
+            # Windows: file đang được thay thế; thử lại sau một chút
+            time.sleep(0.01)
+    return None
+
+
+class _PublishLock:
+    """Khóa liên process bằng file tạo độc quyền (O_EXCL); khóa bỏ dở quá STALE_LOCK_SECONDS bị xóa"""
+
+    def __init__(self, path, timeout=LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode('ascii'))
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > STALE_LOCK_SECONDS:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for lock {self.path}")
+                time.sleep(0.01)
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        return False
+
+
+class GallerySnapshot:
+    """Một thế hệ gallery đã được ánh xạ (chỉ đọc)"""
+
+    __slots__ = ('generation', 'path', 'encodings', 'label_ids', 'labels')
+
+    def __init__(self, generation, path, encodings, label_ids, labels):
+        self.generation = generation
+        self.path = path
+        self.encodings = encodings
+        self.label_ids = label_ids
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.encodings)
+
+    def names(self):
+        return expand_labels(self.label_ids, self.labels)
+
+    def registry(self):
+        return UserRegistry(self.labels, self.label_ids)
+
+
+class SharedGallery:
+    """
+    Ghi và đọc các thế hệ gallery của gallery_file
+
+    Args:
+        gallery_file: File gallery gốc (các thế hệ và file con trỏ nằm cạnh file này)
+        keep_generations: Số thế hệ được giữ lại cho các reader chưa kịp chuyển sang thế hệ mới
+    """
+
+    def __init__(self, gallery_file, keep_generations=KEEP_GENERATIONS):
+        self.gallery_file = gallery_file
+        self.keep_generations = max(1, keep_generations)
+        self._snapshot = None
+        self._pointer_stat = None
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(pointer_path(self.gallery_file))
+
+    def update(self, change):
+        """
+        Sửa gallery trên thế hệ mới nhất khi giữ khóa ghi liên process
+
+        change(current) nhận thế hệ hiện tại (GallerySnapshot, None nếu chưa có thế hệ nào) và trả về
+        (encodings, UserRegistry) của thế hệ mới, hoặc None nếu không cần ghi gì. Thế hệ hiện tại được
+        đọc sau khi đã lấy khóa, nên thay đổi mà process khác vừa công bố không bị ghi đè.
+
+        Returns:
+            GallerySnapshot: Thế hệ mới nhất sau khi ghi, hoặc None nếu change không thay đổi gì
+        """
+        with _PublishLock(self.gallery_file + LOCK_SUFFIX):
+            pointer = read_pointer(self.gallery_file)
+            current = self._load(pointer) if pointer else None
+            result = change(current)
+            if result is None:
+                return None
+            encodings, registry = result
+
+            generation = (pointer["generation"] if pointer else 0) + 1
+            path = generation_path(self.gallery_file, generation)
+            # File của thế hệ mới chưa tồn tại nên không có reader nào đang ánh xạ nó
+            write_gallery(path, encodings, registry=registry)
+
+            tmp_path = pointer_path(self.gallery_file) + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"generation": generation, "file": os.path.basename(path), "count": len(registry),
+                           "pid": os.getpid(), "published": time.time()}, f)
+            replace_file(tmp_path, pointer_path(self.gallery_file))
+            self._remove_old_generations(generation)
+        return self.snapshot()
+
+    def publish(self, encodings, names):
+        """
+        Ghi cả gallery encodings / names thành thế hệ mới (thay toàn bộ, ví dụ sau khi đồng bộ thư mục ảnh)
+
+        Returns:
+            int: Số thế hệ vừa ghi
+        """
+        registry = UserRegistry.from_names(names)
+        return self.update(lambda current: (encodings, registry)).generation
+
+    def _remove_old_generations(self, generation):
+        """Xóa các thế hệ cũ; trên Windows file còn được ánh xạ không xóa được và sẽ được xóa ở lần sau"""
+        directory = os.path.dirname(self.gallery_file) or '.'
+        base, ext = os.path.splitext(os.path.basename(self.gallery_file))
+        prefix = base + '.g'
+        for filename in os.listdir(directory):
+            if not (filename.startswith(prefix) and filename.endswith(ext)):
+                continue
+            number = filename[len(prefix):len(filename) - len(ext)]
+            if number.isdigit() and int(number) <= generation - self.keep_generations:
+                try:
+                    os.remove(os.path.join(directory, filename))
+                except OSError:
+                    pass
+
+    def _load(self, pointer):
+        """Ánh xạ thế hệ mà pointer trỏ tới (dùng lại snapshot đang giữ nếu cùng thế hệ)"""
+        current = self._snapshot
+        if current is not None and current.generation == pointer["generation"]:
+            return current
+        path = os.path.join(os.path.dirname(self.gallery_file), pointer["file"])
+        encodings, label_ids, labels = read_gallery(path)
+        return GallerySnapshot(pointer["generation"], path, encodings, label_ids, labels)
+
+    def _pointer_changed(self):
+        """So sánh os.stat của file con trỏ với lần đọc trước (không mở file)"""
+        try:
+            stat = os.stat(pointer_path(self.gallery_file))
+        except OSError:
+            return False, None
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        return signature != self._pointer_stat, signature
+
+    def poll(self):
+        """
+        Ánh xạ thế hệ mới nếu con trỏ đã thay đổi
+
+        Returns:
+            GallerySnapshot: Snapshot mới, hoặc None nếu không có gì thay đổi
+        """
+        changed, signature = self._pointer_changed()
+        if not changed:
+            return None
+        with self._lock:
+            pointer = read_pointer(self.gallery_file)
+            if pointer is None:
+                return None
+            current = self._snapshot
+            if current is not None and pointer["generation"] <= current.generation:
+                self._pointer_stat = signature
+                return None
+            try:
+                self._snapshot = self._load(pointer)
+            except (OSError, ValueError) as e:
+                # Thế hệ vừa bị thay bởi thế hệ mới hơn và đã bị xóa; lần poll sau sẽ đọc lại con trỏ
+                print(f"Error mapping gallery generation {pointer['generation']}: {e}")
+                return None
+            self._pointer_stat = signature
+            return self._snapshot
+
+    def snapshot(self):
+        """Thế hệ mới nhất (ánh xạ nếu cần); None nếu chưa có thế hệ nào"""
+        self.poll()
+        return self._snapshot
+
+    def generation(self):
+        snapshot = self._snapshot
+        return snapshot.generation if snapshot is not None else 0
+
+
+def _refresh_live_matcher(ref, stop_event, check_every):
+    """Luồng nền của LiveMatcher; chỉ giữ weakref nên tự dừng khi LiveMatcher không còn được dùng"""
+    while not stop_event.wait(check_every):
+        live_matcher = ref()
+        if live_matcher is None:
+            return
+        try:
+            live_matcher.refresh()
+        except Exception as e:
+            print(f"Error refreshing gallery: {e}")
+        del live_matcher
+
+
+class LiveMatcher:
+    """
+    Matcher cho các vòng lặp chạy lâu: một luồng nền lấy lại matcher từ source sau mỗi check_every giây
+
+    source là đối tượng có get_matcher() (ví dụ FaceEncoder) và tự chuyển sang thế hệ gallery mới,
+    nên người dùng được thêm / xóa ở process khác được nhận ra mà không phải khởi động lại vòng lặp.
+    Việc ánh xạ thế hệ mới và dựng matcher chạy trên luồng nền; luồng nhận diện chỉ đọc một tham chiếu
+    và mỗi lượt so khớp dùng matcher lấy được ở đầu lượt, không giữ khóa trong lúc so khớp.
+    """
+
+    def __init__(self, source, check_every=1.0):
+        self.source = source
+        self.check_every = check_every
+        self._matcher = source.get_matcher()
+        self._stop_event = threading.Event()
+        threading.Thread(target=_refresh_live_matcher, args=(weakref.ref(self), self._stop_event, check_every),
+                         name="live-matcher", daemon=True).start()
+
+    def refresh(self):
+        """Lấy ngay matcher mới nhất (ví dụ sau khi chính process này thêm / xóa người dùng)"""
+        self._matcher = self.source.get_matcher()
+        return self._matcher
+
+    def current(self):
+        return self._matcher
+
+    def close(self):
+        """Dừng luồng nền"""
+        self._stop_event.set()
+
+    def __len__(self):
+        return len(self.current())
+
+    def match(self, face_encodings):
+        return self.current().match(face_encodings)
@@ -0,0 +1,153 @@
+"""
+Module theo dõi khuôn mặt giữa các frame để không phải mã hóa lại cùng một khuôn mặt mỗi frame
+
+Mỗi khuôn mặt phát hiện được gắn với một track bằng IoU (hoặc khoảng cách tâm khi IoU
+thấp) trên các hộp của frame đã thu nhỏ. Track giữ nguyên danh tính và chỉ cần mã hóa lại khi:
+    - track mới xuất hiện,
+    - đã qua reencode_every frame kể từ lần mã hóa trước (unknown_reencode_every với "Unknown"),
+    - độ tin cậy (giảm dần theo từng frame) xuống dưới min_confidence.
+Track không được gán trong quá max_missed frame liên tiếp sẽ bị xóa.
+"""
+from modules.matcher import DEFAULT_TOLERANCE, UNKNOWN_NAME
+
+
+def box_iou(a, b):
+    """IoU giữa hai hộp dạng (top, right, bottom, left)"""
+    top = max(a[0], b[0])
+    right = min(a[1], b[1])
+    bottom = min(a[2], b[2])
+    left = max(a[3], b[3])
+    if right <= left or bottom <= top:
+        return 0.0
+    intersection = (right - left) * (bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    return intersection / float(area_a + area_b - intersection)
+
+
+def _centroid_distance(a, b):
+    """Khoảng cách giữa tâm hai hộp, chia cho kích thước trung bình của hai hộp"""
+    ay, ax = (a[0] + a[2]) / 2.0, (a[1] + a[3]) / 2.0
+    by, bx = (b[0] + b[2]) / 2.0, (b[1] + b[3]) / 2.0
+    size = ((a[1] - a[3]) + (a[2] - a[0]) + (b[1] - b[3]) + (b[2] - b[0])) / 4.0
+    return ((ay - by) ** 2 + (ax - bx) ** 2) ** 0.5 / max(size, 1.0)
+
+
+class Track:
+    """Một khuôn mặt đang được theo dõi"""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.name = UNKNOWN_NAME
+        self.distance = float('inf')
+        self.confidence = 0.0
+        self.frames_since_encode = 0
+        self.missed = 0
+        self.encoded = False
+
+
+class FaceTracker:
+    """Gán khuôn mặt giữa các frame và quyết định khuôn mặt nào cần mã hóa lại"""
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.5, reencode_every=15, unknown_reencode_every=2,
+                 max_missed=5, confidence_decay=0.97, min_confidence=0.5, tolerance=DEFAULT_TOLERANCE):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.reencode_every = reencode_every
+        self.unknown_reencode_every = unknown_reencode_every
+        self.max_missed = max_missed
+        self.confidence_decay = confidence_decay
+        self.min_confidence = min_confidence
+        self.tolerance = tolerance
+        self.tracks = []
+        self._next_id = 1
+        self.encoded_faces = 0
+        self.reused_faces = 0
+
+    def update(self, face_locations):
+        """
+        Gán các khuôn mặt phát hiện được trong frame vào track
+
+        Returns:
+            tuple: (track tương ứng với từng vị trí, danh sách chỉ số vị trí cần mã hóa lại)
+        """
+        # Ghép cặp tham lam theo IoU giảm dần, sau đó theo khoảng cách tâm cho các cặp còn lại
+        pairs = []
+        for ti, track in enumerate(self.tracks):
+            for di, box in enumerate(face_locations):
+                iou = box_iou(track.box, box)
+                if iou >= self.iou_threshold:
+                    pairs.append((0, -iou, ti, di))
+                else:
+                    distance = _centroid_distance(track.box, box)
+                    if distance <= self.max_centroid_distance:
+                        pairs.append((1, distance, ti, di))
+        pairs.sort()
+
+        assigned = [None] * len(face_locations)
+        used_tracks = set()
+        for _, _, ti, di in pairs:
+            if ti in used_tracks or assigned[di] is not None:
+                continue
+            used_tracks.add(ti)
+            assigned[di] = self.tracks[ti]
+
+        # Track không được gán: tăng số frame bị mất, xóa nếu mất quá lâu
+        kept = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in used_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    continue
+            kept.append(track)
+        self.tracks = kept
+
+        needs_encoding = []
+        for di, box in enumerate(face_locations):
+            track = assigned[di]
+            if track is None:
+                track = Track(self._next_id, box)
+                self._next_id += 1
+                self.tracks.append(track)
+                assigned[di] = track
+            else:
+                track.box = box
+                track.missed = 0
+                track.frames_since_encode += 1
+                track.confidence *= self.confidence_decay
+
+            if self._needs_encoding(track):
+                needs_encoding.append(di)
+            else:
+                self.reused_faces += 1
+
+        return assigned, needs_encoding
+
+    def _needs_encoding(self, track):
+        if not track.encoded:
+            return True
+        if track.name == UNKNOWN_NAME:
+            return track.frames_since_encode >= self.unknown_reencode_every
+        return track.confidence < self.min_confidence or track.frames_since_encode >= self.reencode_every
+
+    def set_identity(self, track, name, distance):
+        """Cập nhật danh tính của track sau khi mã hóa và so khớp lại"""
+        track.name = name
+        track.distance = distance
+        track.encoded = True
+        track.frames_since_encode = 0
+        # Độ tin cậy ban đầu theo khoảng cách: 1 khi trùng khít, 0.5 ở ngưỡng tolerance,
+        # nên các kết quả sát ngưỡng sẽ được kiểm tra lại sớm hơn
+        track.confidence = max(0.0, 1.0 - 0.5 * distance / self.tolerance) if name != UNKNOWN_NAME else 0.0
+        self.encoded_faces += 1
+
+    def stats(self):
+        """Số khuôn mặt đã mã hóa và số lần dùng lại danh tính của track"""
+        total = self.encoded_faces + self.reused_faces
+        return {
+            "tracks": len(self.tracks),
+            "encoded_faces": self.encoded_faces,
+            "reused_faces": self.reused_faces,
+            "reuse_rate": self.reused_faces / total if total else 0.0
+        }
@@ -1,72 +1,237 @@
-import face_recognition
 import cv2
 import numpy as np
+import threading
+import os
+import json
+import time
 from modules.camera_utils import select_camera
+from modules.face_loader import batch_face_encodings
+from modules.frame_source import CameraSource, open_source
+from modules.matcher import GalleryMatcher
+from modules.metrics import get_metrics, timer
+from modules.motion_gate import MotionGate, merge_regions
+from modules.detection import LIVE_PROFILE, get_detection_profile, scale_boxes
+from modules.pipeline import FramePipeline
+from modules.tracker import FaceTracker
 
-def recognize_from_webcam(known_face_encodings, known_face_names, user_info=None, camera_id=None):
+def recognize_frame(frame, matcher, profile=None):
     """
-    Nhận diện khuôn mặt qua webcam và hiển thị thông tin người dùng
+    Inference stage: phát hiện, mã hóa và so khớp khuôn mặt trên một frame BGR
+
+    Args:
+        profile: DetectionProfile (độ phân giải, upsample, model); mặc định LIVE_PROFILE
+
+    Returns:
+        tuple: (vị trí khuôn mặt trên frame gốc, danh sách tên tương ứng)
     """
-    # Cho phép người dùng chọn camera nếu không chỉ định
-    if camera_id is None:
-        camera_id = 1
-    
-    # Mở webcam
-    video_capture = cv2.VideoCapture(camera_id)
+    profile = LIVE_PROFILE if profile is None else profile
+    # Thu nhỏ frame theo profile và chuyển từ BGR (OpenCV) sang RGB (face_recognition)
+    small_frame, small_locations, scale = profile.detect(frame, bgr=True)
+
+    # Mã hóa tất cả khuôn mặt trong frame bằng một lần gọi batch
+    face_encodings = batch_face_encodings([(small_frame, small_locations)])[0]
+
+    # So khớp tất cả khuôn mặt trong frame với gallery trong một lần
+    with timer('match'):
+        face_names = [match.name for match in matcher.match(face_encodings)]
+    return scale_boxes(small_locations, scale, frame.shape), face_names
+
+class FrameRecognizer:
+    """
+    Inference stage có theo dõi khuôn mặt giữa các frame
+
+    Khuôn mặt vẫn được phát hiện ở mỗi frame, nhưng chỉ những khuôn mặt mà FaceTracker
+    yêu cầu (track mới, track đã lâu chưa kiểm tra lại, độ tin cậy thấp) mới được mã hóa và
+    so khớp; các khuôn mặt khác giữ danh tính của track. Vị trí trả về theo tọa độ frame gốc.
+    """
+
+    def __init__(self, matcher, profile=None, tracker=None, track_padding=0.5):
+        self.matcher = matcher
+        self.profile = LIVE_PROFILE if profile is None else profile
+        self.tracker = FaceTracker() if tracker is None else tracker
+        self.track_padding = track_padding
+        # Tracker có trạng thái nên cần khóa khi pipeline chạy nhiều luồng inference
+        self._lock = threading.Lock()
+
+    def _search_regions(self, frame, regions):
+        """Vùng thay đổi cộng với vùng quanh các khuôn mặt đang theo dõi (người đứng yên vẫn được giữ track)"""
+        height, width = frame.shape[:2]
+        search = list(regions)
+        with self._lock:
+            boxes = [track.box for track in self.tracker.tracks]
+        for top, right, bottom, left in boxes:
+            pad_y = (bottom - top) * self.track_padding
+            pad_x = (right - left) * self.track_padding
+            search.append((max(0, int(top - pad_y)), min(width, int(right + pad_x)),
+                           min(height, int(bottom + pad_y)), max(0, int(left - pad_x))))
+        return merge_regions(search)
+
+    def __call__(self, frame, regions=None):
+        if regions is None:
+            # Thu nhỏ frame theo profile, chuyển BGR sang RGB và tìm khuôn mặt trên cả frame
+            small_frame, small_locations, scale = self.profile.detect(frame, bgr=True)
+            items = [(small_frame, small_locations)]
+            face_locations = scale_boxes(small_locations, scale, frame.shape)
+        else:
+            # Chỉ tìm trong các vùng MotionGate báo có thay đổi
+            items, face_locations = self.profile.detect_regions(frame, self._search_regions(frame, regions), bgr=True)
+        # Ảnh (đã thu nhỏ) và vị trí trên ảnh đó của từng khuôn mặt, cùng thứ tự với face_locations
+        owners = [(k, location) for k, (_, locations) in enumerate(items) for location in locations]
+
+        with self._lock:
+            tracks, needs_encoding = self.tracker.update(face_locations)
+
+        if needs_encoding:
+            # Chỉ mã hóa những khuôn mặt cần kiểm tra lại danh tính (ngoài khóa để các luồng khác không phải chờ)
+            needs_encoding = sorted(needs_encoding)
+            grouped = {}
+            for i in needs_encoding:
+                k, location = owners[i]
+                grouped.setdefault(k, []).append(location)
+            encoded = batch_face_encodings([(items[k][0], grouped[k]) for k in sorted(grouped)])
+            face_encodings = [encoding for encodings in encoded for encoding in encodings]
+            with timer('match'):
+                matches = self.matcher.match(face_encodings)
+            with self._lock:
+                for i, match in zip(needs_encoding, matches):
+                    self.tracker.set_identity(tracks[i], match.name, match.distance)
+
+        face_names = [track.name for track in tracks]
+        return face_locations, face_names
+
+    def stats_text(self):
+        stats = self.tracker.stats()
+        return (f"Tracks {stats['tracks']} | encoded {stats['encoded_faces']}, "
+                f"reused {stats['reused_faces']} ({stats['reuse_rate']:.0%})")
+
+def draw_metrics_overlay(frame, origin=(10, 90)):
+    """Vẽ thời gian từng bước (khi metrics được bật) lên khung hình"""
+    metrics = get_metrics()
+    if not metrics.enabled:
+        return
+    x, y = origin
+    for line in metrics.overlay_lines():
+        cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 0), 1)
+        y += 18
+
+def open_frame_source(source=None, camera_id=None):
+    """Mở nguồn frame: source nếu có, nếu không thì camera camera_id (mặc định camera 1)"""
+    if source is None:
+        return CameraSource(1 if camera_id is None else camera_id)
+    return open_source(source)
+
+def default_results_file(prefix):
+    """Đường dẫn file JSONL mặc định cho kết quả chế độ headless"""
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    return os.path.join('reports', f"{prefix}_{timestamp}.jsonl")
+
+def run_headless(pipeline, source, results_file, on_result=None):
+    """
+    Chạy pipeline không hiển thị, ghi kết quả của từng frame vào file JSONL
+
+    Mỗi dòng: {"frame", "source", các trường vị trí của nguồn (time_s/file), "faces": [{"name", "box"}]}
+    với box là (top, right, bottom, left) trên frame gốc.
+
+    Args:
+        on_result: Hàm tùy chọn on_result(frame_id, face_locations, face_names) gọi trên luồng này
+
+    Returns:
+        int: Số frame đã ghi
+    """
+    directory = os.path.dirname(results_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    written = 0
+    with open(results_file, 'w', encoding='utf-8') as f:
+        for frame_id, result in pipeline.iter_results():
+            record = {"frame": frame_id, "source": source.name}
+            record.update(source.describe_frame(frame_id))
+            if result is None:
+                record["error"] = True
+                record["faces"] = []
+            else:
+                face_locations, face_names = result
+                record["faces"] = [
+                    {"name": name, "box": [int(v) for v in location]}
+                    for location, name in zip(face_locations, face_names)
+                ]
+                if on_result is not None:
+                    on_result(frame_id, face_locations, face_names)
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            written += 1
+
+    print(f"Đã ghi kết quả {written} frame vào {results_file}")
+    return written
+
+def recognize_from_webcam(known_face_encodings, known_face_names, user_info=None, camera_id=None, matcher=None,
+                          num_workers=1, source=None, headless=False, results_file=None, motion_gate=True):
+    """
+    Nhận diện khuôn mặt qua webcam (hoặc file video / chuỗi ảnh) và hiển thị thông tin người dùng
+
+    Camera được đọc ở luồng riêng; inference chạy trên num_workers luồng và bỏ qua frame cũ
+    khi không theo kịp, nên hình hiển thị luôn là frame mới nhất. Với file video và chuỗi ảnh
+    mọi frame đều được xử lý.
+
+    Args:
+        source: Nguồn frame (xem frame_source.open_source); mặc định là camera camera_id
+        headless: Không mở cửa sổ, chạy nhanh nhất có thể và ghi kết quả từng frame ra results_file (JSONL)
+        motion_gate: Bỏ qua phát hiện khuôn mặt khi khung cảnh không đổi (xem motion_gate.MotionGate)
+    """
+    video_capture = open_frame_source(source, camera_id)
     
     if not video_capture.isOpened():
-        print(f"Lỗi: Không thể mở camera {camera_id}")
+        print(f"Lỗi: Không thể mở nguồn {video_capture.name}")
         return
     
-    print(f"Đang sử dụng camera {camera_id}. Nhấn 'q' để thoát.")
+    # Xếp gallery thành ma trận một lần cho cả phiên (nếu chưa có matcher dựng sẵn)
+    if matcher is None:
+        matcher = GalleryMatcher(known_face_encodings, known_face_names)
     
-    process_this_frame = True
+    # Capture, inference và render chạy ở các luồng khác nhau; khuôn mặt được theo dõi giữa các frame.
+    # Nguồn không trực tiếp thì không bỏ frame
+    recognizer = FrameRecognizer(matcher, profile=get_detection_profile(video_capture.name))
+    gate = MotionGate() if motion_gate else None
+    pipeline = FramePipeline(video_capture, recognizer, num_workers=num_workers,
+                             drop_frames=video_capture.is_live, collect_results=headless, gate=gate)
+    pipeline.start()
+    
+    if headless:
+        print(f"Đang xử lý {video_capture.name} (headless)...")
+        try:
+            run_headless(pipeline, video_capture, results_file or default_results_file('recognition'))
+        finally:
+            pipeline.stop()
+            print(f"Pipeline: {pipeline.stats_text()}, processed {pipeline.processed_frames} frames")
+            print(f"Tracker: {recognizer.stats_text()}")
+            if gate is not None:
+                print(f"Motion gate: {gate.stats_text()}")
+            if get_metrics().enabled:
+                print(get_metrics().summary_text())
+            video_capture.release()
+        return
+    
+    print(f"Đang sử dụng {video_capture.name}. Nhấn 'q' để thoát.")
+    
+    face_locations = []
+    face_names = []
 
     while True:
-        # Đọc frame từ webcam
-        ret, frame = video_capture.read()
+        # Lấy frame mới nhất cùng kết quả nhận diện mới nhất
+        item = pipeline.read()
 
-        if not ret:
-            print("Error: Failed to capture image")
+        if item is None:
+            if video_capture.is_live:
+                print("Error: Failed to capture image")
             break
 
-        # Chỉ xử lý 1 frame bỏ qua 1 frame để tối ưu hiệu năng
-        if process_this_frame:
-            # Giảm kích thước frame để xử lý nhanh hơn
-            small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-            
-            # Chuyển từ BGR (OpenCV) sang RGB (face_recognition)
-            rgb_small_frame = small_frame[:, :, ::-1]
-
-            # Tìm khuôn mặt trong frame
-            face_locations = face_recognition.face_locations(rgb_small_frame)
-            face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-
-            face_names = []
-            for face_encoding in face_encodings:
-                # So sánh với khuôn mặt đã biết
-                matches = face_recognition.compare_faces(known_face_encodings, face_encoding)
-                name = "Unknown"
-
-                # Tìm khuôn mặt gần giống nhất
-                face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-                if len(face_distances) > 0:
-                    best_match_index = np.argmin(face_distances)
-                    if matches[best_match_index]:
-                        name = known_face_names[best_match_index]
-
-                face_names.append(name)
-
-        process_this_frame = not process_this_frame
+        frame, result, _ = item
+        if result is not None:
+            face_locations, face_names = result
 
+        draw_start = time.perf_counter()
         # Hiển thị kết quả
         for (top, right, bottom, left), name in zip(face_locations, face_names):
-            # Thay đổi tỉ lệ vị trí khuôn mặt về kích thước gốc
-            top *= 4
-            right *= 4
-            bottom *= 4
-            left *= 4
-
             # Vẽ hộp quanh khuôn mặt
             if name == 'Unknown':
                 color = (0, 0, 255)  # Đỏ cho unknown
@@ -94,13 +259,27 @@ def recognize_from_webcam(known_face_encodings, known_face_names, user_info=None
             cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
             cv2.putText(frame, text, (left, top-10), cv2.FONT_HERSHEY_DUPLEX, 1.0, color, 2)
             
+        # Hiển thị thống kê pipeline và thời gian từng bước
+        cv2.putText(frame, pipeline.stats_text(), (10, frame.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+        draw_metrics_overlay(frame)
+        get_metrics().observe('draw', time.perf_counter() - draw_start)
+        
         # Hiển thị khung hình kết quả
-        cv2.imshow('Face Recognition', frame)
+        with timer('display'):
+            cv2.imshow('Face Recognition', frame)
+            key = cv2.waitKey(1) & 0xFF
 
         # Thoát khi nhấn 'q'
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        if key == ord('q'):
             break
 
     # Dọn dẹp
+    pipeline.stop()
+    print(f"Pipeline: {pipeline.stats_text()}, dropped {pipeline.dropped_frames} frames")
+    print(f"Tracker: {recognizer.stats_text()}")
+    if gate is not None:
+        print(f"Motion gate: {gate.stats_text()}")
+    if get_metrics().enabled:
+        print(get_metrics().summary_text())
     video_capture.release()
     cv2.destroyAllWindows()
\ No newline at end of file